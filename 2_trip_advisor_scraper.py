@@ -1,7 +1,31 @@
-import math
-from time import sleep
-from threading import Thread
+import argparse
+import multiprocessing
+import os
+from functools import partial
+from time import sleep, time
+from threading import Lock, Thread
 from locators import Locators
+from browser_profiles import ProfileTemplate
+from coordinator import LeaseConsumer
+from autotune import Autotuner
+from dispatch import Dispatcher, ProcessWork, RemoteDeadLetters, RemoteMetrics, RemoteObject, RemoteRateController
+from line_index import LineIndex
+from locator_engine import LocatorEngine
+from politeness import BlockDetector, HostRateController
+from proxies import ProxyPool
+from watchdog import PageWatchdog
+import failures
+import metrics
+import network_capture
+import photos
+import structured_data
+import profiler
+import repair
+import reviews
+import resources
+import tabs
+import templates
+import trio
 import utils
 import logging
 
@@ -19,13 +43,55 @@ console_handler_error.setLevel(logging.ERROR)
 logging.getLogger().addHandler(console_handler_error)
 
 # Variables
-workers = 1
+workers = 1             # 0 sizes the pool from the CPU and memory limits of the host or container
+executor = 'thread'     # 'process' runs every worker in its own process, the main process stays the single writer
+autotune = False        # Start with min_workers and adapt the worker count during the run, see autotune.py
+min_workers = 1
+max_workers = 0         # 0 uses the CPU and memory limits of the host or container
+session_memory_limit = 1536     # MiB of resident memory after which a browser session is recycled between urls
+memory_reserve = 700    # MiB of available memory under which new work is held back
+autotune_interval = 30  # Seconds between two decisions of the autotuner
+retire_requests = 0     # Workers asked by the autotuner to stop after their current url
 records = []
 csv_writer = None
 total = finished = running_threads = 0
+counter_lock = Lock()
+max_retries = 3         # Retries of a url after a timeout, stale element or crashed session
+replay_filepath = ''    # Dead letters file whose urls are scraped instead of the input file
+page_deadline = 60      # Seconds a worker may spend on a single page before its session is replaced
+hedge_after = None      # Once the queue is drained, re-dispatch urls in flight for this many seconds (None disables)
+start_rate = 0.5        # Initial requests per second per host, adapted during the run
+max_rate = 5.0          # Highest requests per second per host
+proxies_filepath = ''   # File with one proxy per line, empty means direct connections
+proxy_test_url = 'https://www.tripadvisor.com/robots.txt'  # Fetched through every proxy at startup
+profile_template_dir = 'chrome_profile_template'    # Warm profile cloned for every session, see browser_profiles.py
+tabs_per_worker = 1     # More than 1 drives several tabs of one browser per worker from an event loop
+recycle_tabs_after = 50     # Pages after which a tab is replaced by a fresh one
+extraction_backend = 'dom'  # 'network': JSON responses of the page, 'structured': JSON-LD and embedded state,
+                            # 'http': structured data of the raw page without the browser; the DOM fills the gaps
 base_url = 'https://www.tripadvisor.com'
 input_filepath = 'inputs/items_urls.csv'
 output_filepath = 'outputs/pages.csv'
+dead_letters_filepath = 'outputs/dead_letters.csv'
+photo_links_filepath = ''   # CSV file of the photo urls found on the pages, empty disables collecting them (see photos.py)
+selected_fields = []    # Fields to extract and write, empty means all of them
+repair_filepath = ''    # Output file whose missing or suspect fields are scraped again and merged back in place
+repair_rules_filepath = ''  # JSON rules of the suspect values, see repair.py
+repair_patches_filepath = 'outputs/repair_patches.csv'
+repair_fields = {}      # Fields to scrape again by url, when repairing
+reviews_mode = False    # Scrape the review pages of the restaurants of the output (only the pages with new reviews)
+reviews_filepath = reviews.reviews_filepath
+reviews_state_filepath = reviews.state_filepath
+input_lines = None      # slice of the input lines to scrape: resume from a line, or sample every n-th url
+shard = None            # (index, count): only scrape the urls of this shard, see external_sort.py to merge the outputs
+coordinator_url = ''    # Lease the urls from a coordinator (see coordinator.py) instead of reading the input file
+lease_batch_size = 20   # Urls per lease
+locator_stats_filepath = 'outputs/locator_stats.json'  # Hit counts and health of the field xpaths, kept across runs
+last_write_time = time()
+metrics_host = '127.0.0.1'
+metrics_port = 0        # Port of the metrics endpoint, 0 disables it
+profile = False         # Start the sampling profiler with the job, SIGUSR1 toggles it at any time
+profile_dir = 'profiles'
 
 records_template = {
     'Name': '',
@@ -40,6 +106,51 @@ records_template = {
     'Item_url':''
 }
 
+# Record fields extracted from the page: (candidate xpaths, what to read from the element)
+field_locators = {
+    'Name': (Locators.NAME_XPATHS, 'text'),
+    'Address': (Locators.ADDRESS_XPATHS, 'text'),
+    'Contact': (Locators.CONTACT_XPATHS, 'text'),
+    'Ranking': (Locators.RANKING_XPATHS, 'text'),
+    'Cuisine': (Locators.CUISINE_XPATHS, 'text'),
+    'Reviews': (Locators.REVIEWS_XPATHS, 'text'),
+    'Opening_hours': (Locators.OPENING_HOURS_XPATHS, 'text'),
+    'Ratings': (Locators.RATINGS_XPATHS, 'label'),
+    'Website': (Locators.WEBSITE_XPATHS, 'href'),
+}
+
+memory_governor = resources.MemoryGovernor()
+job_metrics = metrics.Metrics(writer_lag=lambda: (len(records), time() - last_write_time), memory=memory_governor.usage)
+job_profiler = profiler.SamplingProfiler(output_dir=profile_dir)
+dead_letters = failures.DeadLetters(dead_letters_filepath)
+review_sink = reviews.ReviewSink()
+photo_links = photos.PhotoLinks(photo_links_filepath)
+page_watchdog = PageWatchdog(deadline=page_deadline + 10)
+job_dispatcher = None
+rate_controller = HostRateController(start_rate=start_rate, max_rate=max_rate)
+block_detector = BlockDetector()
+proxy_pool = ProxyPool([])
+profile_template = ProfileTemplate(profile_template_dir)
+locator_engine = LocatorEngine({field: xpaths for field, (xpaths, _) in field_locators.items()})
+page_extractors = templates.PageExtractors(field_locators)
+
+
+def project_fields(fields):
+    """
+    Main thread: Restricts the job to a subset of the record fields. Only these fields are located and waited for,
+    and only these columns (plus Item_url) are written. Must run before the workers start.
+
+    Args:
+        fields (list): Names of the fields to keep, in output order.
+    """
+    for field in list(field_locators):
+        if field not in fields:
+            del field_locators[field]
+
+    records_template.clear()
+    records_template.update({field: '' for field in fields})
+    records_template['Item_url'] = ''
+
 
 def write_results_to_files(_all=False):
     """
@@ -48,7 +159,7 @@ def write_results_to_files(_all=False):
     Args:
         _all (bool, optional): Flag to indicate whether to write all records. Defaults to False.
     """
-    global records, output_filepath, csv_writer
+    global records, output_filepath, csv_writer, last_write_time
 
     try:
         # Check if there are records to write or the _all flag is set
@@ -56,13 +167,17 @@ def write_results_to_files(_all=False):
             # Initialize CSV writer for appending data
             csv_writer = utils.get_csv_writer(output_filepath, 'a')
 
-            # Write records to the CSV file
+            # Write records to the CSV file, the record of a review page holds all its reviews
             while len(records) > 0:
                 record = records.pop(0)
-                csv_writer.writerow(record)
+                if reviews_mode:
+                    csv_writer.writerows(review_sink.new_rows(record))
+                else:
+                    csv_writer.writerow(record)
 
             # Reinitialize CSV writer for further appending
             csv_writer = utils.get_csv_writer(output_filepath, 'a')
+            last_write_time = time()
 
     except Exception as e:
         logging.error(f"An error occurred in the write_results_to_files function: {e}")
@@ -94,118 +209,802 @@ def manage_threads():
 
 
 
-def start_workers(items, start, limit):
+def start_workers(items):
     """
     Main thread: Distributes the processing of items among multiple workers using threads.
+    The workers pull the items one by one from a shared dispatcher, so a slow worker never holds back a whole slice.
 
     Args:
-        items (list): List of items to be processed.
-        start (int): Starting index for the items to be processed.
-        limit (int): Maximum number of items each worker should process.
+        items (sequence): The items to be processed, a list or a lazily read LineIndex.
     """
-    global workers, total, finished, running_threads
+    global workers, total, finished, running_threads, job_dispatcher
 
     try:
-        total = len(items)
+        # Shared work queue: batches leased from the coordinator, or the items where idle workers hedge the stragglers
+        if coordinator_url:
+            job_dispatcher = LeaseConsumer(coordinator_url, batch_size=lease_batch_size)
+            total = job_dispatcher.total()
+        else:
+            job_dispatcher = Dispatcher(items, hedge_after=hedge_after)
+            total = len(items)
 
-        # Iterate over workers and start a thread for each segment of items
-        for worker_id in range(workers):
-            end = start + limit
+        job_metrics.total = total
+        job_metrics.queue_depth = job_dispatcher.remaining
+        page_watchdog.start()
 
-            # Adjust the end index to prevent exceeding the total number of items
-            if end > total:
-                end = total
+        # Start small when the worker count is tuned during the run
+        autotuner = None
+        if autotune:
+            autotuner = Autotuner(min_workers=min_workers, max_workers=max_workers or resources.default_workers())
+            workers = min_workers
 
-            # Start a thread for the current segment of items, crawl through each item in targeT Function
-            thread = Thread(target=crawl_records, args=(items[start:end],))
+        # Start a thread for each worker, crawl through the items in targeT Function
+        if executor == 'process':
+            target = serve_worker_process
+        else:
+            target = crawl_records_in_tabs if tabs_per_worker > 1 else crawl_records
+        for worker_id in range(workers):
+            thread = Thread(target=target, args=(job_dispatcher, worker_id), name=f'worker-{worker_id}')
             thread.start()
 
-            # Update running threads count and manage them
-            running_threads += 1
-            manage_threads()
-
-            # Update the start index for the next worker
-            start = end
+            # Update running threads count and manage them, the autotuner needs the monitoring loop below instead
+            with counter_lock:
+                running_threads += 1
+            if autotuner is None:
+                manage_threads()
 
         # Monitor running threads and display progress until all threads finish
+        next_worker_id, last_tuning = workers, time()
         while running_threads > 0:
             write_results_to_files(_all=True)
             sleep(0.5)
             utils.write_to_console(f'Progress: {finished}/{total} | {utils.time_progress()}')
 
+            if autotuner and time() - last_tuning >= autotune_interval:
+                next_worker_id = tune_workers(autotuner, target, next_worker_id)
+                last_tuning = time()
+
         # Final update of results and progress
         write_results_to_files(_all=True)
         utils.write_to_console(f'Progress: {finished}/{total} | {utils.time_progress()}')
 
+        if job_dispatcher.hedged:
+            logging.info(f"Hedged {job_dispatcher.hedged} straggler(s), {job_dispatcher.hedges_won} hedge(s) won")
+
     except Exception as e:
         logging.error(f"An error occurred in the Main Thread start_workers() function: {e}")
         raise
 
 
-def crawl_records(urls):
+def tune_workers(autotuner, target, next_worker_id):
+    """
+    Main thread: Applies the decision of the autotuner, starting new workers or asking running ones to stop
+    after their current url.
+
+    Args:
+        autotuner (Autotuner): The autotuner of the job.
+        target (callable): The worker function.
+        next_worker_id (int): Identifier of the next started worker.
+
+    Returns:
+        next_worker_id (int): Identifier of the worker started after these ones.
+    """
+    global workers, running_threads, retire_requests
+
+    running = running_threads - retire_requests
+    count, reason = autotuner.observe(job_metrics.snapshot(), running, job_dispatcher.remaining())
+    logging.info(f"Autotuner: {running} -> {count} worker(s), {reason}")
+
+    for _ in range(count - running):
+        Thread(target=target, args=(job_dispatcher, next_worker_id), name=f'worker-{next_worker_id}').start()
+        next_worker_id += 1
+        with counter_lock:
+            running_threads += 1
+
+    if count < running:
+        with counter_lock:
+            retire_requests += running - count
+
+    workers = count
+    return next_worker_id
+
+
+def next_url(work, worker_id, timeout=None):
+    """
+    Worker Thread: Pulls the next url of a worker.
+
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker.
+        timeout (float): Seconds to wait at most while the last urls are in flight, None waits until they settle.
+
+    Returns:
+        url (str): The url to scrape, or None when the work is finished or the worker was retired by the autotuner.
+                   Blocks while the host is short of memory. False when the timeout elapsed first.
+    """
+    global retire_requests
+
+    with counter_lock:
+        if retire_requests > 0:
+            retire_requests -= 1
+            logging.info(f"Worker {worker_id} retired by the autotuner")
+            return None
+
+    # Hold new work back while the host is short of memory
+    memory_governor.wait_for_memory()
+
+    return work.get(worker_id) if timeout is None else work.get(worker_id, timeout=timeout)
+
+
+def scrape_record(driver, url, stats):
+    """
+    Worker Thread: Opens a single URL and extracts the record information. Depending on the extraction backend,
+    the fields come from the structured data of the page (JSON-LD, embedded state), from the captured JSON
+    responses, and from the DOM using xpaths for everything else.
+
+    Args:
+        driver (WebDriver): The Chrome driver of the worker.
+        url (str): URL of the item page.
+        stats (WorkerStats): Counters of the worker, they count the source of every field.
+
+    Returns:
+        record (list): The formatted record, in the order of records_template.
+    """
+    if reviews_mode:
+        return scrape_review_page(driver, url)
+
+    item = records_template.copy()
+    item['Item_url'] = url
+    sources = {}
+    restaurant_id = utils.get_restaurant_id(url)
+    wanted_fields = repair_fields.get(url) or list(field_locators)
+
+    # The structured data of the raw page may be complete, then the page is never rendered by the browser
+    if extraction_backend == 'http':
+        content = fetch_raw_page(driver, url)
+        if content:
+            html = content.decode('utf-8', errors='ignore')
+            fill_fields(item, sources, *structured_data.extract_record(html, restaurant_id))
+
+        if all(item[field] for field in wanted_fields):
+            if content and photo_links_filepath:
+                photo_links.write(url, photos.find_photo_urls(html))
+            stats.fields_extracted(sources)
+            return format_record(item)
+
+    # Drop the network events of the previous page
+    if extraction_backend == 'network':
+        network_capture.reset(driver)
+
+    # Navigate to the URL, then bail out early on a captcha or bot wall instead of timing out field by field
+    driver.get(url)
+    block_detector.check_page(driver.title, driver.current_url)
+
+    # Read the fields from the JSON responses of the page, when the network backend is used
+    if extraction_backend == 'network':
+        fill_fields(item, sources, network_capture.extract_record(driver, restaurant_id), 'network')
+
+    # Read the fields from the script blocks of the rendered page
+    if extraction_backend == 'structured':
+        fill_fields(item, sources, *structured_data.extract_record(driver.page_source, restaurant_id))
+
+    # Collect the photo urls, they are downloaded after the run by photos.py
+    if photo_links_filepath:
+        photo_links.write(url, photos.find_photo_urls(driver.page_source))
+
+    # Classify the page layout, then extract the remaining record information with the xpaths of that layout
+    template = templates.fingerprint(driver)
+    stats.page_classified(template)
+
+    for field, (xpaths, mode, wait) in page_extractors.get(template).items():
+        if not item[field] and field in wanted_fields:
+            fill_fields(item, sources, {field: extract_dom_field(driver, field, xpaths, wait)}, 'xpath')
+
+    stats.fields_extracted(sources)
+    return format_record(item)
+
+
+def fetch_raw_page(driver, url):
     """
-    Worker Thread: Crawls records for a list of URLs and extracts information using xpaths.
-        - A worker extracts the relevent data for all his assigned work (Assigned Urls)
-        - For all the urls: Crawl the urls and scrap the required data
-        - Update Record list
+    Worker Thread: Fetches the raw page of a url for the http backend, with the user agent and the cookies of the
+    browser so the request looks like its own.
+
     Args:
-        urls (list): List of URLs to crawl and extract information.
+        driver (WebDriver): The Chrome driver of the worker.
+        url (str): URL of the item page.
+
+    Returns:
+        content (bytes): The page, or None if the fetch failed or was refused. The browser then loads the page
+                         itself: a refused raw request is not a block of the host.
     """
-    global finished, running_threads
+    if not hasattr(driver, 'user_agent'):
+        driver.user_agent = driver.execute_script('return navigator.userAgent')
+    cookies = {cookie['name']: cookie['value'] for cookie in driver.get_cookies()}
 
     try:
-        # Load WebDriver for each thread
-        driver = utils.load_driver()
-
-        # Iterate over URLs to crawl and extract information
-        for url in urls:
-            item = records_template.copy()
-
-            # Navigate to the URL
-            driver.get(url)
-
-            # Extract record information using xpaths
-            name = utils.extract_elem_text(driver, Locators.NAME_XPATH)
-            address = utils.extract_elem_text(driver, Locators.ADDRESS_XPATH)
-            contact = utils.extract_elem_text(driver, Locators.CONTACT_XPATH)
-            ranking = utils.extract_elem_text(driver, Locators.RANKING_XPATH)
-            cuisine = utils.extract_elem_text(driver, Locators.CUISINE_XPATH)
-            reviews = utils.extract_elem_text(driver, Locators.REVIEWS_XPATH)
-            opening_hours = utils.extract_elem_text(driver, Locators.OPENING_HOURS_XPATH)
-            website_element = utils.wait_for_elem(driver, Locators.WEBSITE_XPATH)
-            website = website_element.get_attribute('href')
-            ratings_element = utils.wait_for_elem(driver, Locators.RATINGS_XPATH)
-            ratings = ratings_element.accessible_name.split(" ")[0].strip()
-
-            # Assign extracted information to item dictionary
-            item['Name'] = name
-            item['Address'] = address
-            item['Contact'] = contact
-            item['Ranking'] = ranking
-            item['Cuisine'] = cuisine
-            item['Reviews'] = reviews
-            item['Opening_hours'] = opening_hours
-            item['Ratings'] = ratings
-            item['Website'] = website
-            item['Item_url'] = url
-
-            # Format the record and append to the records list
-            record = "+;=".join(item.values()).replace('\n', '<br>').replace('\r', '').split('+;=')
-            records.append(record)
-
-            # Update finished count
-            finished += 1
+        return utils.get_request(url, _retries=1, _proxy=driver.proxy, _headers={'User-Agent': driver.user_agent},
+                                 _cookies=cookies) or None
+    except (AssertionError, failures.BlockedError) as e:
+        logging.debug(f"Raw fetch failed, falling back to the browser: {e}")
+        return None
 
-        # Quit the WebDriver
+
+def scrape_review_page(driver, url):
+    """
+    Worker Thread: Opens a review page of a restaurant and extracts all its reviews, the truncated ones expanded.
+
+    Args:
+        driver (WebDriver): The Chrome driver of the worker.
+        url (str): URL of the review page.
+
+    Returns:
+        record (list): The rows of the reviews of the page, in the order of reviews.reviews_header.
+    """
+    driver.get(url)
+    block_detector.check_page(driver.title, driver.current_url)
+
+    return reviews.extract_reviews(driver, url)
+
+
+def fill_fields(item, sources, values, source):
+    """
+    Worker Thread: Copies the non empty values missing from the item and records where they came from.
+    Values of fields outside the item (not selected by the job) are ignored.
+
+    Args:
+        item (dict): The record being extracted.
+        sources (dict): Source by field name, updated in place.
+        values (dict): The values found by an extractor.
+        source (str or dict): The source name of all the values, or the source of each value by field name.
+    """
+    for field, value in values.items():
+        if value and field in item and not item[field]:
+            item[field] = value
+            sources[field] = source[field] if isinstance(source, dict) else source
+
+
+def extract_dom_field(driver, field, xpaths=None, wait=5):
+    """
+    Worker Thread: Extracts a single record field from the rendered page.
+
+    Args:
+        driver (WebDriver): The Chrome driver of the worker.
+        field (str): The field name, a key of field_locators.
+        xpaths (list): The candidates of the page template, defaults to all the candidates of the field.
+        wait (int): Seconds to wait for the element.
+
+    Returns:
+        value (str): The field value, empty if the element is missing.
+    """
+    mode = field_locators[field][1]
+
+    elem = locator_engine.locate(driver, field, _wait_in_secs=wait, _candidates=xpaths)
+    if not elem:
+        return ''
+
+    if mode == 'text':
+        return str(elem.text).strip()
+
+    if mode == 'href':
+        return elem.get_attribute('href') or ''
+
+    return elem.accessible_name.split(" ")[0].strip()
+
+
+def format_record(item):
+    """
+    Worker Thread: Checks an extracted item for a soft block and formats it as a CSV record.
+
+    Args:
+        item (dict): The extracted values, with the keys of records_template.
+
+    Returns:
+        record (list): The formatted record, in the order of records_template.
+    """
+    # Pages rendering without any data are a sign of a soft block. Only the name is on every restaurant page: a job
+    # projected without it, or a repair of the missing fields, has legitimately empty records
+    if 'Name' in field_locators and not repair_fields:
+        block_detector.check_record(list(item.values())[:-1])
+
+    # Format the record
+    return "+;=".join(item.values()).replace('\n', '<br>').replace('\r', '').split('+;=')
+
+
+def keep_record(work, worker_id, url, record):
+    """
+    Worker Thread: Stores the record of a scraped url, unless another attempt of a hedged url already did.
+
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker.
+        url (str): The scraped url.
+        record (list): The formatted record.
+
+    Returns:
+        Status (bool): True if the record was kept, False if it is the losing attempt of a hedged url.
+    """
+    # Only the first attempt of a hedged url is kept
+    if not work.complete(url, worker_id):
+        return False
+
+    store_record(record)
+    return True
+
+
+def store_record(record):
+    """
+    Worker Thread: Queues a record for the writer.
+
+    Args:
+        record (list): The formatted record.
+    """
+    global finished
+
+    records.append(record)
+
+    # Update finished count
+    with counter_lock:
+        finished += 1
+
+
+def handle_page_failure(work, worker_id, stats, url, error, attempt, proxy):
+    """
+    Worker Thread: Classifies a failed attempt, updates the rate control and proxy health,
+    and writes the url to the dead letters file when it is not worth another attempt.
+
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id: Identifier of the worker (or tab).
+        stats (WorkerStats): Counters of the worker (or tab).
+        url (str): The failed url.
+        error (Exception): The exception raised by the attempt.
+        attempt (int): Number of the failed attempt, starting at 1.
+        proxy (str): The proxy used by the attempt.
+
+    Returns:
+        kind (str): The failure kind, see failures.classify_error().
+        give_up (bool): True if the url must not be retried.
+    """
+    kind = failures.classify_error(error)
+
+    # Network level failures count against the proxy, a blocked proxy cools down
+    if kind in ('timeout', 'session', 'blocked'):
+        proxy_pool.report(proxy, ok=False, blocked=kind == 'blocked')
+
+    # Slow down and cool down the host after a block
+    if kind == 'blocked':
+        rate_controller.on_block(url)
+
+    if kind not in failures.retryable_kinds or attempt > max_retries or work.is_done(url):
+        if work.fail(url, worker_id, kind):
+            logging.error(f"Giving up on {url} after {attempt} attempt(s) ({kind}): {error}")
+            dead_letters.write(url, kind, error, attempt)
+        stats.page_failed(kind)
+        return kind, True
+
+    logging.warning(f"Retrying {url} after a {kind} failure (attempt {attempt}): {error}")
+    return kind, False
+
+
+def restart_driver(driver, stats):
+    """
+    Worker Thread: Quits a (possibly crashed) driver and loads a fresh one.
+
+    Args:
+        driver (WebDriver): The driver to replace, may be None.
+        stats (WorkerStats): Counters of the worker.
+
+    Returns:
+        driver (WebDriver): The new driver.
+    """
+    quit_driver(driver)
+    stats.driver_restarted()
+    return new_driver()
+
+
+def new_driver():
+    """
+    Worker Thread: Loads a driver configured for scraping, with the navigation bounded by the page deadline,
+    the traffic going through the best available proxy of the pool and a private clone of the warm profile.
+
+    Returns:
+        driver (WebDriver): The new driver, its proxy and profile clone are kept in driver.proxy and driver.profile_dir.
+    """
+    proxy = proxy_pool.acquire()
+    profile_dir = profile_template.clone() if profile_template.is_ready() else ''
+
+    try:
+        driver = utils.load_driver(proxy=proxy, page_load_timeout=page_deadline, user_data_dir=profile_dir,
+                                   capture_network=extraction_backend == 'network')
+        if extraction_backend == 'network':
+            network_capture.enable(driver)
+    except Exception:
+        proxy_pool.release(proxy)
+        profile_template.cleanup(profile_dir)
+        raise
+
+    driver.proxy = proxy
+    driver.profile_dir = profile_dir
+    return driver
+
+
+def quit_driver(driver):
+    """
+    Worker Thread: Quits a (possibly crashed) driver, gives its proxy back to the pool and removes its profile clone.
+
+    Args:
+        driver (WebDriver): The driver to quit, may be None.
+    """
+    if driver is None:
+        return
+
+    try:
         driver.quit()
+    except Exception as e:
+        logging.debug(f"Ignoring error while quitting a driver: {e}")
+
+    proxy_pool.release(getattr(driver, 'proxy', ''))
+    profile_template.cleanup(getattr(driver, 'profile_dir', ''))
+
+
+def crawl_records(work, worker_id=0):
+    """
+    Worker Thread: Crawls records for the URLs of the shared work queue and extracts information using xpaths.
+        - A worker pulls URLs from the dispatcher until all the work is finished
+        - For every url: Crawl the url and scrap the required data, retrying transient failures
+        - Update Record list, permanently failed urls go to the dead letters file
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker, used to label its metrics.
+    """
+    global running_threads
+
+    # Counters owned by this worker, exposed on the metrics endpoint
+    stats = job_metrics.register_worker(worker_id)
+    driver = None
+    url, settled = None, True   # settled is True once the current url is kept or given up
+
+    try:
+        # Load WebDriver for each thread
+        driver = new_driver()
+
+        # Pull URLs to crawl and extract information
+        for url in iter(lambda: next_url(work, worker_id), None):
+            stats.page_started(url)
+            settled = False
+            attempt = 0
+
+            while True:
+                attempt += 1
+
+                try:
+                    # Wait for the per host rate limit (and a cooldown after a block)
+                    rate_controller.acquire(url)
+
+                    # Sampled by cProfile while the profiler is enabled, bounded by the page deadline
+                    page_started_at = time()
+                    with job_profiler.thread_profile(), page_watchdog.watch(worker_id, driver, url):
+                        record = scrape_record(driver, url, stats)
+
+                    rate_controller.on_success(url)
+                    proxy_pool.report(driver.proxy, ok=True, latency=time() - page_started_at)
+                    settled = True
+                    if keep_record(work, worker_id, url, record):
+                        stats.page_finished()
+                    else:
+                        stats.page_discarded()
+
+                    # Move to a less loaded proxy when the pool got unbalanced, replace a bloated browser
+                    if proxy_pool.should_rotate(driver.proxy) or memory_governor.should_recycle(worker_id, driver):
+                        driver = restart_driver(driver, stats)
+                    break
+
+                except Exception as e:
+                    kind, settled = handle_page_failure(work, worker_id, stats, url, e, attempt, driver.proxy)
+
+                    # A crashed or killed session cannot be reused, a blocked one is rotated
+                    if kind in ('session', 'blocked'):
+                        driver = restart_driver(driver, stats)
 
-        # Update running_threads count
-        running_threads -= 1
+                    if settled:
+                        break
+
+                    sleep(failures.backoff_delay(attempt))
 
     except Exception as e:
         logging.error(f"An error occurred in the crawl_records function: {e}")
         raise
 
+    finally:
+        # The worker died with a url in flight (e.g. its driver failed to restart): it goes back to the queue,
+        # the other workers wait for it
+        if not settled:
+            work.release(url, worker_id)
+
+        # Quit the WebDriver
+        quit_driver(driver)
+
+        # Update running_threads count, even if the worker died, so the main thread never waits forever
+        with counter_lock:
+            running_threads -= 1
+
+
+
+def crawl_records_in_tabs(work, worker_id=0):
+    """
+    Worker Thread: Same as crawl_records(), but one browser serves several tabs.
+        - Navigation and extraction of all the tabs are multiplexed from one trio event loop over DevTools
+        - Every tab has its own page deadline and is recycled after recycle_tabs_after pages or a failure
+        - When the browser dies, it is restarted and the tabs are opened again
+        - Only the DOM locators run, every candidate of a field in the learned order: the pages are not
+          fingerprinted, the other backends and photo links are rejected by parse_arguments()
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker, its tabs are labelled worker_id-tab in the metrics.
+    """
+    global running_threads
+
+    stats = job_metrics.register_worker(worker_id)
+    driver = None
+    restarts = 0
+
+    try:
+        driver = new_driver()
+
+        while True:
+            try:
+                tabs.run_tabs(driver, lambda: work.get(worker_id), partial(scrape_in_tab, work, worker_id, driver),
+                              tabs=tabs_per_worker, recycle_after=recycle_tabs_after)
+                break
+
+            except Exception as e:
+                # The whole browser went away: start a new one, the urls it held were already given up or retried
+                restarts += 1
+                if restarts > max_retries:
+                    raise
+
+                logging.warning(f"Browser of worker {worker_id} failed, restarting it: {e}")
+                driver = restart_driver(driver, stats)
+
+    except Exception as e:
+        logging.error(f"An error occurred in the crawl_records_in_tabs function: {e}")
+        raise
+
+    finally:
+        quit_driver(driver)
+
+        with counter_lock:
+            running_threads -= 1
+
+
+async def scrape_in_tab(work, worker_id, driver, tab, url):
+    """
+    Event loop of a tabs worker: Scrapes a url in a tab, retrying transient failures.
+
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker owning the browser.
+        driver (WebDriver): The driver owning the browser.
+        tab (Tab): The tab to use.
+        url (str): URL of the item page.
+
+    Returns:
+        Status (bool): True if the tab must be recycled.
+    """
+    stats = job_metrics.register_worker(f'{worker_id}-{tab.index}')
+    stats.page_started(url)
+    attempt = 0
+    settled = False     # True once the url is kept or given up
+
+    try:
+        while True:
+            attempt += 1
+
+            try:
+                await trio.to_thread.run_sync(rate_controller.acquire, url)
+
+                page_started_at = time()
+                chains = {field: (locator_engine.candidates(field), mode) for field, (_, mode) in field_locators.items()}
+                page = await tab.scrape(url, chains, page_deadline)
+                block_detector.check_page(page['title'], page['url'])
+
+                for field, index in page['hits'].items():
+                    locator_engine.record(field, chains[field][0][index] if index >= 0 else None)
+
+                item = records_template.copy()
+                item.update(page['values'])
+                if 'Ratings' in item:
+                    item['Ratings'] = item['Ratings'].split(" ")[0].strip()
+                item['Item_url'] = url
+                record = format_record(item)
+                stats.fields_extracted({field: 'xpath' for field in field_locators if item[field]})
+
+                rate_controller.on_success(url)
+                proxy_pool.report(driver.proxy, ok=True, latency=time() - page_started_at)
+                settled = True
+                if keep_record(work, worker_id, url, record):
+                    stats.page_finished()
+                else:
+                    stats.page_discarded()
+                return False
+
+            except tabs.cdp.CdpConnectionClosed:
+                # The browser is gone, the worker restarts its browser
+                stats.page_failed('session')
+                raise
+
+            except Exception as e:
+                kind, settled = handle_page_failure(work, worker_id, stats, url, e, attempt, driver.proxy)
+
+                # The tab state is unknown after a failure, continue in a fresh one. A closed connection raised
+                # here means the browser is gone, it propagates like above
+                await tab.recycle()
+
+                if settled:
+                    return False
+
+                await trio.sleep(failures.backoff_delay(attempt))
+
+    finally:
+        # The browser died or the other tabs were cancelled with it: the url goes back to the queue
+        if not settled:
+            work.release(url, worker_id)
+
+
+def serve_worker_process(work, worker_id=0):
+    """
+    Main process thread: Runs a worker in its own process and serves its work queue requests over a pipe.
+        - The worker process owns its driver and asks for urls, completions and failures through the pipe
+        - The records it ships are kept here, so the main thread stays the single writer of the output
+        - The urls held by a crashed process go back to the work queue, the completed ones whose record was not
+          shipped yet are written to the dead letters file
+        - Rate control, block detection, proxies, metrics and dead letters run here, shared with the other workers
+    Args:
+        work (Dispatcher): Shared work queue of the workers.
+        worker_id (int): Identifier of the worker, used to label its metrics.
+    """
+    global running_threads
+
+    context = multiprocessing.get_context('spawn')
+    conn, child_conn = context.Pipe()
+    process = context.Process(target=run_worker_process, name=f'worker-{worker_id}',
+                              args=(worker_id, child_conn, list(field_locators), repair_fields))
+    in_flight = set()
+    unshipped = set()   # Completed urls whose record is still in the worker process
+
+    try:
+        process.start()
+        child_conn.close()
+
+        while True:
+            try:
+                request, *args = conn.recv()
+            except EOFError:
+                break
+
+            reply = None
+            if request in ('get', 'flush'):
+                for url, record in args[0]:
+                    in_flight.discard(url)
+                    unshipped.discard(url)
+                    store_record(record)
+
+                # Answered within a second, the worker process asks again while the last urls are in flight
+                if request == 'get':
+                    reply = next_url(work, worker_id, timeout=1)
+                    if reply:
+                        in_flight.add(reply)
+
+            elif request == 'complete':
+                # The record follows with the next get(), unless this is the losing attempt of a hedged url
+                reply = work.complete(args[0], worker_id)
+                in_flight.discard(args[0])
+                if reply:
+                    unshipped.add(args[0])
+
+            elif request == 'fail':
+                url, reason = args
+                in_flight.discard(url)
+                reply = work.fail(url, worker_id, reason)
+
+            elif request == 'is_done':
+                reply = work.is_done(args[0])
+
+            elif request == 'release':
+                in_flight.discard(args[0])
+                work.release(args[0], worker_id)
+
+            elif request == 'call':
+                target, method, call_args, call_kwargs = args
+                try:
+                    reply = ('ok', getattr(shared_object(target), method)(*call_args, **call_kwargs))
+                except Exception as e:
+                    reply = ('error', e)
+
+            conn.send(reply)
+
+        process.join()
+        if process.exitcode:
+            logging.error(f"Worker process {worker_id} exited with code {process.exitcode}")
+
+    except Exception as e:
+        logging.error(f"An error occurred in the serve_worker_process function: {e}")
+        raise
+
+    finally:
+        for url in in_flight:
+            work.release(url, worker_id)
+
+        # Completed, they cannot go back to the queue
+        for url in unshipped:
+            logging.error(f"Worker process {worker_id} exited before shipping the record of {url}")
+            dead_letters.write(url, 'lost', f'Worker process {worker_id} exited', 1)
+
+        # With its browsers, they would outlive it
+        if process.is_alive():
+            resources.kill_process_tree(process.pid)
+
+        with counter_lock:
+            running_threads -= 1
+
+
+def shared_object(target):
+    """
+    Main process thread: Resolves an object of the main process called by a worker process.
+
+    Args:
+        target (str | tuple): Name of the object, or ('stats', worker id) for the counters of a worker.
+
+    Returns:
+        obj: The shared object.
+    """
+    if isinstance(target, tuple) and target[0] == 'stats':
+        return job_metrics.register_worker(target[1])
+
+    if target in ('rate_controller', 'block_detector', 'proxy_pool', 'locator_engine', 'dead_letters'):
+        return globals()[target]
+
+    raise ValueError(f'Unknown shared object {target!r}')
+
+
+def run_worker_process(worker_id, conn, fields, repaired_fields):
+    """
+    Worker Process: Entry point of a worker started by serve_worker_process(). The process starts from a fresh
+    interpreter, so the command line options are parsed again and the state decided by main() is passed in.
+    The rate control, block detection, proxies, metrics and dead letters of the main process are used through the
+    pipe, so they cover all the workers. The xpath lookups are counted here and in the main process, which saves them.
+
+    Args:
+        worker_id (int): Identifier of the worker.
+        conn (Connection): The worker end of the pipe.
+        fields (list): The fields of the job, after projection.
+        repaired_fields (dict): Fields to scrape again by url, when repairing.
+    """
+    global rate_controller, block_detector, proxy_pool, job_metrics, dead_letters
+
+    parse_arguments()
+    project_fields(fields)
+    repair_fields.update(repaired_fields)
+    page_watchdog.start()
+
+    work = ProcessWork(conn, records)
+    rate_controller = RemoteRateController(work, 'rate_controller')
+    block_detector = RemoteObject(work, 'block_detector')
+    proxy_pool = RemoteObject(work, 'proxy_pool')
+    job_metrics = RemoteMetrics(work)
+    dead_letters = RemoteDeadLetters(work, 'dead_letters')
+
+    # Start from the xpath order learned by the previous runs, like the main process
+    locator_engine.load(locator_stats_filepath)
+    locator_engine.forward = RemoteObject(work, 'locator_engine').record
+
+    try:
+        if tabs_per_worker > 1:
+            crawl_records_in_tabs(work, worker_id)
+        else:
+            crawl_records(work, worker_id)
+    finally:
+        work.close()
 
 
 def main():
@@ -218,30 +1017,271 @@ def main():
         2. Extract the relevent details of item
         3. Store in csv
     """
-    global csv_writer
+    global csv_writer, output_filepath
     
     try:
-        # Initialize CSV writer for writing headers
-        csv_writer = utils.get_csv_writer(output_filepath, "w")
-        csv_writer.writerow(list(records_template.keys()))
+        # A repair scrapes only the missing fields of the incomplete rows, into a patches file merged at the end
+        if repair_filepath:
+            repair_rules = repair.load_rules(repair_rules_filepath)
+            repair_fields.update(repair.find_incomplete(repair_filepath, repair_rules, list(field_locators)))
+            if not repair_fields:
+                logging.info(f"Nothing to repair in {repair_filepath}")
+                return
+
+            project_fields([field for field in field_locators if any(field in fields for fields in repair_fields.values())])
+            output_filepath = repair_patches_filepath
+
+        # Reviews are added to the reviews file run after run, from the review counts of the output
+        review_pages, review_counts = [], {}
+        if reviews_mode:
+            if not replay_filepath:
+                review_state = reviews.load_state(reviews_state_filepath)
+                review_pages, review_counts = reviews.plan_review_pages(output_filepath, review_state)
+                logging.info(f"{len(review_pages)} review page(s) of {len(review_counts)} restaurant(s) to scrape")
+            output_filepath = reviews_filepath
+
+        # Drop the proxies which cannot reach the site before any session uses them
+        if len(proxy_pool):
+            latencies = proxy_pool.probe(proxy_test_url)
+            reachable = [latency for latency in latencies.values() if latency is not None]
+            if not reachable:
+                raise RuntimeError(f'No proxy of {proxies_filepath} reached {proxy_test_url}')
+            logging.info(f"{len(reachable)} of {len(latencies)} proxies reachable, "
+                         f"{sum(reachable) / len(reachable):.2f}s on average")
+
+        # Initialize CSV writer for writing headers, a replay or a reviews run appends to the existing output
+        if not ((replay_filepath or reviews_mode) and os.path.isfile(output_filepath)):
+            csv_writer = utils.get_csv_writer(output_filepath, "w")
+            csv_writer.writerow(reviews.reviews_header if reviews_mode else list(records_template.keys()))
 
         # Initialize CSV writer for appending data
         csv_writer = utils.get_csv_writer(output_filepath, "a")
+
+        if not profile_template.is_ready():
+            logging.warning(f"No profile template in {profile_template.template_dir}, sessions start with a fresh profile "
+                            f"(run python browser_profiles.py to prepare it)")
+
+        # Expose live counters for monitoring and autoscaling
+        if metrics_port:
+            try:
+                metrics.start_metrics_server(job_metrics, metrics_host, metrics_port)
+            except OSError as e:
+                # Monitoring is optional, the scrape runs without it
+                logging.error(f"Metrics endpoint disabled, unable to bind {metrics_host}:{metrics_port}: {e}")
+
+        # Profiling can be toggled by signal during the run, or enabled from the start
+        job_profiler.install_signal_handler()
+        if profile:
+            job_profiler.start()
         
-        # Read item URLs from the file
-        with open('items_urls.csv', 'r') as file:
-            urls = file.read().split('\n')[1:-1]
+        # Read item URLs from the file, or the failed URLs of a previous run when replaying
+        if replay_filepath:
+            urls = failures.read_dead_letters(replay_filepath)
 
-        total_items = len(urls)
-        limit = math.ceil(total_items / workers)
-        start = 0
+            # Keep the replayed file aside, urls failing again are written to a fresh dead letters file
+            if os.path.abspath(replay_filepath) == os.path.abspath(dead_letters.file_path):
+                os.replace(replay_filepath, f'{os.path.splitext(replay_filepath)[0]}.replayed.csv')
+        elif repair_filepath:
+            urls = list(repair_fields)
+        elif reviews_mode:
+            urls = review_pages
+        elif coordinator_url:
+            urls = []
+        else:
+            # Memory mapped, the urls are read one by one when the workers pull them
+            urls = LineIndex('items_urls.csv')
+            if input_lines:
+                urls = urls[input_lines]
+                logging.info(f"Input lines {input_lines.start}:{input_lines.stop}:{input_lines.step}: {len(urls)} url(s)")
+
+        # Try the xpaths which matched most in the previous runs first
+        locator_engine.load(locator_stats_filepath)
+
+        # Keep the urls of this host, the partition is the same on every host
+        if shard:
+            in_shard = lambda url: utils.get_shard(url, shard[1]) == shard[0]
+            urls = urls.filter(in_shard) if isinstance(urls, LineIndex) else [url for url in urls if in_shard(url)]
+            logging.info(f"Shard {shard[0]}/{shard[1]}: {len(urls)} url(s)")
+
+        # Only the reviews not in the reviews file yet are written
+        if reviews_mode:
+            review_sink.load(output_filepath, {utils.get_restaurant_id(url) for url in urls})
 
         # Start processing with multiple workers
-        start_workers(urls, start, limit)
+        start_workers(urls)
+
+        # Keep the hit counts for the next run and warn about the fields whose xpaths stopped matching
+        locator_engine.save(locator_stats_filepath)
+        locator_engine.log_report()
+        logging.info(f"Pages by layout template: {job_metrics.snapshot()['templates']}")
+
+        # Patch the repaired values into the output
+        if repair_filepath:
+            patched = repair.merge_patches(repair_filepath, repair.read_patches(output_filepath, repair_rules),
+                                           repair_rules)
+            logging.info(f"Repaired {patched} value(s) of {len(repair_fields)} incomplete url(s) in {repair_filepath}")
+
+        # The next reviews run only scrapes the pages of the reviews added meanwhile. A restaurant with a failed
+        # page keeps its previous count, its pages are planned again
+        if reviews_mode:
+            review_counts = reviews.completed_counts(review_pages, review_counts, review_sink.pages)
+            reviews.save_state({**reviews.load_state(reviews_state_filepath), **review_counts}, reviews_state_filepath)
+            logging.info(f"{review_sink.written} new review(s) written to {output_filepath}")
+
+        # Write the final profile dump
+        job_profiler.stop()
+
+        if dead_letters.count:
+            logging.warning(f"{dead_letters.count} url(s) failed permanently, see {dead_letters.file_path}")
 
     except Exception as e:
         logging.error(f"An error occurred during the main process: {e}")
         raise
 
+def parse_arguments():
+    """
+    Parses the command line options. The variables at the top of this file are used as defaults.
+    """
+    global workers, metrics_port, profile, profile_dir, max_retries, replay_filepath, dead_letters_filepath
+    global page_deadline, hedge_after, start_rate, max_rate, proxies_filepath, proxy_test_url, proxy_pool
+    global profile_template_dir
+    global tabs_per_worker, recycle_tabs_after, extraction_backend, selected_fields, repair_filepath
+    global repair_rules_filepath, input_lines, shard, output_filepath, coordinator_url, lease_batch_size, executor
+    global autotune, min_workers, max_workers, autotune_interval, session_memory_limit, memory_reserve
+    global photo_links_filepath, reviews_mode, reviews_filepath, reviews_state_filepath
+
+    parser = argparse.ArgumentParser(description='Scrapes the TripAdvisor restaurant urls.')
+    parser.add_argument('--workers', type=int, default=workers,
+                        help='Number of workers, 0 sizes the pool from the CPU and memory limits (cgroup aware).')
+    parser.add_argument('--executor', choices=('thread', 'process'), default=executor,
+                        help='Run the workers as threads, or each in its own process.')
+    parser.add_argument('--metrics-port', type=int, default=metrics_port, help='Metrics port, 0 disables it.')
+    parser.add_argument('--profile', action='store_true', default=profile,
+                        help='Run the sampling profiler from the start (SIGUSR1 toggles it).')
+    parser.add_argument('--profile-dir', default=profile_dir, help='Directory of the profiler dumps.')
+    parser.add_argument('--max-retries', type=int, default=max_retries, help='Retries of a url on transient failures.')
+    parser.add_argument('--dead-letters', default=dead_letters_filepath, help='CSV file of permanently failed urls.')
+    parser.add_argument('--photo-links', default=photo_links_filepath,
+                        help='Collect the photo urls of the pages into this CSV file, see photos.py to download them.')
+    parser.add_argument('--replay', default=replay_filepath, help='Scrape the urls of a dead letters file.')
+    parser.add_argument('--page-deadline', type=float, default=page_deadline,
+                        help='Seconds a worker may spend on a single page.')
+    parser.add_argument('--hedge-after', type=float, default=hedge_after,
+                        help='Once the queue is drained, re-dispatch urls in flight for this many seconds.')
+    parser.add_argument('--start-rate', type=float, default=start_rate, help='Initial requests per second per host.')
+    parser.add_argument('--max-rate', type=float, default=max_rate, help='Highest requests per second per host.')
+    parser.add_argument('--proxies', default=proxies_filepath, help='File with one proxy per line.')
+    parser.add_argument('--proxy-test-url', default=proxy_test_url,
+                        help='Url fetched through every proxy at startup, the proxies failing it are dropped.')
+    parser.add_argument('--profile-template', default=profile_template_dir,
+                        help='Warm Chrome profile cloned for every session (python browser_profiles.py builds it).')
+    parser.add_argument('--tabs', type=int, default=tabs_per_worker,
+                        help='Tabs per browser, driven from one event loop (dom backend only, without page templates).')
+    parser.add_argument('--recycle-tabs-after', type=int, default=recycle_tabs_after,
+                        help='Pages after which a tab is replaced by a fresh one.')
+    parser.add_argument('--backend', choices=('dom', 'network', 'structured', 'http'), default=extraction_backend,
+                        help='Where the fields are read first (JSON responses, JSON-LD/embedded state of the rendered '
+                             'or raw page), the DOM fills the gaps.')
+    parser.add_argument('--fields', default=','.join(selected_fields),
+                        help=f'Comma separated fields to extract and write, all by default: {",".join(field_locators)}.')
+    parser.add_argument('--repair', default=repair_filepath,
+                        help='Scrape again the missing or suspect fields of an output file and merge them in place.')
+    parser.add_argument('--repair-rules', default=repair_rules_filepath,
+                        help='JSON file mapping a field to regular expressions of its suspect values.')
+    parser.add_argument('--reviews', action='store_true', default=reviews_mode,
+                        help=f'Scrape the new reviews of the restaurants of the output file into {reviews_filepath}.')
+    parser.add_argument('--lines', default='',
+                        help='START:STOP[:STEP] of the input urls, e.g. 250000: to resume or ::100 to sample.')
+    parser.add_argument('--shard', default='',
+                        help='i/N: scrape the i-th of N disjoint slices of the urls (0 <= i < N) into its own output.')
+    parser.add_argument('--coordinator', default=coordinator_url,
+                        help='Url of a coordinator (python coordinator.py) to lease the urls from.')
+    parser.add_argument('--lease-batch', type=int, default=lease_batch_size, help='Urls per lease.')
+    parser.add_argument('--autotune', action='store_true', default=autotune,
+                        help='Start with --min-workers and adapt the worker count to the throughput and resources.')
+    parser.add_argument('--min-workers', type=int, default=min_workers, help='Lower bound of the autotuner.')
+    parser.add_argument('--max-workers', type=int, default=max_workers,
+                        help='Upper bound of the autotuner, 0 uses the CPU and memory limits.')
+    parser.add_argument('--autotune-interval', type=float, default=autotune_interval,
+                        help='Seconds between two decisions of the autotuner.')
+    parser.add_argument('--session-memory-limit', type=int, default=session_memory_limit,
+                        help='MiB of resident memory after which a browser session is recycled between urls.')
+    parser.add_argument('--memory-reserve', type=int, default=memory_reserve,
+                        help='MiB of available memory under which new work is held back.')
+    args = parser.parse_args()
+
+    if args.autotune and args.tabs > 1:
+        parser.error('--autotune adjusts whole workers, it cannot be combined with --tabs')
+    if args.reviews and (args.tabs > 1 or args.repair or args.coordinator):
+        parser.error('--reviews cannot be combined with --tabs, --repair or --coordinator')
+    # Tabs run the DOM locators only, from a script in the page
+    if args.tabs > 1 and (args.backend != 'dom' or args.photo_links):
+        parser.error('--tabs only supports the dom backend, it cannot be combined with --backend or --photo-links')
+
+    selected_fields = [field.strip() for field in args.fields.split(',') if field.strip()]
+    unknown_fields = [field for field in selected_fields if field not in field_locators]
+    if unknown_fields:
+        parser.error(f'Unknown field(s): {", ".join(unknown_fields)}')
+    if selected_fields:
+        project_fields(selected_fields)
+    repair_filepath = args.repair
+    reviews_mode = args.reviews
+    repair_rules_filepath = args.repair_rules
+
+    workers = args.workers or resources.default_workers()
+    executor = args.executor
+    autotune = args.autotune
+    min_workers = args.min_workers
+    max_workers = args.max_workers
+    autotune_interval = args.autotune_interval
+    session_memory_limit = args.session_memory_limit
+    memory_governor.session_limit = session_memory_limit * 2 ** 20
+    memory_reserve = args.memory_reserve
+    memory_governor.reserve = memory_reserve * 2 ** 20
+    metrics_port = args.metrics_port
+    profile = args.profile
+    profile_dir = job_profiler.output_dir = args.profile_dir
+    max_retries = args.max_retries
+    replay_filepath = args.replay
+    dead_letters_filepath = dead_letters.file_path = args.dead_letters
+    photo_links_filepath = photo_links.file_path = args.photo_links
+    page_deadline = args.page_deadline
+    page_watchdog.deadline = page_deadline + 10     # Leave the native page load timeout a chance first
+    hedge_after = args.hedge_after
+    start_rate = rate_controller.start_rate = args.start_rate
+    max_rate = rate_controller.max_rate = args.max_rate
+    proxies_filepath = args.proxies
+    proxy_test_url = args.proxy_test_url
+    if proxies_filepath:
+        proxy_pool = ProxyPool.from_file(proxies_filepath)
+    profile_template_dir = profile_template.template_dir = args.profile_template
+    tabs_per_worker = args.tabs
+    recycle_tabs_after = args.recycle_tabs_after
+    extraction_backend = args.backend
+    coordinator_url = args.coordinator
+    lease_batch_size = args.lease_batch
+    if args.lines:
+        try:
+            bounds = [int(bound) if bound else None for bound in args.lines.split(':')]
+            input_lines = slice(*bounds) if 2 <= len(bounds) <= 3 else None
+        except ValueError:
+            input_lines = None
+        if input_lines is None or input_lines.step == 0:
+            parser.error(f'Invalid lines {args.lines}, expected START:STOP[:STEP]')
+    if args.shard:
+        index, _, count = args.shard.partition('/')
+        if not (index.isdigit() and count.isdigit() and int(index) < int(count)):
+            parser.error(f'Invalid shard {args.shard}, expected i/N with 0 <= i < N')
+        shard = (int(index), int(count))
+
+        # Every shard writes its own output, dead letters and reviews
+        suffix = f'.shard-{shard[0]}-of-{shard[1]}'
+        output_filepath = suffix.join(os.path.splitext(output_filepath))
+        dead_letters_filepath = dead_letters.file_path = suffix.join(os.path.splitext(dead_letters_filepath))
+        reviews_filepath = suffix.join(os.path.splitext(reviews_filepath))
+        reviews_state_filepath = suffix.join(os.path.splitext(reviews_state_filepath))
+
+
 if __name__ == "__main__":
+    parse_arguments()
     main()
\ No newline at end of file
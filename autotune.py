@@ -0,0 +1,149 @@
+import os
+from time import time
+
+import resources
+
+
+def _percentile(buckets, counts, fraction):
+    total = sum(counts)
+    if not total:
+        return None
+
+    cumulative = 0
+    for bound, count in zip(list(buckets) + [float('inf')], counts):
+        cumulative += count
+        if cumulative >= fraction * total:
+            return bound
+
+    return float('inf')
+
+
+class Autotuner:
+    """
+    Adjusts the number of workers during a run from the measured throughput and the health of the job and host.
+
+    Every observe() compares the metrics of the last interval with the previous one and moves the worker count
+    by one step, in order of priority:
+        - down when the host runs out of memory, or the error or block rate of the interval is too high
+        - back down when the last step up did not raise the throughput, or made the p95 page time much worse,
+          and that count is not tried again for a while
+        - hold when the CPUs are saturated
+        - up otherwise, while there are urls left
+
+    Args:
+        min_workers (int): Lower bound of the worker count.
+        max_workers (int): Upper bound of the worker count.
+        min_gain (float): Relative throughput gain a step up must bring to be kept.
+        max_latency_growth (float): Relative growth of the p95 page time that makes a step up rejected.
+        max_error_rate (float): Share of failed pages above which workers are removed.
+        max_block_rate (float): Share of blocked pages above which workers are removed.
+        max_cpu_load (float): Load average per available CPU above which workers are not added.
+        min_free_memory (int): Bytes of available memory under which workers are removed.
+        hold_intervals (int): Intervals during which a rejected worker count is not tried again.
+    """
+
+    def __init__(self, min_workers=1, max_workers=8, min_gain=0.05, max_latency_growth=0.5, max_error_rate=0.2,
+                 max_block_rate=0.05, max_cpu_load=0.9, min_free_memory=resources.browser_memory, hold_intervals=5):
+        self.min_workers = min_workers
+        self.max_workers = max(min_workers, max_workers)
+        self.min_gain = min_gain
+        self.max_latency_growth = max_latency_growth
+        self.max_error_rate = max_error_rate
+        self.max_block_rate = max_block_rate
+        self.max_cpu_load = max_cpu_load
+        self.min_free_memory = min_free_memory
+        self.hold_intervals = hold_intervals
+        self._last = None
+        self._previous_interval = None
+        self._last_step = 0
+        self._ceiling = None
+        self._ceiling_ttl = 0
+
+    def _measure(self, snapshot, now):
+        last, self._last = self._last, (now, snapshot)
+        if last is None:
+            return None
+
+        elapsed = now - last[0]
+        previous = last[1]
+        pages = snapshot['finished'] - previous['finished']
+        failures = {kind: count - previous['failures'].get(kind, 0) for kind, count in snapshot['failures'].items()}
+        failed = sum(failures.values())
+        attempts = pages + failed
+        counts = [count - previous_count for count, previous_count in
+                  zip(snapshot['page_seconds']['counts'], previous['page_seconds']['counts'])]
+
+        return {
+            'pages_per_second': pages / elapsed if elapsed > 0 else 0.0,
+            'p95_seconds': _percentile(snapshot['page_seconds']['buckets'], counts, 0.95),
+            'error_rate': failed / attempts if attempts else 0.0,
+            'block_rate': failures.get('blocked', 0) / attempts if attempts else 0.0,
+            'attempts': attempts,
+        }
+
+    def observe(self, snapshot, workers, remaining, now=None):
+        """
+        Decides the worker count for the next interval.
+
+        Args:
+            snapshot (dict): The current Metrics.snapshot().
+            workers (int): The number of running workers.
+            remaining (int): Urls not yet picked up by a worker.
+            now (float): Current time, for tests.
+
+        Returns:
+            target (int): The worker count to run.
+            reason (str): Why, for the logs.
+        """
+        interval = self._measure(snapshot, time() if now is None else now)
+        previous, self._previous_interval = self._previous_interval, interval
+        last_step, self._last_step = self._last_step, 0
+
+        if self._ceiling_ttl:
+            self._ceiling_ttl -= 1
+            if not self._ceiling_ttl:
+                self._ceiling = None
+
+        if interval is None or not interval['attempts']:
+            return workers, 'waiting for samples'
+
+        free_memory = resources.available_memory()
+        cpu_load = os.getloadavg()[0] / resources.cpu_limit() if hasattr(os, 'getloadavg') else 0.0
+
+        if free_memory < self.min_free_memory and workers > self.min_workers:
+            return self._step(workers, -1), f'{free_memory / 2 ** 20:.0f} MiB of memory available'
+
+        if interval['block_rate'] > self.max_block_rate and workers > self.min_workers:
+            return self._step(workers, -1), f"block rate {interval['block_rate']:.0%}"
+
+        if interval['error_rate'] > self.max_error_rate and workers > self.min_workers:
+            return self._step(workers, -1), f"error rate {interval['error_rate']:.0%}"
+
+        if last_step > 0 and previous:
+            gain = (interval['pages_per_second'] - previous['pages_per_second']) / (previous['pages_per_second'] or 1e-9)
+            slower = (interval['p95_seconds'] and previous['p95_seconds'] and
+                      interval['p95_seconds'] > previous['p95_seconds'] * (1 + self.max_latency_growth))
+
+            if gain < self.min_gain or slower:
+                self._ceiling, self._ceiling_ttl = workers, self.hold_intervals
+                return self._step(workers, -1), (f"last step up gained {gain:+.0%} pages/sec"
+                                                 f"{', p95 page time grew' if slower else ''}")
+
+        if cpu_load > self.max_cpu_load:
+            return workers, f'CPU load {cpu_load:.0%}'
+
+        if not remaining:
+            return workers, 'no urls left to spread'
+
+        if workers >= self.max_workers or (self._ceiling and workers + 1 >= self._ceiling):
+            return workers, f"at the limit, {interval['pages_per_second']:.2f} pages/sec"
+
+        return self._step(workers, 1), f"{interval['pages_per_second']:.2f} pages/sec, probing one more worker"
+
+    def _step(self, workers, step):
+        if step > 0:
+            target = min(self.max_workers, workers + step)
+        else:
+            target = max(min(workers, self.min_workers), workers + step)
+        self._last_step = target - workers
+        return target
@@ -0,0 +1,129 @@
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+from datetime import datetime
+
+from locators import Locators
+import utils
+
+# Variables
+template_dir = 'chrome_profile_template'
+base_url = 'https://www.tripadvisor.com'
+warmup_url = ('https://www.tripadvisor.com/Restaurant_Review-g60763-d1878682-Reviews-Olio_E_Piu-'
+              'New_York_City_New_York.html')
+ready_marker = '.template_ready'
+
+# Locks, crash dumps and GPU caches are tied to the browser process that wrote them and must not be cloned
+clone_ignore_patterns = shutil.ignore_patterns('Singleton*', 'lockfile', 'LOCK', '*.lock', 'Crashpad', 'Crash Reports',
+                                               'BrowserMetrics*', 'ShaderCache', 'GrShaderCache', 'GraphiteDawnCache',
+                                               'DawnCache', ready_marker)
+
+
+class ProfileTemplate:
+    """
+    Warm Chrome profile prepared once and cloned into a private directory for every browser session.
+
+    The template has the consent banner accepted, the site cookies set and the caches primed, so sessions
+    started from a clone skip the consent interstitial and the first visit overhead. Every clone is an
+    ephemeral directory, so concurrent browsers never share a profile. Clones are removed on exit.
+
+    Args:
+        template_dir (str): Directory of the template profile.
+        clones_dir (str): Parent directory of the clones, defaults to the system temp directory.
+    """
+
+    def __init__(self, template_dir=template_dir, clones_dir=None):
+        self.template_dir = template_dir
+        self.clones_dir = clones_dir
+        self._clones = set()
+        atexit.register(self.cleanup_all)
+
+    def is_ready(self):
+        """
+        Returns:
+            Status (bool): True if the template was prepared.
+        """
+        return os.path.isfile(os.path.join(self.template_dir, ready_marker))
+
+    def prepare(self, cookies=None, headless=True):
+        """
+        Builds the template: opens the site with a fresh profile, accepts the consent banner,
+        sets the given cookies and visits a restaurant page to prime the caches.
+
+        Args:
+            cookies (list): Cookie dictionaries (name, value, ...) to add for the site.
+            headless (bool): Run the preparation browser in the background.
+        """
+        if os.path.isdir(self.template_dir):
+            shutil.rmtree(self.template_dir)
+        utils.create_files_dir(self.template_dir)
+
+        driver = utils.load_driver(headless=headless, user_data_dir=os.path.abspath(self.template_dir))
+
+        try:
+            driver.get(base_url)
+
+            consent_button = utils.clickable_elem(driver, Locators.CONSENT_ACCEPT_BUTTON_XPATH, _wait_in_secs=10)
+            if consent_button:
+                consent_button.click()
+            else:
+                logging.info("No consent banner found while preparing the profile template")
+
+            for cookie in cookies or []:
+                driver.add_cookie(cookie)
+
+            driver.get(warmup_url)
+            utils.wait_for_elem(driver, Locators.NAME_XPATH)
+
+        finally:
+            driver.quit()
+
+        with open(os.path.join(self.template_dir, ready_marker), 'w', encoding='utf-8') as f:
+            f.write(datetime.now().isoformat(timespec='seconds'))
+
+        logging.info(f"Profile template ready in {self.template_dir}")
+
+    def clone(self):
+        """
+        Copies the template into a new private directory.
+
+        Returns:
+            clone_dir (str): Absolute path of the clone, to pass as the Chrome user data dir.
+        """
+        if self.clones_dir:
+            utils.create_files_dir(self.clones_dir)
+
+        clone_dir = tempfile.mkdtemp(prefix='chrome-profile-', dir=self.clones_dir)
+        shutil.copytree(self.template_dir, clone_dir, ignore=clone_ignore_patterns, dirs_exist_ok=True)
+        self._clones.add(clone_dir)
+
+        return clone_dir
+
+    def cleanup(self, clone_dir):
+        """
+        Removes a clone once its browser has quit.
+
+        Args:
+            clone_dir (str): The clone directory returned by clone().
+        """
+        if clone_dir:
+            shutil.rmtree(clone_dir, ignore_errors=True)
+            self._clones.discard(clone_dir)
+
+    def cleanup_all(self):
+        for clone_dir in list(self._clones):
+            self.cleanup(clone_dir)
+
+
+def main():
+    """
+    Prepares the profile template used by the scraper workers.
+    """
+    logging.basicConfig(level=logging.INFO)
+    ProfileTemplate(template_dir).prepare()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+import argparse
+import csv
+import logging
+import os
+import shutil
+import tempfile
+
+import external_sort
+import utils
+
+# Variables
+changes_header = ['Change', 'Restaurant_id', 'Item_url', 'Field', 'Old_value', 'New_value']
+
+
+def _sorted_rows(file_path, runs_dir, _chunk_rows):
+    header, runs = external_sort.sort_into_runs([file_path], runs_dir, _chunk_rows)
+
+    if header is None:
+        return [], iter(())
+
+    return header, external_sort.merge_runs(runs, header)
+
+
+def join_outputs(old_rows, new_rows):
+    """This function joins two streams of rows ordered by restaurant (see external_sort.record_key).
+
+    Args:
+        old_rows (iterable): The rows of the previous output, one per restaurant.
+        new_rows (iterable): The rows of the latest output, one per restaurant.
+
+    Returns:
+        pairs (generator): (old_row, new_row) by restaurant, None on the side missing it.
+    """
+    old_rows, new_rows = iter(old_rows), iter(new_rows)
+    old, new = next(old_rows, None), next(new_rows, None)
+
+    while old is not None or new is not None:
+        old_key = external_sort.record_key(old) if old is not None else None
+        new_key = external_sort.record_key(new) if new is not None else None
+
+        if new is None or (old is not None and old_key < new_key):
+            yield old, None
+            old = next(old_rows, None)
+        elif old is None or new_key < old_key:
+            yield None, new
+            new = next(new_rows, None)
+        else:
+            yield old, new
+            old, new = next(old_rows, None), next(new_rows, None)
+
+
+def _restaurant_id(row):
+    url = row.get(external_sort.key_column) or ''
+
+    return utils.get_restaurant_id(url) if url else row.get('Name') or ''
+
+
+def diff_outputs(old_filepath, new_filepath, merged_filepath, changes_filepath,
+                 _chunk_rows=external_sort.chunk_rows):
+    """This function compares two generations of the scraper output by restaurant and writes:
+        - the consolidated output: the latest row of every restaurant, the restaurants missing from the new
+          output are kept as last seen
+        - the change feed: one row per added or removed restaurant, and one per changed field
+
+    Both outputs are sorted on disk in chunks and joined as streams, so memory use does not depend on their size.
+    Only the columns of both outputs are compared, the others are carried over to the consolidated output.
+
+    Args:
+        old_filepath (str): The previous output CSV file.
+        new_filepath (str): The latest output CSV file.
+        merged_filepath (str): The consolidated CSV file.
+        changes_filepath (str): The change feed CSV file.
+        _chunk_rows (int): Rows held in memory at once.
+
+    Returns:
+        counts (dict): Number of added, removed, changed and unchanged restaurants.
+    """
+    runs_dir = tempfile.mkdtemp(prefix='diff-runs-', dir=os.path.dirname(os.path.abspath(merged_filepath)))
+    counts = {'added': 0, 'removed': 0, 'changed': 0, 'unchanged': 0}
+
+    try:
+        old_header, old_rows = _sorted_rows(old_filepath, runs_dir, _chunk_rows)
+        new_header, new_rows = _sorted_rows(new_filepath, runs_dir, _chunk_rows)
+        merged_header = new_header + [column for column in old_header if column not in new_header]
+        compared = [column for column in new_header if column in old_header]
+
+        with open(merged_filepath, 'w', encoding='utf-8', newline='') as merged_file, \
+                open(changes_filepath, 'w', encoding='utf-8', newline='') as changes_file:
+            merged_writer = csv.DictWriter(merged_file, fieldnames=merged_header, lineterminator='\n',
+                                           extrasaction='ignore')
+            changes_writer = csv.writer(changes_file, lineterminator='\n')
+            merged_writer.writeheader()
+            changes_writer.writerow(changes_header)
+
+            for old, new in join_outputs(old_rows, new_rows):
+                latest = new if new is not None else old
+                url = latest.get(external_sort.key_column) or (old or {}).get(external_sort.key_column) or ''
+
+                if old is None:
+                    counts['added'] += 1
+                    changes_writer.writerow(['added', _restaurant_id(new), url, '', '', ''])
+                elif new is None:
+                    counts['removed'] += 1
+                    changes_writer.writerow(['removed', _restaurant_id(old), url, '', '', ''])
+                else:
+                    # Latest wins, the columns the new output lacks keep their old values
+                    latest = {**old, **new}
+                    changed = [column for column in compared if (old.get(column) or '') != (new.get(column) or '')]
+
+                    counts['changed' if changed else 'unchanged'] += 1
+                    for column in changed:
+                        changes_writer.writerow(['changed', _restaurant_id(new), url, column, old.get(column) or '',
+                                                 new.get(column) or ''])
+
+                merged_writer.writerow(latest)
+
+    except Exception as e:
+        logging.error(f"An error occurred while comparing {old_filepath} with {new_filepath}: {e}")
+        raise
+
+    finally:
+        shutil.rmtree(runs_dir, ignore_errors=True)
+
+    return counts
+
+
+def main():
+    """
+    Compares two outputs: python changefeed.py outputs/pages-old.csv outputs/pages.csv
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Merges two generations of the scraper output and lists the changes.')
+    parser.add_argument('old', help='Previous output CSV file.')
+    parser.add_argument('new', help='Latest output CSV file.')
+    parser.add_argument('-o', '--output', default='outputs/pages_merged.csv', help='Consolidated CSV file.')
+    parser.add_argument('--changes', default='outputs/changes.csv', help='Change feed CSV file.')
+    parser.add_argument('--chunk-rows', type=int, default=external_sort.chunk_rows,
+                        help='Rows sorted in memory at once.')
+    args = parser.parse_args()
+
+    counts = diff_outputs(args.old, args.new, args.output, args.changes, args.chunk_rows)
+    logging.info(f"{counts['added']} added, {counts['removed']} removed, {counts['changed']} changed and "
+                 f"{counts['unchanged']} unchanged restaurant(s), see {args.changes}")
+
+
+if __name__ == "__main__":
+    main()
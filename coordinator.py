@@ -0,0 +1,437 @@
+import argparse
+import json
+import logging
+import os
+import socket
+import sqlite3
+import urllib.request
+import uuid
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Event, Lock, Thread
+from time import sleep, time
+
+# Variables
+db_filepath = 'outputs/coordinator.db'
+host = '127.0.0.1'
+port = 9200
+visibility_timeout = 300    # Seconds a lease stays valid without a heartbeat, then its urls are leased again
+batch_size = 20
+
+
+class LeaseStore:
+    """
+    SQLite table of the urls of a job, leased in batches to scraper processes.
+
+    A lease hides its urls from the other consumers until it expires. Heartbeats extend it, and the urls of a dead
+    consumer are leased again once its lease expired. Every url is recorded as done at most once: the first
+    completion wins, later ones (e.g. from a consumer whose lease expired while it was still working) are rejected.
+
+    Args:
+        file_path (str): Path of the SQLite database, created if missing.
+        visibility_timeout (float): Seconds a lease stays valid without a heartbeat.
+    """
+
+    def __init__(self, file_path=db_filepath, visibility_timeout=visibility_timeout):
+        self.visibility_timeout = visibility_timeout
+        self._lock = Lock()
+        self._db = sqlite3.connect(file_path, check_same_thread=False, isolation_level=None)
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('''CREATE TABLE IF NOT EXISTS urls (
+                                url TEXT PRIMARY KEY,
+                                status TEXT NOT NULL DEFAULT 'pending',
+                                lease_id TEXT,
+                                consumer TEXT,
+                                lease_expires REAL,
+                                leases INTEGER NOT NULL DEFAULT 0,
+                                reason TEXT,
+                                finished_at REAL)''')
+        self._db.execute('CREATE INDEX IF NOT EXISTS urls_status ON urls (status, lease_expires)')
+
+    def add(self, urls):
+        """
+        Adds urls to the job, urls already known are ignored.
+
+        Args:
+            urls (iterable): The urls to scrape.
+
+        Returns:
+            added (int): Number of new urls.
+        """
+        with self._lock:
+            before = self._db.total_changes
+            self._db.execute('BEGIN')
+            self._db.executemany('INSERT OR IGNORE INTO urls (url) VALUES (?)', ((url,) for url in urls if url))
+            self._db.execute('COMMIT')
+            return self._db.total_changes - before
+
+    def lease(self, consumer, count=batch_size):
+        """
+        Leases a batch of pending urls, or of urls whose lease expired.
+
+        Args:
+            consumer (str): Name of the consumer, for monitoring.
+            count (int): Maximum number of urls.
+
+        Returns:
+            lease (dict): The lease id, its urls and whether the whole job is finished.
+        """
+        now = time()
+        lease_id = uuid.uuid4().hex
+
+        with self._lock:
+            self._db.execute('BEGIN IMMEDIATE')
+            urls = [row[0] for row in self._db.execute(
+                "SELECT url FROM urls WHERE status = 'pending' OR (status = 'leased' AND lease_expires < ?) "
+                "ORDER BY rowid LIMIT ?", (now, count))]
+            self._db.executemany(
+                "UPDATE urls SET status = 'leased', lease_id = ?, consumer = ?, lease_expires = ?, leases = leases + 1 "
+                "WHERE url = ?", ((lease_id, consumer, now + self.visibility_timeout, url) for url in urls))
+            self._db.execute('COMMIT')
+            unfinished = self._db.execute(
+                "SELECT COUNT(*) FROM urls WHERE status IN ('pending', 'leased')").fetchone()[0]
+
+        return {'lease_id': lease_id, 'urls': urls, 'finished': unfinished == 0,
+                'visibility_timeout': self.visibility_timeout}
+
+    def heartbeat(self, lease_id):
+        """
+        Extends a lease.
+
+        Returns:
+            count (int): Number of urls still held by the lease, 0 if it expired and was taken over.
+        """
+        with self._lock:
+            return self._db.execute("UPDATE urls SET lease_expires = ? WHERE lease_id = ? AND status = 'leased'",
+                                    (time() + self.visibility_timeout, lease_id)).rowcount
+
+    def complete(self, url, lease_id):
+        """
+        Records a scraped url.
+
+        Returns:
+            Status (bool): True if this is the first completion of the url and its record must be kept.
+        """
+        with self._lock:
+            return self._db.execute("UPDATE urls SET status = 'done', lease_id = ?, finished_at = ? "
+                                    "WHERE url = ? AND status != 'done'", (lease_id, time(), url)).rowcount == 1
+
+    def fail(self, url, lease_id, reason=''):
+        """
+        Records a url which failed permanently, unless another lease holds it now or it was completed.
+
+        Returns:
+            Status (bool): True if the failure was recorded.
+        """
+        with self._lock:
+            return self._db.execute("UPDATE urls SET status = 'failed', reason = ?, finished_at = ? "
+                                    "WHERE url = ? AND lease_id = ? AND status = 'leased'",
+                                    (reason, time(), url, lease_id)).rowcount == 1
+
+    def release(self, url, lease_id):
+        """
+        Returns a url of a lease to the pending urls (e.g. its consumer is shutting down).
+        """
+        with self._lock:
+            self._db.execute("UPDATE urls SET status = 'pending', lease_id = NULL, lease_expires = NULL "
+                             "WHERE url = ? AND lease_id = ? AND status = 'leased'", (url, lease_id))
+
+    def stats(self):
+        """
+        Returns:
+            stats (dict): Number of urls by status, expired leases are counted as 'expired'.
+        """
+        with self._lock:
+            stats = dict(self._db.execute('SELECT status, COUNT(*) FROM urls GROUP BY status').fetchall())
+            stats['expired'] = self._db.execute("SELECT COUNT(*) FROM urls WHERE status = 'leased' "
+                                                "AND lease_expires < ?", (time(),)).fetchone()[0]
+        stats['total'] = sum(count for status, count in stats.items() if status != 'expired')
+
+        return stats
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    store = None
+
+    def _reply(self, status, data):
+        body = json.dumps(data).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path.startswith('/stats'):
+            self._reply(200, self.store.stats())
+        else:
+            self.send_error(404)
+
+    def do_POST(self):
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+
+            if self.path == '/lease':
+                reply = self.store.lease(request['consumer'], int(request.get('count', batch_size)))
+            elif self.path == '/heartbeat':
+                reply = {'count': self.store.heartbeat(request['lease_id'])}
+            elif self.path == '/complete':
+                reply = {'first': self.store.complete(request['url'], request['lease_id'])}
+            elif self.path == '/fail':
+                reply = {'recorded': self.store.fail(request['url'], request['lease_id'], request.get('reason', ''))}
+            elif self.path == '/release':
+                self.store.release(request['url'], request['lease_id'])
+                reply = {}
+            else:
+                self.send_error(404)
+                return
+
+        except (KeyError, ValueError) as e:
+            self._reply(400, {'error': str(e)})
+            return
+
+        self._reply(200, reply)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_coordinator_server(store, host=host, port=port):
+    """
+    Serves a lease store over HTTP (JSON POST /lease, /heartbeat, /complete, /fail, /release, GET /stats)
+    from a daemon thread.
+
+    Args:
+        store (LeaseStore): The store to serve.
+        host (str): Interface to bind.
+        port (int): Port to bind, 0 picks a free port.
+
+    Returns:
+        server (ThreadingHTTPServer): The running server, call shutdown() to stop it.
+    """
+    handler = type('CoordinatorHandler', (_CoordinatorHandler,), {'store': store})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Coordinator available on http://{host}:{server.server_address[1]}")
+
+    return server
+
+
+class LeaseConsumer:
+    """
+    Work queue of the worker threads fed by a coordinator, with the interface of dispatch.Dispatcher.
+
+    The urls are leased in batches shared by the workers of the process. A daemon thread heartbeats the open
+    leases, so they only expire when the process dies or hangs. Hedging is left to the coordinator: urls of
+    an expired lease are simply leased again by another consumer.
+
+    Args:
+        base_url (str): Url of the coordinator, e.g. http://10.0.0.5:9200.
+        consumer (str): Name of this process, defaults to host-pid.
+        batch_size (int): Urls per lease.
+        _poll_in_secs (float): Time between two lease attempts while other consumers hold the remaining urls.
+    """
+
+    def __init__(self, base_url, consumer='', batch_size=batch_size, _poll_in_secs=5):
+        self.base_url = base_url.rstrip('/')
+        self.consumer = consumer or f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = batch_size
+        self.poll_in_secs = _poll_in_secs
+        self.hedged = self.hedges_won = 0
+        self._pending = deque()
+        self._lease_of = {}
+        self._open_leases = {}
+        self._done = set()
+        self._finished = False
+        self._lock = Lock()
+        self._lease_lock = Lock()
+        self._stopped = Event()
+        self._heartbeat_interval = visibility_timeout / 3
+        self._interval_changed = Event()
+
+        Thread(target=self._heartbeat_loop, daemon=True, name='lease-heartbeat').start()
+
+    def _call(self, path, payload=None, _retries=3):
+        data = json.dumps(payload or {}).encode('utf-8') if payload is not None else None
+
+        for attempt in range(1, _retries + 1):
+            try:
+                request = urllib.request.Request(self.base_url + path, data=data,
+                                                 headers={'Content-Type': 'application/json'})
+                with urllib.request.urlopen(request, timeout=30) as response:
+                    return json.loads(response.read())
+            except OSError as e:
+                if attempt == _retries:
+                    raise
+                logging.warning(f"Coordinator call {path} failed ({e}), retrying")
+                sleep(attempt)
+
+    def _heartbeat_loop(self):
+        while not self._stopped.is_set():
+            # The first lease tells the visibility timeout of the coordinator, the wait restarts with it
+            if self._interval_changed.wait(self._heartbeat_interval):
+                self._interval_changed.clear()
+                continue
+
+            with self._lock:
+                lease_ids = [lease_id for lease_id, count in self._open_leases.items() if count]
+
+            for lease_id in lease_ids:
+                try:
+                    if self._call('/heartbeat', {'lease_id': lease_id})['count']:
+                        continue
+                except Exception as e:
+                    logging.warning(f"Heartbeat of lease {lease_id} failed: {e}")
+                    continue
+
+                # The lease expired and its urls were taken over, only the urls already started are finished here
+                logging.warning(f"Lease {lease_id} expired, dropping its urls not yet started")
+                with self._lock:
+                    for url in [url for url in self._pending if self._lease_of.get(url) == lease_id]:
+                        self._pending.remove(url)
+                        self._close(url)
+
+    def total(self):
+        """
+        Returns:
+            Count (int): Number of urls of the job, over all consumers.
+        """
+        return self._call('/stats')['total']
+
+    def remaining(self):
+        """
+        Returns:
+            Count (int): Urls leased by this process and not yet picked up by a worker.
+        """
+        return len(self._pending)
+
+    def get(self, worker_id, timeout=None):
+        """
+        Returns the next url for a worker, leasing a new batch when the local one is drained.
+
+        Args:
+            worker_id: Identifier of the calling worker.
+            timeout (float): Seconds to wait at most for the leases of other consumers, None waits until the job
+                             is finished.
+
+        Returns:
+            url (str): The url to scrape, None when the whole job is finished, or False when the timeout elapsed first.
+        """
+        deadline = time() + timeout if timeout is not None else None
+
+        while True:
+            with self._lock:
+                if self._pending:
+                    return self._pending.popleft()
+
+                if self._finished:
+                    return None
+
+            # One worker leases at a time and the others take from its batch, the call is made without the lock so
+            # complete(), release() and the heartbeats go on meanwhile
+            with self._lease_lock:
+                with self._lock:
+                    if self._pending or self._finished:
+                        continue
+
+                lease = self._call('/lease', {'consumer': self.consumer, 'count': self.batch_size})
+
+                with self._lock:
+                    if lease['visibility_timeout'] / 3 != self._heartbeat_interval:
+                        self._heartbeat_interval = lease['visibility_timeout'] / 3
+                        self._interval_changed.set()
+
+                    for url in lease['urls']:
+                        self._pending.append(url)
+                        self._lease_of[url] = lease['lease_id']
+                    if lease['urls']:
+                        self._open_leases[lease['lease_id']] = len(lease['urls'])
+                        continue
+
+                    self._finished = lease['finished']
+                    if self._finished:
+                        self._stopped.set()
+                        self._interval_changed.set()
+                        return None
+
+            # Other consumers hold the last urls, their leases may still expire
+            if deadline is not None and time() >= deadline:
+                return False
+            sleep(self.poll_in_secs if deadline is None else min(self.poll_in_secs, max(deadline - time(), 0)))
+
+    def _close(self, url):
+        # Called with the lock held, once a url leaves this process
+        lease_id = self._lease_of.pop(url, None)
+        if lease_id in self._open_leases:
+            self._open_leases[lease_id] -= 1
+            if not self._open_leases[lease_id]:
+                del self._open_leases[lease_id]
+        return lease_id
+
+    def is_done(self, url):
+        return url in self._done
+
+    def complete(self, url, worker_id):
+        """
+        Returns:
+            Status (bool): True if this is the first completion of the url over all consumers.
+        """
+        with self._lock:
+            lease_id = self._close(url)
+            self._done.add(url)
+
+        return self._call('/complete', {'url': url, 'lease_id': lease_id})['first']
+
+    def fail(self, url, worker_id, reason=''):
+        """
+        Returns:
+            Status (bool): True if the failure was recorded, False if the url was taken over or completed elsewhere.
+        """
+        with self._lock:
+            lease_id = self._close(url)
+
+        return self._call('/fail', {'url': url, 'lease_id': lease_id, 'reason': reason})['recorded']
+
+    def release(self, url, worker_id):
+        # The url stays in the lease of this process, another worker picks it up first
+        with self._lock:
+            if url not in self._done:
+                self._pending.appendleft(url)
+
+
+def main():
+    """
+    Runs the coordinator: python coordinator.py --add items_urls.csv
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Leases the urls of a job to scraper processes.')
+    parser.add_argument('--db', default=db_filepath, help='SQLite database of the job.')
+    parser.add_argument('--add', default='', help='CSV file of urls (with a header) to add to the job.')
+    parser.add_argument('--host', default=host, help='Interface to bind.')
+    parser.add_argument('--port', type=int, default=port, help='Port to bind.')
+    parser.add_argument('--visibility-timeout', type=float, default=visibility_timeout,
+                        help='Seconds a lease stays valid without a heartbeat.')
+    args = parser.parse_args()
+
+    store = LeaseStore(args.db, args.visibility_timeout)
+
+    if args.add:
+        with open(args.add, 'r', encoding='utf-8') as f:
+            next(f, None)
+            logging.info(f"Added {store.add(line.strip() for line in f)} url(s) from {args.add}")
+
+    server = start_coordinator_server(store, args.host, args.port)
+
+    try:
+        while True:
+            sleep(60)
+            logging.info(f"Urls by status: {store.stats()}")
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,326 @@
+from collections import deque
+from functools import partial
+from threading import Condition, Lock
+from time import sleep, time
+
+import failures
+
+
+class Dispatcher:
+    """
+    Shared work queue of the worker threads.
+
+    Workers pull urls one at a time with get(). Once the queue is drained and hedging is enabled, idle workers
+    receive a speculative copy of the slowest in-flight url (straggler) instead of exiting. The first attempt that
+    completes a url wins, the results of the other attempts are discarded.
+
+    Args:
+        urls (iterable): The urls to scrape, read lazily (e.g. a LineIndex) so they are never all held in memory.
+        hedge_after (float): Seconds a url must be in flight before it may be hedged, None disables hedging.
+        max_hedges (int): Maximum number of speculative copies of a single url.
+    """
+
+    def __init__(self, urls, hedge_after=None, max_hedges=1):
+        self.hedge_after = hedge_after
+        self.max_hedges = max_hedges
+        self.hedged = 0
+        self.hedges_won = 0
+        self._pending = deque()
+        self._source = iter(urls)
+        self._unread = len(urls) if hasattr(urls, '__len__') else None
+        self._in_flight = {}
+        self._done = set()
+        self._condition = Condition()
+
+    def remaining(self):
+        """
+        Returns:
+            Count (int): Urls not yet picked up by a worker.
+        """
+        return len(self._pending) + (self._unread or 0)
+
+    def _next_pending(self):
+        # Urls given back by release() go first, then the next unread url of the source
+        if self._pending:
+            return self._pending.popleft()
+
+        url = next(self._source, None)
+        if url is None:
+            self._unread = 0
+        elif self._unread:
+            self._unread -= 1
+        return url
+
+    def get(self, worker_id, timeout=None, _wait_in_secs=0.5):
+        """
+        Returns the next url for a worker, blocking while urls are in flight and none can be hedged: a failed worker
+        may still release them back to the queue.
+
+        Args:
+            worker_id: Identifier of the calling worker.
+            timeout (float): Seconds to block at most, None blocks until a url is available or the work is finished.
+            _wait_in_secs (float): Time between two checks for a straggler.
+
+        Returns:
+            url (str): The url to scrape, None when all the work is finished, or False when the timeout elapsed first.
+        """
+        deadline = time() + timeout if timeout is not None else None
+
+        with self._condition:
+            while True:
+                url = self._next_pending()
+                if url is not None:
+                    self._in_flight[url] = {'started': time(), 'owner': worker_id, 'workers': {worker_id},
+                                           'hedges': 0}
+                    return url
+
+                # Urls in flight may still come back (released by a dead browser or worker process)
+                if not self._in_flight:
+                    return None
+
+                straggler = self._find_straggler(worker_id) if self.hedge_after is not None else None
+                if straggler:
+                    attempt = self._in_flight[straggler]
+                    attempt['workers'].add(worker_id)
+                    attempt['hedges'] += 1
+                    self.hedged += 1
+                    return straggler
+
+                if deadline is not None and time() >= deadline:
+                    return False
+
+                wait = _wait_in_secs if deadline is None else min(_wait_in_secs, deadline - time())
+                self._condition.wait(max(wait, 0))
+
+    def _find_straggler(self, worker_id):
+        now = time()
+        straggler, longest = None, self.hedge_after
+
+        for url, attempt in self._in_flight.items():
+            running_for = now - attempt['started']
+            if (running_for >= longest and attempt['hedges'] < self.max_hedges
+                    and worker_id not in attempt['workers']):
+                straggler, longest = url, running_for
+
+        return straggler
+
+    def is_done(self, url):
+        """
+        Returns:
+            Status (bool): True if an attempt of the url already completed, so other attempts can stop.
+        """
+        return url in self._done
+
+    def complete(self, url, worker_id):
+        """
+        Records a successful attempt.
+
+        Args:
+            url (str): The scraped url.
+            worker_id: Identifier of the worker that scraped it.
+
+        Returns:
+            Status (bool): True if this is the first result for the url and must be kept, False otherwise.
+        """
+        with self._condition:
+            # Attempts still running elsewhere are losers, their results are discarded by this method
+            attempt = self._in_flight.pop(url, None)
+
+            if url in self._done:
+                return False
+
+            self._done.add(url)
+            if attempt is not None and worker_id != attempt['owner']:
+                self.hedges_won += 1
+            self._condition.notify_all()
+            return True
+
+    def fail(self, url, worker_id, reason=''):
+        """
+        Records a permanently failed attempt.
+
+        Args:
+            url (str): The failed url.
+            worker_id: Identifier of the worker that gave up on it.
+            reason (str): The failure kind, unused here (the dead letters file records it).
+
+        Returns:
+            Status (bool): True if no other attempt of the url is running or succeeded, so the url is lost.
+        """
+        with self._condition:
+            attempt = self._in_flight.get(url)
+            if attempt is not None:
+                attempt['workers'].discard(worker_id)
+                if not attempt['workers']:
+                    del self._in_flight[url]
+
+            self._condition.notify_all()
+            return url not in self._done and (attempt is None or not attempt['workers'])
+
+    def release(self, url, worker_id):
+        """
+        Puts back a url whose attempt was interrupted (e.g. its browser died), so another attempt picks it up.
+
+        Args:
+            url (str): The interrupted url.
+            worker_id: Identifier of the worker that held it.
+        """
+        with self._condition:
+            attempt = self._in_flight.get(url)
+            if attempt is not None:
+                attempt['workers'].discard(worker_id)
+                if not attempt['workers']:
+                    del self._in_flight[url]
+
+            if url not in self._done and url not in self._in_flight:
+                self._pending.appendleft(url)
+            self._condition.notify_all()
+
+
+class ProcessWork:
+    """
+    Work queue of a worker process, forwarding to the work queue of the main process over a pipe.
+
+    The records kept by the worker are not written by the process: they are shipped to the main process with the
+    next get() (or with close()), where the single writer stores them. Hedging is decided by the main process, so
+    complete() asks it whether the record is the first one for its url. The objects shared by all
+    the workers (rate control, block detection, proxies, metrics) stay in the main process and are called through
+    call().
+
+    Args:
+        conn (Connection): The worker end of the pipe.
+        records (list): The records list of the worker process, drained by every get().
+    """
+
+    def __init__(self, conn, records):
+        self.conn = conn
+        self.records = records
+        self.hedged = self.hedges_won = 0
+        self._completed = []
+        self._lock = Lock()
+
+    def _call(self, *request):
+        with self._lock:
+            self.conn.send(request)
+            return self.conn.recv()
+
+    def _take_results(self):
+        # Records are appended right after complete() returns True, in the same order
+        count = min(len(self._completed), len(self.records))
+        results = list(zip(self._completed[:count], self.records[:count]))
+        del self._completed[:count], self.records[:count]
+        return results
+
+    def remaining(self):
+        return 0
+
+    def get(self, worker_id):
+        # The main process answers False while the last urls are in flight elsewhere: the pipe is not held
+        # meanwhile, so the other tabs of this process can still settle theirs
+        while True:
+            with self._lock:
+                results = self._take_results()
+            url = self._call('get', results)
+            if url is not False:
+                return url
+            sleep(0.05)
+
+    def is_done(self, url):
+        return self._call('is_done', url)
+
+    def complete(self, url, worker_id):
+        first = self._call('complete', url)
+        if first:
+            with self._lock:
+                self._completed.append(url)
+        return first
+
+    def fail(self, url, worker_id, reason=''):
+        return self._call('fail', url, reason)
+
+    def call(self, target, method, *args, **kwargs):
+        """
+        Calls a method of a shared object of the main process, see RemoteObject.
+
+        Args:
+            target: Name of the shared object, resolved by the main process.
+            method (str): The method name.
+
+        Returns:
+            result: The return value of the method, its exception is raised here.
+        """
+        status, value = self._call('call', target, method, args, kwargs)
+        if status == 'error':
+            raise value
+        return value
+
+    def release(self, url, worker_id):
+        return self._call('release', url)
+
+    def close(self):
+        """
+        Ships the records kept since the last get().
+        """
+        with self._lock:
+            results = self._take_results()
+        self._call('flush', results)
+        self.conn.close()
+
+
+class RemoteObject:
+    """
+    Object of the main process used by a worker process: every method call runs in the main process, over the pipe
+    of the worker. The workers of all the processes share its state, e.g. a single rate per host.
+
+    Args:
+        work (ProcessWork): Work queue of the worker process, whose pipe carries the calls.
+        target: Name of the object, resolved by the main process.
+    """
+
+    def __init__(self, work, target):
+        self._work = work
+        self._target = target
+
+    def __getattr__(self, method):
+        if method.startswith('_'):
+            raise AttributeError(method)
+        return partial(self._work.call, self._target, method)
+
+
+class RemoteRateController(RemoteObject):
+    """
+    HostRateController of the main process. The request is booked there and waited for here, the pipe is not held
+    during the wait.
+    """
+
+    def acquire(self, url):
+        delay = self.reserve(url)
+
+        if delay > 0:
+            sleep(delay)
+
+
+class RemoteDeadLetters(RemoteObject):
+    """
+    DeadLetters of the main process, the single writer of the file. Not every exception can be pickled, the error
+    is sent as its text.
+    """
+
+    def write(self, url, reason, error, attempts):
+        return self._work.call(self._target, 'write', url, reason, failures.describe_error(error), attempts)
+
+
+class RemoteMetrics:
+    """
+    Metrics registry of the main process, the counters of the workers of a process are kept there and exposed with
+    the others.
+
+    Args:
+        work (ProcessWork): Work queue of the worker process, whose pipe carries the calls.
+    """
+
+    def __init__(self, work):
+        self._work = work
+
+    def register_worker(self, worker_id):
+        return RemoteObject(self._work, ('stats', worker_id))
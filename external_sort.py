@@ -0,0 +1,180 @@
+import argparse
+import csv
+import heapq
+import logging
+import os
+import shutil
+import tempfile
+
+import utils
+
+# Variables
+chunk_rows = 100_000    # Rows sorted in memory at once, each chunk becomes a sorted run on disk
+key_column = 'Item_url'
+
+
+def record_key(row):
+    """This function returns the sort key of an output row: the numeric restaurant id, then the url
+    (or the name and address, for the old outputs without urls).
+
+    Args:
+        row (dict): A row of a scraper output.
+
+    Returns:
+        key (tuple): Rows of the same restaurant have the same key, urls without an id sort last.
+    """
+    url = row.get(key_column) or ''
+    restaurant_id = utils.get_restaurant_id(url)
+
+    if restaurant_id.isdigit():
+        return int(restaurant_id), ''
+
+    return float('inf'), url or f"{row.get('Name') or ''}|{row.get('Address') or ''}"
+
+
+def _write_run(rows, runs_dir, header):
+    rows.sort(key=record_key)
+    run_file = tempfile.NamedTemporaryFile('w', encoding='utf-8', newline='', suffix='.csv', dir=runs_dir,
+                                           delete=False)
+
+    with run_file:
+        # Values beyond the header (malformed rows) are dropped
+        writer = csv.DictWriter(run_file, fieldnames=header, lineterminator='\n', extrasaction='ignore')
+        writer.writerows(rows)
+
+    return run_file.name
+
+
+def _read_run(file_path, header):
+    with open(file_path, 'r', encoding='utf-8', newline='') as f:
+        yield from csv.DictReader(f, fieldnames=header)
+
+
+def sort_into_runs(file_paths, runs_dir, _chunk_rows=chunk_rows):
+    """This function splits CSV files into sorted runs of at most _chunk_rows rows.
+
+    Args:
+        file_paths (list): The CSV files, they must have the same header.
+        runs_dir (str): Directory of the run files.
+        _chunk_rows (int): Rows held in memory at once.
+
+    Raises:
+        ValueError: If the headers of the files differ.
+
+    Returns:
+        header (list): The common header.
+        runs (list): Paths of the sorted runs, in input order.
+    """
+    header, runs = None, []
+
+    for file_path in file_paths:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            reader = csv.DictReader(f)
+
+            if header is None:
+                header = reader.fieldnames
+            elif reader.fieldnames != header:
+                raise ValueError(f'{file_path} has the columns {reader.fieldnames}, expected {header}')
+
+            rows = []
+            for row in reader:
+                rows.append(row)
+                if len(rows) >= _chunk_rows:
+                    runs.append(_write_run(rows, runs_dir, header))
+                    rows = []
+
+            if rows:
+                runs.append(_write_run(rows, runs_dir, header))
+
+    return header, runs
+
+
+def _completeness(row):
+    return sum(1 for value in row.values() if value)
+
+
+def merge_runs(runs, header):
+    """This function merges sorted runs and keeps one row per restaurant: the most complete one,
+    or the first one in input order on a tie.
+
+    Args:
+        runs (list): Paths of the sorted runs, in input order.
+        header (list): The columns of the runs.
+
+    Returns:
+        rows (generator): The deduplicated rows, ordered by restaurant id.
+    """
+    best, best_key = None, None
+
+    # heapq.merge is stable, rows with equal keys come out in run order
+    for row in heapq.merge(*(_read_run(run, header) for run in runs), key=record_key):
+        key = record_key(row)
+
+        if best is not None and key != best_key:
+            yield best
+            best = None
+
+        if best is None or _completeness(row) > _completeness(best):
+            best, best_key = row, key
+
+    if best is not None:
+        yield best
+
+
+def merge_outputs(file_paths, output_filepath, _chunk_rows=chunk_rows):
+    """This function combines the outputs of sharded runs into one deduplicated file ordered by restaurant id.
+    The inputs are sorted in chunks into runs on disk and the runs are merged as streams, so memory use
+    does not depend on the size of the outputs. The same inputs always give the same file.
+
+    Args:
+        file_paths (list): The shard output CSV files.
+        output_filepath (str): The merged CSV file.
+        _chunk_rows (int): Rows held in memory at once.
+
+    Returns:
+        written (int): Number of rows written.
+    """
+    runs_dir = tempfile.mkdtemp(prefix='merge-runs-', dir=os.path.dirname(os.path.abspath(output_filepath)))
+    written = 0
+
+    try:
+        header, runs = sort_into_runs(sorted(file_paths), runs_dir, _chunk_rows)
+        if header is None:
+            raise ValueError('No input file to merge')
+
+        with open(output_filepath, 'w', encoding='utf-8', newline='') as f:
+            writer = csv.DictWriter(f, fieldnames=header, lineterminator='\n')
+            writer.writeheader()
+
+            for row in merge_runs(runs, header):
+                writer.writerow(row)
+                written += 1
+
+    except Exception as e:
+        logging.error(f"An error occurred while merging {file_paths}: {e}")
+        raise
+
+    finally:
+        shutil.rmtree(runs_dir, ignore_errors=True)
+
+    return written
+
+
+def main():
+    """
+    Merges shard outputs: python external_sort.py outputs/pages.shard-*.csv -o outputs/pages.csv
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Merges the outputs of sharded scraper runs.')
+    parser.add_argument('inputs', nargs='+', help='Shard output CSV files.')
+    parser.add_argument('-o', '--output', required=True, help='Merged CSV file.')
+    parser.add_argument('--chunk-rows', type=int, default=chunk_rows, help='Rows sorted in memory at once.')
+    args = parser.parse_args()
+
+    written = merge_outputs(args.inputs, args.output, args.chunk_rows)
+    logging.info(f"Merged {len(args.inputs)} file(s) into {written} rows in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import csv
+import os
+import random
+from datetime import datetime
+from threading import Lock
+
+from selenium.common import exceptions
+from urllib3.exceptions import HTTPError as Urllib3HTTPError
+
+# Failure kinds that are worth another attempt, 'session' and 'blocked' additionally need a fresh driver
+retryable_kinds = ('timeout', 'stale_element', 'session', 'blocked')
+
+# Messages of a WebDriverException raised when the browser or its session is gone
+dead_session_messages = ('invalid session id', 'session deleted', 'chrome not reachable', 'disconnected',
+                         'no such window', 'target window already closed', 'tab crashed')
+
+dead_letters_header = ['URL', 'Reason', 'Error', 'Attempts', 'Time']
+
+
+class BlockedError(Exception):
+    """Raised when the site serves a captcha, a bot wall or a throttling status code."""
+
+
+def classify_error(error):
+    """This function maps an exception raised while scraping a page to a failure kind.
+
+    Args:
+        error (Exception): The exception raised for the page.
+
+    Returns:
+        kind (str): One of 'blocked', 'timeout', 'stale_element', 'session' or 'other'.
+    """
+    if isinstance(error, BlockedError):
+        return 'blocked'
+
+    if isinstance(error, exceptions.TimeoutException):
+        return 'timeout'
+
+    if isinstance(error, exceptions.StaleElementReferenceException):
+        return 'stale_element'
+
+    if isinstance(error, (exceptions.InvalidSessionIdException, exceptions.NoSuchWindowException,
+                          ConnectionError, Urllib3HTTPError)):
+        return 'session'
+
+    if isinstance(error, exceptions.WebDriverException):
+        message = str(error).lower()
+        if any(dead_session_message in message for dead_session_message in dead_session_messages):
+            return 'session'
+        if 'timeout' in message or 'timed out' in message:
+            return 'timeout'
+
+    return 'other'
+
+
+def describe_error(error):
+    """This function formats an exception for the dead letters file: its type and the first line of its message.
+
+    Args:
+        error (Exception): The exception.
+
+    Returns:
+        description (str): e.g. "TimeoutException: Message: timeout".
+    """
+    message = str(error).strip().split('\n')[0][:300]
+
+    return f'{type(error).__name__}: {message}'
+
+
+def backoff_delay(attempt, _base=1.0, _cap=30.0):
+    """This function returns the exponential backoff delay (with full jitter) before a retry.
+
+    Args:
+        attempt (int): The number of the failed attempt, starting at 1.
+        _base (float): The delay in seconds after the first failure.
+        _cap (float): The maximum delay in seconds.
+
+    Returns:
+        Delay (float): Seconds to wait before the next attempt.
+    """
+    return random.uniform(0, min(_cap, _base * 2 ** (attempt - 1)))
+
+
+class DeadLetters:
+    """
+    Thread safe CSV file of the urls that failed permanently, with the failure reason.
+    The file can be fed back to the scraper with --replay.
+
+    Args:
+        file_path (str): Path of the dead letters CSV file, the header is written when the file is created.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self.count = 0
+        self._lock = Lock()
+
+    def write(self, url, reason, error, attempts):
+        """
+        Appends a permanently failed url.
+
+        Args:
+            url (str): The failed url.
+            reason (str): The failure kind returned by classify_error().
+            error (Exception or str): The last exception raised for the url, or its describe_error() text.
+            attempts (int): Number of attempts made.
+        """
+        description = error if isinstance(error, str) else describe_error(error)
+
+        with self._lock:
+            new_file = not os.path.isfile(self.file_path)
+
+            with open(self.file_path, 'a', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                if new_file:
+                    writer.writerow(dead_letters_header)
+                writer.writerow([url, reason, description, attempts,
+                                 datetime.now().isoformat(timespec='seconds')])
+
+            self.count += 1
+
+
+def read_dead_letters(file_path):
+    """This function reads the urls of a dead letters file so they can be replayed.
+
+    Args:
+        file_path (str): Path of the dead letters CSV file.
+
+    Returns:
+        urls (list): The failed urls, without duplicates and in file order.
+    """
+    urls = {}
+
+    with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+        reader = csv.reader(f)
+        next(reader, None)
+
+        for row in reader:
+            if row and row[0]:
+                urls[row[0]] = True
+
+    return list(urls)
@@ -0,0 +1,133 @@
+import csv
+import logging
+import mmap
+import os
+import struct
+from array import array
+
+# Header of the cached index: magic, size and modification time of the indexed file, header skipped
+index_header = struct.Struct('<8sQQ?')
+index_magic = b'LINEIDX1'
+
+
+class LineIndex:
+    """
+    Lazy, random access view of the lines of a text file (one url, or one single line CSV row, per line).
+
+    The file is memory mapped and the offsets of its non empty lines are indexed once, then cached next to it
+    (<file>.idx) until the file changes. Lines are decoded only when read, so a job can seek to any line in O(1),
+    take a slice (resume, sampling) or a filtered subset (sharding) without loading the file in memory.
+
+    Args:
+        file_path (str): Path of the text file.
+        skip_header (bool): Leave out the first line (CSV header).
+        _lines (array): Line numbers of a subset view, used by the slicing and filtering methods.
+    """
+
+    def __init__(self, file_path, skip_header=True, _parent=None, _lines=None):
+        self.file_path = file_path
+        self.skip_header = skip_header
+
+        if _parent is not None:
+            self._map, self._offsets = _parent._map, _parent._offsets
+        else:
+            with open(file_path, 'rb') as f:
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if os.path.getsize(file_path) else b''
+            self._offsets = self._load_index() or self._build_index()
+
+        self._lines = _lines
+
+    def _index_path(self):
+        return f'{self.file_path}.idx'
+
+    def _signature(self):
+        stat = os.stat(self.file_path)
+        return index_magic, stat.st_size, stat.st_mtime_ns, self.skip_header
+
+    def _load_index(self):
+        try:
+            with open(self._index_path(), 'rb') as f:
+                if index_header.unpack(f.read(index_header.size)) != self._signature():
+                    return None
+                offsets = array('Q')
+                offsets.frombytes(f.read())
+                return offsets
+        except (OSError, struct.error, ValueError):
+            return None
+
+    def _build_index(self):
+        data, offsets = self._map, array('Q')
+        start = 0
+
+        if self.skip_header:
+            start = data.find(b'\n') + 1 if data.find(b'\n') != -1 else len(data)
+
+        while start < len(data):
+            end = data.find(b'\n', start)
+            if end == -1:
+                end = len(data)
+
+            # Blank lines are not part of the input
+            if data[start:end].strip():
+                offsets.append(start)
+            start = end + 1
+
+        try:
+            with open(self._index_path(), 'wb') as f:
+                f.write(index_header.pack(*self._signature()))
+                f.write(offsets.tobytes())
+        except OSError as e:
+            logging.warning(f"Could not cache the line index of {self.file_path}: {e}")
+
+        return offsets
+
+    def _read(self, line):
+        start = self._offsets[line]
+        end = self._map.find(b'\n', start)
+
+        return self._map[start:end if end != -1 else len(self._map)].decode('utf-8', errors='ignore').strip()
+
+    def __len__(self):
+        return len(self._lines if self._lines is not None else self._offsets)
+
+    def __getitem__(self, position):
+        if isinstance(position, slice):
+            lines = range(len(self))[position]
+            if self._lines is not None:
+                lines = [self._lines[line] for line in lines]
+            return LineIndex(self.file_path, self.skip_header, _parent=self, _lines=array('Q', lines))
+
+        if position < 0:
+            position += len(self)
+        if not 0 <= position < len(self):
+            raise IndexError(f'line {position} out of range')
+
+        return self._read(self._lines[position] if self._lines is not None else position)
+
+    def __iter__(self):
+        for position in range(len(self)):
+            yield self[position]
+
+    def filter(self, predicate):
+        """
+        Selects the lines matching a predicate. The view only keeps their line numbers, not their text.
+
+        Args:
+            predicate (callable): Called with the text of every line.
+
+        Returns:
+            view (LineIndex): The matching lines.
+        """
+        lines = array('Q', (position if self._lines is None else self._lines[position]
+                            for position in range(len(self)) if predicate(self[position])))
+
+        return LineIndex(self.file_path, self.skip_header, _parent=self, _lines=lines)
+
+    def rows(self):
+        """
+        Parses the lines as CSV rows, for files whose values never span lines (the scraper outputs).
+
+        Returns:
+            rows (generator): The rows, as lists of values.
+        """
+        return csv.reader(iter(self))
@@ -0,0 +1,196 @@
+import json
+import logging
+import os
+from collections import deque
+from threading import Lock
+
+from selenium.webdriver.common.by import By
+
+import utils
+
+
+class LocatorEngine:
+    """
+    Locates the record fields through ordered chains of candidate xpaths.
+
+    The page is waited for once with the union of the candidates of a field, then the candidates are tried in
+    order without waiting, so a layout change costs one lookup instead of a full timeout per dead xpath.
+    Every lookup is counted per candidate, and candidates are kept sorted by hits, so the variant winning most
+    often is tried first. The declaration order breaks ties, and the counts can be saved and loaded across runs.
+    The engine of a worker process sets forward to record its lookups in the engine of the main process too.
+
+    Args:
+        chains (dict): Field name to the candidate xpaths, in declaration order.
+        window (int): Number of recent lookups per field used by the health report.
+        min_hit_rate (float): Fields whose recent hit rate falls under this rate are reported as degrading.
+        min_samples (int): Lookups needed before a field is judged.
+    """
+
+    def __init__(self, chains, window=200, min_hit_rate=0.8, min_samples=20):
+        self.window = window
+        self.min_hit_rate = min_hit_rate
+        self.min_samples = min_samples
+        self.forward = None
+        self._lock = Lock()
+        self._chains = {}
+
+        for field, xpaths in chains.items():
+            self._chains[field] = {
+                'declared': list(xpaths),
+                'order': list(xpaths),
+                'hits': {xpath: 0 for xpath in xpaths},
+                'lookups': 0,
+                'misses': 0,
+                'recent': deque(maxlen=window),
+            }
+
+    def candidates(self, field):
+        """
+        Args:
+            field (str): The field name.
+
+        Returns:
+            xpaths (list): The candidates of the field, the most successful first.
+        """
+        with self._lock:
+            return list(self._chains[field]['order'])
+
+    def locate(self, driver, field, _wait_in_secs=5, _candidates=None):
+        """
+        Finds the element of a field with the first matching candidate and records the outcome.
+
+        Args:
+            driver (WebDriver): The Chrome driver, the page is already loaded.
+            field (str): The field name.
+            _wait_in_secs (int): Seconds to wait for any candidate to appear, 0 only checks the rendered page.
+            _candidates (list): Only try these candidates (e.g. those of the page template), in the learned order.
+
+        Returns:
+            elem (WebElement): The element, or None if no candidate matched.
+        """
+        xpaths = self.candidates(field)
+        if _candidates is not None:
+            xpaths = [xpath for xpath in xpaths if xpath in _candidates]
+
+        if not _wait_in_secs or utils.wait_for_elem(driver, ' | '.join(xpaths), _wait_in_secs=_wait_in_secs):
+            for xpath in xpaths:
+                elems = driver.find_elements(By.XPATH, xpath)
+                if elems:
+                    self.record(field, xpath)
+                    return elems[0]
+
+        self.record(field, None)
+        return None
+
+    def record(self, field, xpath):
+        """
+        Counts a lookup done elsewhere (e.g. in a tab script) and moves the winning candidate up if needed.
+
+        Args:
+            field (str): The field name.
+            xpath (str): The candidate that matched, None on a miss.
+        """
+        if self.forward is not None:
+            self.forward(field, xpath)
+
+        with self._lock:
+            chain = self._chains[field]
+            chain['lookups'] += 1
+            chain['recent'].append(xpath is not None)
+
+            if xpath is None:
+                chain['misses'] += 1
+                return
+
+            chain['hits'][xpath] = chain['hits'].get(xpath, 0) + 1
+            chain['order'].sort(key=lambda candidate: (-chain['hits'][candidate],
+                                                       chain['declared'].index(candidate)))
+
+    def report(self):
+        """
+        Builds the health report of the fields. A field is 'ok', 'fallback' when its first declared xpath is
+        not the winning one anymore (the markup moved), 'degrading' when its recent hit rate falls under
+        min_hit_rate, or 'failing' when it rarely matches at all.
+
+        Returns:
+            report (dict): Field name to its lookups, hit rates, status and hits per candidate.
+        """
+        report = {}
+
+        with self._lock:
+            for field, chain in self._chains.items():
+                lookups, recent = chain['lookups'], chain['recent']
+                hit_rate = (lookups - chain['misses']) / lookups if lookups else None
+                recent_hit_rate = sum(recent) / len(recent) if recent else None
+
+                if len(recent) < self.min_samples:
+                    status = 'unknown'
+                elif recent_hit_rate < 0.2:
+                    status = 'failing'
+                elif recent_hit_rate < self.min_hit_rate:
+                    status = 'degrading'
+                elif chain['order'][0] != chain['declared'][0]:
+                    status = 'fallback'
+                else:
+                    status = 'ok'
+
+                report[field] = {
+                    'status': status,
+                    'lookups': lookups,
+                    'hit_rate': hit_rate,
+                    'recent_hit_rate': recent_hit_rate,
+                    'candidates': [{'xpath': xpath, 'hits': chain['hits'][xpath]} for xpath in chain['order']],
+                }
+
+        return report
+
+    def log_report(self):
+        for field, health in self.report().items():
+            if health['status'] in ('ok', 'unknown'):
+                continue
+
+            winner = health['candidates'][0]
+            logging.warning(f"Locator health of {field}: {health['status']}, recent hit rate "
+                            f"{health['recent_hit_rate']:.0%}, best xpath {winner['xpath']} ({winner['hits']} hits)")
+
+    def save(self, file_path):
+        """
+        Writes the health report, its hit counts are loaded by the next run.
+
+        Args:
+            file_path (str): Path of the JSON file.
+        """
+        utils.create_files_dir(os.path.dirname(file_path) or '.')
+
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(self.report(), f, indent=2)
+
+    def load(self, file_path):
+        """
+        Restores the hit counts of a previous run, so the candidate order carries over. Candidates which
+        are not declared anymore are ignored.
+
+        Args:
+            file_path (str): Path of a file written by save(), ignored if missing.
+        """
+        if not os.path.isfile(file_path):
+            return
+
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                report = json.load(f)
+        except ValueError as e:
+            logging.warning(f"Ignoring the unreadable locator stats {file_path}: {e}")
+            return
+
+        with self._lock:
+            for field, health in report.items():
+                chain = self._chains.get(field)
+                if chain is None:
+                    continue
+
+                for candidate in health.get('candidates', []):
+                    if candidate['xpath'] in chain['hits']:
+                        chain['hits'][candidate['xpath']] = candidate['hits']
+
+                chain['order'].sort(key=lambda xpath: (-chain['hits'][xpath], chain['declared'].index(xpath)))
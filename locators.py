@@ -15,3 +15,20 @@ class Locators:
     PAGE_IETM_LINK_XPATH = ".//div[contains(@data-test, '_list_item')]/div/div/div/span/a"
     SEARCH_FIELD_XPATH = ".//input[@name='q']"
     NEXT_PAGE_BUTTON_XPATH = ".//a[@aria-label='Next page']"
+    CONSENT_ACCEPT_BUTTON_XPATH = ".//button[@id='onetrust-accept-btn-handler']"
+
+    # Fallback chains of the record fields, the absolute xpath of the old layout first
+    NAME_XPATHS = (NAME_XPATH, ".//h1[@data-test-target='top-info-header']", ".//h1")
+    ADDRESS_XPATHS = (ADDRESS_XPATH, ".//a[@href='#MAPVIEW']", ".//span[contains(@class, 'address')]//a")
+    CONTACT_XPATHS = (CONTACT_XPATH, ".//a[starts-with(@href, 'tel:')]")
+    WEBSITE_XPATHS = (WEBSITE_XPATH, ".//a[@data-encoded-url][contains(., 'Website')]",
+                      ".//a[contains(@class, 'website')]")
+    RATINGS_XPATHS = (RATINGS_XPATH, ".//a[@href='#REVIEWS'][.//*[@aria-label]]",
+                      ".//*[contains(@aria-label, 'of 5 bubbles')]")
+    RANKING_XPATHS = (RANKING_XPATH, ".//a[contains(@href, '/Restaurants-g')]/span/b/span",
+                      ".//span[contains(., 'Restaurants in')]/b/span")
+    CUISINE_XPATHS = (CUISINE_XPATH, ".//div[@data-test-target='restaurant-detail-info']/div[2]/span[3]")
+    REVIEWS_XPATHS = (REVIEWS_XPATH, ".//a[@href='#REVIEWS']/span[contains(., 'review')]",
+                      ".//span[contains(@class, 'reviewCount')]")
+    OPENING_HOURS_XPATHS = (OPENING_HOURS_XPATH,
+                            ".//span[contains(., 'Open now') or contains(., 'Closed now')]/following-sibling::span")
@@ -0,0 +1,336 @@
+import json
+import logging
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+from time import time
+
+# Upper bounds (in seconds) of the page time histogram buckets
+page_seconds_buckets = (0.5, 1, 2, 5, 10, 20, 30, 60, 120)
+
+
+class Histogram:
+    """
+    Cumulative histogram with fixed buckets, written by a single owner thread.
+    """
+
+    def __init__(self, buckets=page_seconds_buckets):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        """
+        Adds a value to the histogram.
+
+        Args:
+            value (float): The observed value.
+        """
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+
+    def merge(self, other):
+        """
+        Adds the counts of another histogram with the same buckets into this one.
+
+        Args:
+            other (Histogram): Histogram to merge.
+        """
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+        self.count += other.count
+
+
+class WorkerStats:
+    """
+    Counters of a single worker thread.
+
+    Only the owning worker writes to these attributes, so updates are plain increments without locks.
+    Readers (the metrics endpoint) only take racy snapshots, which is fine for monitoring.
+    """
+
+    def __init__(self, worker_id):
+        self.worker_id = worker_id
+        self.started_at = time()
+        self.assigned = 0
+        self.picked = 0
+        self.pages = 0
+        self.discarded = 0
+        self.failures = {}
+        self.field_sources = {}
+        self.templates = {}
+        self.driver_restarts = 0
+        self.in_flight = None
+        self.in_flight_since = None
+        self.page_seconds = Histogram()
+
+    def page_started(self, url):
+        self.picked += 1
+        self.in_flight = url
+        self.in_flight_since = time()
+
+    def page_finished(self):
+        if self.in_flight_since is not None:
+            self.page_seconds.observe(time() - self.in_flight_since)
+        self.pages += 1
+        self.in_flight = None
+        self.in_flight_since = None
+
+    def page_discarded(self):
+        # The losing attempt of a hedged url, its record was dropped
+        self.discarded += 1
+        self.in_flight = None
+        self.in_flight_since = None
+
+    def page_failed(self, kind):
+        self.failures[kind] = self.failures.get(kind, 0) + 1
+        self.in_flight = None
+        self.in_flight_since = None
+
+    def fields_extracted(self, sources):
+        """
+        Counts which source (structured data, network payload, xpath...) supplied each field of a record.
+
+        Args:
+            sources (dict): Source name by field name.
+        """
+        for field, source in sources.items():
+            key = (field, source)
+            self.field_sources[key] = self.field_sources.get(key, 0) + 1
+
+    def page_classified(self, template):
+        self.templates[template] = self.templates.get(template, 0) + 1
+
+    def driver_restarted(self):
+        self.driver_restarts += 1
+
+    def pages_per_second(self):
+        elapsed = time() - self.started_at
+        return self.pages / elapsed if elapsed > 0 else 0.0
+
+
+class Metrics:
+    """
+    Registry of all worker counters of a job plus the job level gauges.
+
+    Args:
+        queue_depth (callable, optional): Returns the number of urls not yet picked up by a worker,
+                                          defaults to the urls assigned to workers but not yet started.
+        writer_lag (callable, optional): Returns (pending records, seconds since the last flush).
+        memory (callable, optional): Returns (resident bytes of the process, resident bytes of the browsers).
+    """
+
+    def __init__(self, queue_depth=None, writer_lag=None, memory=None):
+        self.started_at = time()
+        self.total = 0
+        self.workers = {}
+        self.queue_depth = queue_depth or self._unpicked_urls
+        self.writer_lag = writer_lag or (lambda: (0, 0.0))
+        self.memory = memory or (lambda: (0, 0))
+        self._lock = Lock()
+
+    def register_worker(self, worker_id):
+        """
+        Creates (or returns the existing) counters of a worker. Registration is the only locked operation.
+
+        Args:
+            worker_id: Identifier of the worker.
+
+        Returns:
+            stats (WorkerStats): Counters owned by that worker.
+        """
+        with self._lock:
+            if worker_id not in self.workers:
+                self.workers[worker_id] = WorkerStats(worker_id)
+            return self.workers[worker_id]
+
+    def _unpicked_urls(self):
+        return sum(max(stats.assigned - stats.picked, 0) for stats in list(self.workers.values()))
+
+    def snapshot(self):
+        """
+        Aggregates all counters into a plain dictionary.
+
+        Returns:
+            snapshot (dict): Job and per worker metrics.
+        """
+        workers = list(self.workers.values())
+        elapsed = time() - self.started_at
+
+        page_seconds = Histogram()
+        failures = {}
+        field_sources = {}
+        templates = {}
+        for stats in workers:
+            page_seconds.merge(stats.page_seconds)
+            for kind, count in list(stats.failures.items()):
+                failures[kind] = failures.get(kind, 0) + count
+            for (field, source), count in list(stats.field_sources.items()):
+                field_sources.setdefault(field, {})
+                field_sources[field][source] = field_sources[field].get(source, 0) + count
+            for template, count in list(stats.templates.items()):
+                templates[template] = templates.get(template, 0) + count
+
+        finished = sum(stats.pages for stats in workers)
+        failed = sum(failures.values())
+        rate = finished / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - finished - failed, 0)
+        pending_records, seconds_since_flush = self.writer_lag()
+        python_rss, browsers_rss = self.memory()
+
+        return {
+            'elapsed_seconds': round(elapsed, 3),
+            'total': self.total,
+            'finished': finished,
+            'failed': failed,
+            'discarded': sum(stats.discarded for stats in workers),
+            'in_flight': sum(1 for stats in workers if stats.in_flight),
+            'queue_depth': self.queue_depth(),
+            'writer_pending_records': pending_records,
+            'writer_lag_seconds': round(seconds_since_flush, 3),
+            'pages_per_second': round(rate, 4),
+            'eta_seconds': round(remaining / rate, 1) if rate > 0 else None,
+            'driver_restarts': sum(stats.driver_restarts for stats in workers),
+            'python_rss_bytes': python_rss,
+            'browsers_rss_bytes': browsers_rss,
+            'failures': failures,
+            'field_sources': field_sources,
+            'templates': templates,
+            'page_seconds': {
+                'buckets': list(page_seconds.buckets),
+                'counts': page_seconds.counts,
+                'sum': round(page_seconds.sum, 3),
+                'count': page_seconds.count,
+            },
+            'workers': {
+                str(stats.worker_id): {
+                    'pages': stats.pages,
+                    'pages_per_second': round(stats.pages_per_second(), 4),
+                    'in_flight': stats.in_flight or '',
+                    'driver_restarts': stats.driver_restarts,
+                }
+                for stats in workers
+            },
+        }
+
+    def to_json(self):
+        return json.dumps(self.snapshot())
+
+    def to_prometheus(self):
+        """
+        Renders the snapshot in the Prometheus text exposition format.
+
+        Returns:
+            text (str): Metrics page.
+        """
+        snapshot = self.snapshot()
+        lines = []
+
+        def add(name, kind, value, help_text, labels=None):
+            if not labels:
+                lines.append(f'# HELP scraper_{name} {help_text}')
+                lines.append(f'# TYPE scraper_{name} {kind}')
+            label_text = ''
+            if labels:
+                label_text = '{' + ','.join(f'{key}="{val}"' for key, val in labels.items()) + '}'
+            lines.append(f'scraper_{name}{label_text} {value}')
+
+        add('urls_total', 'gauge', snapshot['total'], 'Urls assigned to this job.')
+        add('pages_finished_total', 'counter', snapshot['finished'], 'Pages scraped successfully.')
+        add('pages_discarded_total', 'counter', snapshot['discarded'],
+            'Losing attempts of hedged urls, their records were dropped.')
+        add('in_flight_urls', 'gauge', snapshot['in_flight'], 'Urls currently being scraped.')
+        add('queue_depth', 'gauge', snapshot['queue_depth'], 'Urls waiting for a worker.')
+        add('writer_pending_records', 'gauge', snapshot['writer_pending_records'], 'Records not yet written.')
+        add('writer_lag_seconds', 'gauge', snapshot['writer_lag_seconds'], 'Seconds since the last flush.')
+        add('pages_per_second', 'gauge', snapshot['pages_per_second'], 'Job throughput.')
+        add('eta_seconds', 'gauge', snapshot['eta_seconds'] if snapshot['eta_seconds'] is not None else 'NaN',
+            'Estimated seconds until the job finishes.')
+        add('driver_restarts_total', 'counter', snapshot['driver_restarts'], 'Browser sessions restarted.')
+        add('python_rss_bytes', 'gauge', snapshot['python_rss_bytes'], 'Resident memory of the scraper process.')
+        add('browsers_rss_bytes', 'gauge', snapshot['browsers_rss_bytes'],
+            'Resident memory of the browser sessions, as last sampled.')
+
+        lines.append('# HELP scraper_failures_total Failed pages by error type.')
+        lines.append('# TYPE scraper_failures_total counter')
+        for kind, count in sorted(snapshot['failures'].items()):
+            add('failures_total', 'counter', count, '', {'type': kind})
+
+        lines.append('# HELP scraper_field_source_total Fields extracted by field and source.')
+        lines.append('# TYPE scraper_field_source_total counter')
+        for field, sources in sorted(snapshot['field_sources'].items()):
+            for source, count in sorted(sources.items()):
+                add('field_source_total', 'counter', count, '', {'field': field, 'source': source})
+
+        lines.append('# HELP scraper_page_template_total Pages by detected layout template.')
+        lines.append('# TYPE scraper_page_template_total counter')
+        for template, count in sorted(snapshot['templates'].items()):
+            add('page_template_total', 'counter', count, '', {'template': template})
+
+        lines.append('# HELP scraper_worker_pages_per_second Throughput of each worker.')
+        lines.append('# TYPE scraper_worker_pages_per_second gauge')
+        for worker_id, worker in sorted(snapshot['workers'].items()):
+            add('worker_pages_per_second', 'gauge', worker['pages_per_second'], '', {'worker': worker_id})
+
+        histogram = snapshot['page_seconds']
+        lines.append('# HELP scraper_page_seconds Time spent per page.')
+        lines.append('# TYPE scraper_page_seconds histogram')
+        cumulative = 0
+        for bound, count in zip(list(histogram['buckets']) + ['+Inf'], histogram['counts']):
+            cumulative += count
+            add('page_seconds_bucket', 'histogram', cumulative, '', {'le': bound})
+        lines.append(f'scraper_page_seconds_sum {histogram["sum"]}')
+        lines.append(f'scraper_page_seconds_count {histogram["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    metrics = None
+
+    def do_GET(self):
+        if self.path.startswith('/metrics.json'):
+            body, content_type = self.metrics.to_json(), 'application/json'
+        elif self.path.startswith('/metrics'):
+            body, content_type = self.metrics.to_prometheus(), 'text/plain; version=0.0.4'
+        else:
+            self.send_error(404)
+            return
+
+        body = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_metrics_server(metrics, host='127.0.0.1', port=0):
+    """
+    Serves the metrics on /metrics (Prometheus text) and /metrics.json from a daemon thread.
+
+    Args:
+        metrics (Metrics): Registry to expose.
+        host (str): Interface to bind.
+        port (int): Port to bind, 0 picks a free port.
+
+    Returns:
+        server (ThreadingHTTPServer): The running server, call shutdown() to stop it.
+    """
+    handler = type('MetricsHandler', (_MetricsHandler,), {'metrics': metrics})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+
+    Thread(target=server.serve_forever, daemon=True).start()
+    logging.info(f"Metrics available on http://{host}:{server.server_address[1]}/metrics")
+
+    return server
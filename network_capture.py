@@ -0,0 +1,197 @@
+import base64
+import json
+import logging
+
+# Only JSON responses of these urls can carry the restaurant data, everything else (ads, tracking) is skipped
+captured_url_markers = ('tripadvisor.com/data/graphql', 'tripadvisor.com/data/', '/graphql')
+
+# Candidate keys of each record field in the payloads, in order of preference
+field_keys = {
+    'Name': ('name',),
+    'Address': ('address', 'fullAddress', 'localizedStreetAddress', 'streetAddress', 'address_obj'),
+    'Contact': ('telephone', 'phone', 'phoneNumber'),
+    'Ranking': ('rankingPosition', 'ranking_position', 'ranking', 'popIndexRanking'),
+    'Cuisine': ('cuisines', 'cuisine', 'servesCuisine'),
+    'Reviews': ('reviewCount', 'num_reviews', 'numberOfReviews'),
+    'Opening_hours': ('openHours', 'hours', 'openingHours', 'schedule'),
+    'Ratings': ('rating', 'averageRating', 'ratingValue'),
+    'Website': ('website', 'websiteUrl', 'website_url'),
+}
+
+week_days = ('Sunday', 'Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday')
+
+
+def enable(driver):
+    """This function turns on the DevTools network domain, so response bodies can be read after a page load.
+    The driver must be loaded with capture_network=True to record the performance log.
+
+    Args:
+        driver (WebDriver): The Chrome driver object to handle the Chrome browser.
+    """
+    driver.execute_cdp_cmd('Network.enable', {'maxTotalBufferSize': 50_000_000, 'maxResourceBufferSize': 10_000_000})
+
+
+def reset(driver):
+    """This function drops the network events recorded so far (e.g. by the previous page).
+
+    Args:
+        driver (WebDriver): The Chrome driver object to handle the Chrome browser.
+    """
+    driver.get_log('performance')
+
+
+def captured_payloads(driver):
+    """This function reads the JSON response bodies received since the last call.
+
+    Args:
+        driver (WebDriver): The Chrome driver object to handle the Chrome browser.
+
+    Returns:
+        payloads (list): The decoded JSON documents.
+    """
+    request_ids = []
+
+    for entry in driver.get_log('performance'):
+        try:
+            message = json.loads(entry['message'])['message']
+        except (KeyError, ValueError):
+            continue
+
+        if message.get('method') != 'Network.responseReceived':
+            continue
+
+        response = message['params']['response']
+        if 'json' in response.get('mimeType', '') and any(marker in response['url'] for marker in captured_url_markers):
+            request_ids.append(message['params']['requestId'])
+
+    payloads = []
+    for request_id in request_ids:
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            content = body['body']
+            if body.get('base64Encoded'):
+                content = base64.b64decode(content).decode('utf-8', errors='ignore')
+            payloads.append(json.loads(content))
+        except Exception as e:
+            # Bodies of redirects or evicted buffers are not available anymore
+            logging.debug(f"Skipping response body {request_id}: {e}")
+
+    return payloads
+
+
+def _walk(node):
+    if isinstance(node, dict):
+        yield node
+        for value in node.values():
+            yield from _walk(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from _walk(value)
+
+
+def find_restaurant(payloads, restaurant_id):
+    """This function finds the object describing the restaurant in the captured payloads.
+
+    Args:
+        payloads (list): The decoded JSON documents.
+        restaurant_id (str): The TripAdvisor location id of the restaurant (the d123 part of its url).
+
+    Returns:
+        restaurant (dict): The object with the most known fields among those carrying the restaurant id, or None.
+    """
+    best, best_score = None, 0
+
+    for payload in payloads:
+        for node in _walk(payload):
+            node_id = node.get('locationId', node.get('location_id', node.get('locationID')))
+            if str(node_id) != str(restaurant_id) or 'name' not in node:
+                continue
+
+            score = sum(1 for keys in field_keys.values() if any(key in node for key in keys))
+            if score > best_score:
+                best, best_score = node, score
+
+    return best
+
+
+def _text(value):
+    if value is None:
+        return ''
+    if isinstance(value, str):
+        return value.strip()
+    if isinstance(value, (int, float)):
+        return str(value)
+    if isinstance(value, list):
+        return ''.join(_text(item) for item in value)
+    if isinstance(value, dict):
+        for key in ('fullAddress', 'address_string', 'text', 'name', 'value', 'localizedName'):
+            if key in value:
+                return _text(value[key])
+    return ''
+
+
+def _format_hours(value):
+    # Week schedules come as {day: [{open, close}, ...]} or [{day, intervals}, ...], render one line per day
+    if isinstance(value, dict) and 'week_ranges' in value:
+        value = dict(zip(week_days, value['week_ranges']))
+
+    if isinstance(value, dict):
+        lines = []
+        for day, ranges in value.items():
+            if isinstance(ranges, list):
+                intervals = ', '.join(f"{_text(r.get('open', r.get('open_time')))} - {_text(r.get('close', r.get('close_time')))}"
+                                      for r in ranges if isinstance(r, dict))
+                lines.append(f'{day}: {intervals or "Closed"}')
+        if lines:
+            return '\n'.join(lines)
+
+    if isinstance(value, list):
+        return '\n'.join(_text(day) for day in value if _text(day))
+
+    return _text(value)
+
+
+def map_record(restaurant):
+    """This function maps the restaurant object of a payload to the record fields.
+
+    Args:
+        restaurant (dict): The object returned by find_restaurant().
+
+    Returns:
+        values (dict): The record values by field name, fields absent from the payload are left out.
+    """
+    values = {}
+
+    for field, keys in field_keys.items():
+        key = next((key for key in keys if restaurant.get(key) not in (None, '', [], {})), None)
+        if key is None:
+            continue
+
+        value = restaurant[key]
+        if field == 'Opening_hours':
+            values[field] = _format_hours(value)
+        elif field == 'Cuisine' and isinstance(value, list):
+            values[field] = ''.join(_text(cuisine) for cuisine in value)
+        elif field == 'Reviews' and isinstance(value, (int, float)):
+            values[field] = f'{int(value):,} reviews'
+        elif field == 'Ranking' and isinstance(value, (int, float)):
+            values[field] = f'#{int(value)}'
+        else:
+            values[field] = _text(value)
+
+    return {field: value for field, value in values.items() if value}
+
+
+def extract_record(driver, restaurant_id):
+    """This function builds the record fields from the JSON responses captured while the page loaded.
+
+    Args:
+        driver (WebDriver): The Chrome driver object, the page is already loaded.
+        restaurant_id (str): The TripAdvisor location id of the restaurant.
+
+    Returns:
+        values (dict): The record values found in the payloads, empty if no payload described the restaurant.
+    """
+    restaurant = find_restaurant(captured_payloads(driver), restaurant_id)
+
+    return map_record(restaurant) if restaurant else {}
@@ -0,0 +1,277 @@
+import argparse
+import csv
+import hashlib
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from threading import BoundedSemaphore, Lock
+from time import sleep
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+import failures
+import utils
+
+# Variables
+photos_dir = 'outputs/photos'
+workers = 16            # Concurrent downloads, also the size of the connection pool
+photo_size = 'w'        # Size variant of the TripAdvisor photo urls: s(mall), l(arge), w(ide) or o(riginal)
+links_header = ['Item_url', 'Photo_url']
+manifest_header = ['Restaurant_id', 'Photo_url', 'Sha256', 'File', 'Bytes', 'Time']
+
+# Photos of the TripAdvisor media server, in the raw page or the rendered one
+photo_url_regex = re.compile(r'https://(?:dynamic-)?media-cdn\.tripadvisor\.com/media/photo-[a-z]/[^"\'\s()\\]+?\.jpe?g')
+
+
+def find_photo_urls(html):
+    """This function finds the photos of a restaurant page. The size variants of a photo are reduced to photo_size.
+
+    Args:
+        html (str): The source of the page.
+
+    Returns:
+        photo_urls (list): The photo urls, without duplicates and in page order.
+    """
+    photo_urls = {}
+
+    for match in photo_url_regex.finditer(html or ''):
+        photo_urls[re.sub(r'/media/photo-[a-z]/', f'/media/photo-{photo_size}/', match.group(0), count=1)] = True
+
+    return list(photo_urls)
+
+
+class PhotoLinks:
+    """
+    CSV file of the photo urls found while scraping, downloaded afterwards by PhotoDownloader.
+    The rows of a page are appended in a single write, so worker processes can share the file.
+
+    Args:
+        file_path (str): Path of the CSV file, the header is written when the file is created.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._lock = Lock()
+
+    def write(self, url, photo_urls):
+        """
+        Appends the photos of a restaurant.
+
+        Args:
+            url (str): The item url.
+            photo_urls (list): Its photo urls.
+        """
+        if not photo_urls:
+            return
+
+        with self._lock:
+            new_file = not os.path.isfile(self.file_path)
+            rows = ([links_header] if new_file else []) + [[url, photo_url] for photo_url in photo_urls]
+
+            buffer = io.StringIO()
+            csv.writer(buffer, lineterminator='\n').writerows(rows)
+            with open(self.file_path, 'a', encoding='utf-8', newline='') as f:
+                f.write(buffer.getvalue())
+
+
+class PhotoDownloader:
+    """
+    Downloads the photos of a links file concurrently, over a shared pool of keep-alive connections.
+
+    Every photo is stored once, under the SHA-256 of its content (the same stock photo appears on many listings),
+    and recorded in the manifest as soon as it is stored. A run resumes where the previous one stopped: the urls
+    already in the manifest are skipped, failed ones are tried again next time.
+
+    Args:
+        target_dir (str): Directory of the photos and the manifests.
+        workers (int): Concurrent downloads.
+        timeout (float): Seconds to wait for a server response.
+        retries (int): Attempts per photo.
+    """
+
+    def __init__(self, target_dir=photos_dir, workers=workers, timeout=20, retries=3):
+        self.target_dir = target_dir
+        self.workers = workers
+        self.timeout = timeout
+        self.retries = retries
+        self.manifest_filepath = os.path.join(target_dir, 'manifest.csv')
+        self.counts = {'downloaded': 0, 'duplicates': 0, 'skipped': 0, 'failed': 0}
+        self._stored = {}
+        self._lock = Lock()
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+        self._session.mount('https://', HTTPAdapter(pool_connections=workers, pool_maxsize=workers))
+
+        os.makedirs(os.path.join(target_dir, 'files'), exist_ok=True)
+
+    def _load_manifest(self):
+        # Photos already stored, and the (restaurant id, photo url) pairs already recorded
+        stored, done = {}, set()
+
+        if os.path.isfile(self.manifest_filepath):
+            with open(self.manifest_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+                for row in csv.DictReader(f):
+                    stored[row['Photo_url']] = (row['Sha256'], row['File'], int(row['Bytes']))
+                    done.add((row['Restaurant_id'], row['Photo_url']))
+
+        return stored, done
+
+    def _fetch(self, photo_url):
+        # Streamed to a temporary file while hashed, the photo is never held in memory
+        digest = hashlib.sha256()
+        size = 0
+        temp_file = tempfile.NamedTemporaryFile('wb', dir=os.path.join(self.target_dir, 'files'), delete=False)
+
+        try:
+            with temp_file, self._session.get(photo_url, stream=True, timeout=self.timeout) as response:
+                response.raise_for_status()
+                for chunk in response.iter_content(64 * 1024):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+                    size += len(chunk)
+
+            sha256 = digest.hexdigest()
+            extension = os.path.splitext(urlparse(photo_url).path)[1].lower() or '.jpg'
+            file_path = os.path.join('files', sha256[:2], f'{sha256}{extension}')
+            full_path = os.path.join(self.target_dir, file_path)
+
+            if os.path.exists(full_path):
+                os.remove(temp_file.name)
+                duplicate = True
+            else:
+                os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                os.replace(temp_file.name, full_path)
+                duplicate = False
+
+            return sha256, file_path, size, duplicate
+
+        except Exception:
+            if os.path.exists(temp_file.name):
+                os.remove(temp_file.name)
+            raise
+
+    def _download(self, url, photo_url):
+        # A photo shared by several restaurants is downloaded once
+        stored = self._stored.get(photo_url)
+
+        for attempt in range(1, self.retries + 1):
+            if stored:
+                (sha256, file_path, size), duplicate = stored, True
+                break
+            try:
+                sha256, file_path, size, duplicate = self._fetch(photo_url)
+                break
+            except Exception as e:
+                if attempt == self.retries:
+                    logging.error(f"Giving up on the photo {photo_url} after {attempt} attempt(s): {e}")
+                    with self._lock:
+                        self.counts['failed'] += 1
+                    return
+                sleep(failures.backoff_delay(attempt))
+
+        with self._lock:
+            new_file = not os.path.isfile(self.manifest_filepath)
+            with open(self.manifest_filepath, 'a', encoding='utf-8', newline='') as f:
+                writer = csv.writer(f, lineterminator='\n')
+                if new_file:
+                    writer.writerow(manifest_header)
+                writer.writerow([utils.get_restaurant_id(url), photo_url, sha256, file_path, size,
+                                 datetime.now().isoformat(timespec='seconds')])
+
+            self._stored[photo_url] = (sha256, file_path, size)
+            self.counts['duplicates' if duplicate else 'downloaded'] += 1
+
+    def download(self, links_filepath):
+        """
+        Downloads the photos of a links file which are not in the manifest yet. The file is read as a stream and
+        at most a few downloads per worker are queued at a time.
+
+        Args:
+            links_filepath (str): The CSV file written by PhotoLinks.
+
+        Returns:
+            counts (dict): Number of photos downloaded, duplicates of a stored photo, skipped (already recorded)
+            and failed.
+        """
+        self._stored, done = self._load_manifest()
+        queued = BoundedSemaphore(self.workers * 4)
+
+        def run(url, photo_url):
+            try:
+                self._download(url, photo_url)
+            except Exception as e:
+                # e.g. the manifest could not be written: the photo is not recorded and is tried again next time
+                logging.error(f"Failed to record the photo {photo_url}: {e}")
+                with self._lock:
+                    self.counts['failed'] += 1
+            finally:
+                queued.release()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor, \
+                open(links_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            for row in csv.DictReader(f):
+                url, photo_url = row.get('Item_url') or '', row.get('Photo_url')
+                key = (utils.get_restaurant_id(url), photo_url)
+                if not photo_url or key in done:
+                    self.counts['skipped'] += 1
+                    continue
+                done.add(key)
+
+                queued.acquire()
+                executor.submit(run, url, photo_url)
+
+        return self.counts
+
+    def write_manifests(self):
+        """
+        Writes the manifest of every restaurant, restaurants/<restaurant id>.json, from the manifest of the downloads.
+
+        Returns:
+            count (int): Number of restaurant manifests written.
+        """
+        restaurants = {}
+
+        with open(self.manifest_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            for row in csv.DictReader(f):
+                restaurants.setdefault(row['Restaurant_id'], []).append(
+                    {'url': row['Photo_url'], 'sha256': row['Sha256'], 'file': row['File'], 'bytes': int(row['Bytes'])})
+
+        manifests_dir = os.path.join(self.target_dir, 'restaurants')
+        os.makedirs(manifests_dir, exist_ok=True)
+
+        for restaurant_id, restaurant_photos in restaurants.items():
+            with open(os.path.join(manifests_dir, f'{restaurant_id}.json'), 'w', encoding='utf-8') as f:
+                json.dump({'restaurant_id': restaurant_id, 'photos': restaurant_photos}, f, indent=2)
+
+        return len(restaurants)
+
+
+def main():
+    """
+    Downloads the collected photos: python photos.py outputs/photo_links.csv --dir outputs/photos
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Downloads the restaurant photos found while scraping.')
+    parser.add_argument('links', help='CSV file of the photo urls (2_trip_advisor_scraper.py --photo-links).')
+    parser.add_argument('--dir', default=photos_dir, help='Directory of the photos and the manifests.')
+    parser.add_argument('--workers', type=int, default=workers, help='Concurrent downloads.')
+    args = parser.parse_args()
+
+    downloader = PhotoDownloader(args.dir, args.workers)
+    counts = downloader.download(args.links)
+    restaurants = downloader.write_manifests() if os.path.isfile(downloader.manifest_filepath) else 0
+
+    logging.info(f"{counts['downloaded']} photo(s) downloaded, {counts['duplicates']} duplicate(s), "
+                 f"{counts['skipped']} skipped and {counts['failed']} failed, {restaurants} restaurant manifest(s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,209 @@
+import logging
+from collections import deque
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+from failures import BlockedError
+
+# Lower case markers of captcha and bot wall pages, looked up in the page title
+block_signatures = ('captcha', 'access denied', 'are you a robot', 'attention required', 'just a moment',
+                    'security check', 'verify you are human', 'unusual traffic', 'blocked')
+
+# Title part of every restaurant page, whose names may contain a signature ("Just a Moment Cafe")
+restaurant_title_marker = 'restaurant reviews'
+
+# HTTP status codes meaning that the site throttles or blocks us
+block_status_codes = (403, 429)
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at a variable rate.
+
+    Args:
+        rate (float): Tokens added per second.
+        burst (float): Maximum number of tokens the bucket holds.
+    """
+
+    def __init__(self, rate, burst=1):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated_at = monotonic()
+
+    def reserve(self, now):
+        """
+        Takes a token, going into debt when the bucket is empty. Not thread safe, the caller holds a lock.
+
+        Args:
+            now (float): The current monotonic time.
+
+        Returns:
+            Delay (float): Seconds the caller must wait before using the token.
+        """
+        self.tokens = min(self.burst, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+        self.tokens -= 1
+
+        return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class HostRateController:
+    """
+    Per host request scheduler with an AIMD adaptive rate.
+
+    Every host has a token bucket. Each successful page adds a small step to the host rate (additive increase), a
+    detected block multiplies it down (multiplicative decrease) and pauses the host for a cooldown that doubles on
+    consecutive blocks.
+
+    Args:
+        start_rate (float): Initial requests per second per host.
+        min_rate (float): Lowest requests per second per host.
+        max_rate (float): Highest requests per second per host.
+        increase (float): Requests per second added after each success.
+        decrease (float): Factor applied to the rate after a block.
+        cooldown (float): Seconds a host is paused after a block.
+        max_cooldown (float): Upper bound of the doubled cooldown.
+        burst (float): Bucket size, i.e. how many requests may start at once.
+    """
+
+    def __init__(self, start_rate=0.5, min_rate=0.05, max_rate=5.0, increase=0.02, decrease=0.5, cooldown=60,
+                 max_cooldown=900, burst=1):
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.cooldown = cooldown
+        self.max_cooldown = max_cooldown
+        self.burst = burst
+        self.blocks = 0
+        self._hosts = {}
+        self._lock = Lock()
+
+    def _host(self, url):
+        host = urlsplit(url).hostname or url
+
+        if host not in self._hosts:
+            self._hosts[host] = {'bucket': TokenBucket(self.start_rate, self.burst), 'paused_until': 0.0,
+                                 'consecutive_blocks': 0}
+
+        return self._hosts[host]
+
+    def reserve(self, url):
+        """
+        Books the next request to the host of the url without waiting for it.
+
+        Args:
+            url (str): The url about to be requested.
+
+        Returns:
+            Delay (float): Seconds the caller must wait before the request.
+        """
+        with self._lock:
+            now = monotonic()
+            host = self._host(url)
+            delay = max(host['paused_until'] - now, 0.0)
+            return delay + host['bucket'].reserve(now + delay)
+
+    def acquire(self, url):
+        """
+        Blocks until a request to the host of the url is allowed.
+
+        Args:
+            url (str): The url about to be requested.
+        """
+        delay = self.reserve(url)
+
+        if delay > 0:
+            sleep(delay)
+
+    def on_success(self, url):
+        with self._lock:
+            host = self._host(url)
+            bucket = host['bucket']
+            bucket.rate = min(self.max_rate, bucket.rate + self.increase)
+            host['consecutive_blocks'] = 0
+
+    def on_block(self, url):
+        """
+        Slows the host of the url down and pauses it for a cooldown.
+
+        Args:
+            url (str): The url that was blocked.
+        """
+        with self._lock:
+            host = self._host(url)
+            bucket = host['bucket']
+            bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+            bucket.tokens = min(bucket.tokens, 0)
+
+            cooldown = min(self.max_cooldown, self.cooldown * 2 ** host['consecutive_blocks'])
+            host['consecutive_blocks'] += 1
+            host['paused_until'] = max(host['paused_until'], monotonic() + cooldown)
+            self.blocks += 1
+
+        logging.warning(f"Blocked on {urlsplit(url).hostname}: rate lowered to {bucket.rate:.2f}/s, "
+                        f"pausing for {cooldown:.0f}s")
+
+    def rates(self):
+        """
+        Returns:
+            Rates (dict): The current requests per second of every host.
+        """
+        with self._lock:
+            return {name: host['bucket'].rate for name, host in self._hosts.items()}
+
+
+class BlockDetector:
+    """
+    Detects bot walls early: captcha or interstitial pages and sudden spikes of empty records (the page renders,
+    but without any of the data). Blocking HTTP status codes are raised by utils.get_request().
+
+    Args:
+        window (int): Number of recent records used to compute the empty record ratio.
+        max_empty_ratio (float): Ratio of empty records in the window considered a block.
+    """
+
+    def __init__(self, window=20, max_empty_ratio=0.6):
+        self.max_empty_ratio = max_empty_ratio
+        self._recent = deque(maxlen=window)
+        self._lock = Lock()
+
+    def check_page(self, title, url):
+        """
+        Raises BlockedError if the title or url of the loaded page looks like a captcha or bot wall.
+
+        Args:
+            title (str): Title of the loaded page.
+            url (str): Current url of the browser, bot walls often redirect to a captcha url.
+        """
+        title = (title or '').lower()
+
+        if 'captcha' in (url or '').lower():
+            raise BlockedError(f'Redirected to a captcha: {url}')
+
+        if restaurant_title_marker in title:
+            return
+
+        for signature in block_signatures:
+            if signature in title:
+                raise BlockedError(f'Bot wall detected ({signature!r}) on {url}')
+
+    def check_record(self, values):
+        """
+        Tracks empty records and raises BlockedError when their ratio spikes over the recent window.
+
+        Args:
+            values (list): The extracted field values of a record, without its url.
+        """
+        with self._lock:
+            self._recent.append(not any(values))
+            empty = sum(self._recent)
+            spike = len(self._recent) == self._recent.maxlen and empty / len(self._recent) > self.max_empty_ratio
+            if spike:
+                self._recent.clear()
+
+        if spike:
+            raise BlockedError(f'{empty} of the last {self._recent.maxlen} records are empty')
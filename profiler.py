@@ -0,0 +1,232 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import signal
+import sys
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from datetime import datetime
+from time import perf_counter, sleep, time
+
+# Frames from these files mean the thread is blocked on an HTTP round trip to the WebDriver
+webdriver_http_markers = (
+    os.path.join('selenium', 'webdriver', 'remote', 'remote_connection.py'),
+    os.path.join('urllib3', 'connectionpool.py'),
+    os.path.join('http', 'client.py'),
+    'socket.py',
+)
+
+
+def _has_stats(profile):
+    profile.create_stats()
+    return bool(profile.stats)
+
+
+class SamplingProfiler:
+    """
+    Sampling profiler for the scraper threads.
+
+    A daemon thread periodically reads the stack of every other thread, aggregates identical stacks per thread
+    and dumps them in collapsed-stack format (one "frame;frame;frame count" line per stack, the input of
+    flamegraph.pl and speedscope). Worker code can additionally run each url under cProfile via thread_profile().
+
+    Args:
+        output_dir (str): Directory where the dumps are written.
+        interval (float): Seconds between two samples.
+        dump_interval (int): Seconds between two periodic dumps, 0 disables periodic dumps.
+        max_overhead (float): Share of wall time the sampler may spend sampling, the interval grows to respect it.
+        max_stacks (int): Maximum distinct stacks kept in memory, extra stacks are counted as truncated.
+    """
+
+    def __init__(self, output_dir='profiles', interval=0.01, dump_interval=60, max_overhead=0.02,
+                 max_stacks=20000):
+        self.output_dir = output_dir
+        self.interval = interval
+        self.dump_interval = dump_interval
+        self.max_overhead = max_overhead
+        self.max_stacks = max_stacks
+        self.enabled = False
+        self.stacks = Counter()
+        self.attribution = Counter()
+        self.samples = 0
+        self._profiles = {}
+        self._active_profiles = set()
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts sampling (no-op if already running).
+        """
+        if self.enabled:
+            return
+
+        self.enabled = True
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+        logging.info(f"Profiler started, dumps are written to {self.output_dir}/")
+
+    def stop(self):
+        """
+        Stops sampling and writes a final dump.
+        """
+        if not self.enabled:
+            return
+
+        self.enabled = False
+        self._thread.join()
+        self.dump()
+        logging.info("Profiler stopped")
+
+    def toggle(self, *_):
+        """
+        Starts or stops the profiler. Its signature allows using it directly as a signal handler.
+        """
+        if self.enabled:
+            threading.Thread(target=self.stop, daemon=True).start()
+        else:
+            self.start()
+
+    def install_signal_handler(self, signum=None):
+        """
+        Toggles the profiler on SIGUSR1 (or the given signal). Must be called from the main thread.
+
+        Returns:
+            Status (bool): True if the handler is installed, False if the platform lacks the signal.
+        """
+        signum = signum or getattr(signal, 'SIGUSR1', None)
+        if signum is None:
+            return False
+
+        signal.signal(signum, self.toggle)
+        return True
+
+    def _run(self):
+        last_dump = time()
+        interval = self.interval
+
+        while self.enabled:
+            started = perf_counter()
+            self._sample()
+            cost = perf_counter() - started
+
+            # Keep the sampling cost under max_overhead of the wall time
+            interval = max(self.interval, cost / self.max_overhead)
+            sleep(interval)
+
+            if self.dump_interval and time() - last_dump >= self.dump_interval:
+                self.dump()
+                last_dump = time()
+
+    def _sample(self):
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        own_ident = threading.get_ident()
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own_ident:
+                continue
+
+            frames = []
+            blocked_on_webdriver = False
+            while frame is not None:
+                code = frame.f_code
+                if code.co_filename.endswith(webdriver_http_markers):
+                    blocked_on_webdriver = True
+                frames.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+                frame = frame.f_back
+
+            category = 'webdriver_http' if blocked_on_webdriver else 'python'
+            thread_name = names.get(ident, str(ident))
+            stack = (thread_name, category) + tuple(reversed(frames))
+
+            with self._lock:
+                if stack not in self.stacks and len(self.stacks) >= self.max_stacks:
+                    stack = (thread_name, category, '[truncated]')
+                self.stacks[stack] += 1
+                self.attribution[category] += 1
+                self.samples += 1
+
+    @contextmanager
+    def thread_profile(self):
+        """
+        Runs the wrapped block under a cProfile profile owned by the calling thread when the profiler is enabled.
+        Python 3.12 allows a single active cProfile per process: while another thread holds it, the block runs
+        unprofiled (the sampler still covers it).
+        """
+        if not self.enabled:
+            yield
+            return
+
+        name = threading.current_thread().name
+        with self._lock:
+            profile = self._profiles.get(name) or cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                profile = None
+            else:
+                self._profiles[name] = profile
+                self._active_profiles.add(name)
+
+        if profile is None:
+            yield
+            return
+
+        try:
+            yield
+        finally:
+            profile.disable()
+            with self._lock:
+                self._active_profiles.discard(name)
+
+    def dump(self):
+        """
+        Writes the collapsed stacks and the cProfile summary collected so far.
+
+        Returns:
+            filepaths (list): Paths of the written files.
+        """
+        if not os.path.isdir(self.output_dir):
+            os.makedirs(self.output_dir, exist_ok=True)
+
+        timestamp = datetime.now().strftime('%Y_%m_%d-%H_%M_%S')
+        filepaths = []
+
+        with self._lock:
+            stacks = list(self.stacks.items())
+            attribution = dict(self.attribution)
+            samples = self.samples
+
+        stacks_filepath = os.path.join(self.output_dir, f'stacks-{timestamp}.folded')
+        with open(stacks_filepath, 'w', encoding='utf-8') as f:
+            for stack, count in stacks:
+                f.write(f"{';'.join(stack)} {count}\n")
+        filepaths.append(stacks_filepath)
+
+        summary = io.StringIO()
+        summary.write(f'Samples: {samples}\n')
+        for category, count in sorted(attribution.items()):
+            summary.write(f'{category}: {count} ({count / samples:.1%})\n' if samples else f'{category}: 0\n')
+
+        # Profiles of threads currently inside thread_profile() are picked up by the next dump, pstats rejects the
+        # profiles which never collected anything
+        with self._lock:
+            profiles = [profile for name, profile in self._profiles.items()
+                        if name not in self._active_profiles and _has_stats(profile)]
+
+            if profiles:
+                summary.write('\n')
+                stats = pstats.Stats(profiles[0], stream=summary)
+                for profile in profiles[1:]:
+                    stats.add(profile)
+                stats.sort_stats('cumulative').print_stats(40)
+
+        summary_filepath = os.path.join(self.output_dir, f'summary-{timestamp}.txt')
+        with open(summary_filepath, 'w', encoding='utf-8') as f:
+            f.write(summary.getvalue())
+        filepaths.append(summary_filepath)
+
+        return filepaths
@@ -0,0 +1,145 @@
+import csv
+import json
+import logging
+import os
+import re
+
+# Values of a field which are placeholders rather than data, empty values are always suspect
+default_rules = {
+    'Opening_hours': [r'^See all hours$'],
+    'Website': [r'^(?!https?://)'],
+    'Ratings': [r'^(?![0-5](\.\d)?$|-1(\.0)?$)'],     # -1.0 rates a restaurant without reviews
+}
+
+key_column = 'Item_url'
+
+
+def load_rules(file_path=''):
+    """This function reads the repair rules, a JSON object mapping a field name to regular expressions
+    of its suspect values. The rules of the file replace the default rules of the same field.
+
+    Args:
+        file_path (str): Path of the JSON rules file, empty for the default rules.
+
+    Returns:
+        rules (dict): Field name to the compiled patterns.
+    """
+    rules = dict(default_rules)
+
+    if file_path:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            rules.update(json.load(f))
+
+    return {field: [re.compile(pattern) for pattern in patterns] for field, patterns in rules.items()}
+
+
+def is_suspect(field, value, rules):
+    """This function tells if a value is missing or matches a suspect pattern of its field.
+
+    Args:
+        field (str): The field name.
+        value (str): The value in the output file.
+        rules (dict): The rules returned by load_rules().
+
+    Returns:
+        Status (bool): True if the field must be scraped again.
+    """
+    value = value.strip()
+
+    return not value or any(pattern.search(value) for pattern in rules.get(field, ()))
+
+
+def find_incomplete(file_path, rules, fields):
+    """This function streams an output file and collects the rows with missing or suspect fields.
+
+    Args:
+        file_path (str): Path of the scraper output CSV file.
+        rules (dict): The rules returned by load_rules().
+        fields (list): The fields to check, fields absent from the file are ignored.
+
+    Returns:
+        repairs (dict): Item url to the list of fields to scrape again, in file order.
+    """
+    repairs = {}
+
+    with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        reader = csv.DictReader(f)
+        checked = [field for field in fields if field in reader.fieldnames]
+
+        for row in reader:
+            url = row.get(key_column)
+            if not url:
+                continue
+
+            suspect = [field for field in checked if is_suspect(field, row[field] or '', rules)]
+            if suspect:
+                missing = repairs.setdefault(url, [])
+                missing.extend(field for field in suspect if field not in missing)
+
+    return repairs
+
+
+def read_patches(file_path, rules):
+    """This function reads the records scraped by a repair run, keeping only the usable values.
+
+    Args:
+        file_path (str): Path of the CSV file written by the repair run.
+        rules (dict): The rules returned by load_rules(), suspect values are not used as patches.
+
+    Returns:
+        patches (dict): Item url to the patched values by field name.
+    """
+    patches = {}
+
+    if not os.path.isfile(file_path):
+        return patches
+
+    with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        for row in csv.DictReader(f):
+            url = row.pop(key_column, '')
+            values = {field: value for field, value in row.items() if value and not is_suspect(field, value, rules)}
+            if url and values:
+                patches.setdefault(url, {}).update(values)
+
+    return patches
+
+
+def merge_patches(file_path, patches, rules):
+    """This function merges patched values into an output file by item url. The file is streamed into a temporary
+    file next to it, which then replaces it, so the output is never left half written. Only missing or suspect
+    values are replaced, all the rows of a duplicated url are patched.
+
+    Args:
+        file_path (str): Path of the scraper output CSV file, updated in place.
+        patches (dict): The patches returned by read_patches().
+        rules (dict): The rules returned by load_rules().
+
+    Returns:
+        patched (int): Number of values replaced.
+    """
+    temp_filepath = f'{file_path}.repairing'
+    patched = 0
+
+    try:
+        with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as source, \
+                open(temp_filepath, 'w', encoding='utf-8', newline='') as target:
+            reader = csv.DictReader(source)
+            writer = csv.DictWriter(target, fieldnames=reader.fieldnames, lineterminator='\n')
+            writer.writeheader()
+
+            for row in reader:
+                for field, value in patches.get(row.get(key_column), {}).items():
+                    if field in row and is_suspect(field, row[field] or '', rules):
+                        row[field] = value
+                        patched += 1
+                writer.writerow(row)
+
+        os.replace(temp_filepath, file_path)
+
+    except Exception as e:
+        logging.error(f"An error occurred while merging the repaired values into {file_path}: {e}")
+        if os.path.isfile(temp_filepath):
+            os.remove(temp_filepath)
+        raise
+
+    return patched
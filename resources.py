@@ -0,0 +1,275 @@
+import logging
+import os
+import signal
+from threading import Lock
+from time import sleep, time
+
+# Variables
+browser_memory = 700 * 2 ** 20  # Bytes of memory needed by a worker: its browser and the share of the interpreter
+browser_cpus = 1.0              # CPUs needed by a worker, mostly rendering in its browser
+cgroup_root = '/sys/fs/cgroup'
+
+
+def _read(file_path):
+    try:
+        with open(file_path, 'r', encoding='utf-8') as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def cpu_limit():
+    """This function returns the CPUs available to the process: the cgroup quota (v2 cpu.max or v1 cfs quota)
+    when one is set, bounded by the CPUs the process may run on.
+
+    Returns:
+        cpus (float): Number of CPUs, possibly fractional.
+    """
+    cpus = float(len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count() or 1)
+
+    # cgroup v2: "max 100000" or "200000 100000"
+    cpu_max = _read(os.path.join(cgroup_root, 'cpu.max'))
+    if cpu_max:
+        quota, _, period = cpu_max.partition(' ')
+        if quota != 'max' and period:
+            cpus = min(cpus, int(quota) / int(period))
+        return cpus
+
+    # cgroup v1
+    quota = _read(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_quota_us'))
+    period = _read(os.path.join(cgroup_root, 'cpu', 'cpu.cfs_period_us'))
+    if quota and period and int(quota) > 0:
+        cpus = min(cpus, int(quota) / int(period))
+
+    return cpus
+
+
+def memory_limit():
+    """This function returns the memory available to the process: the cgroup limit (v2 memory.max or
+    v1 memory.limit_in_bytes) when one is set, bounded by the physical memory.
+
+    Returns:
+        limit (int): Number of bytes.
+    """
+    limit = physical_memory()
+
+    for file_path in (os.path.join(cgroup_root, 'memory.max'),
+                      os.path.join(cgroup_root, 'memory', 'memory.limit_in_bytes')):
+        value = _read(file_path)
+        if value and value.isdigit():
+            limit = min(limit, int(value))
+            break
+
+    return limit
+
+
+def physical_memory():
+    """This function returns the total memory of the host, read from /proc/meminfo.
+
+    Returns:
+        total (int): Number of bytes, or a large value if unknown (e.g. not on Linux).
+    """
+    meminfo = _read('/proc/meminfo') or ''
+
+    for line in meminfo.splitlines():
+        if line.startswith('MemTotal:'):
+            return int(line.split()[1]) * 1024
+
+    return 2 ** 62
+
+
+def available_memory():
+    """This function returns the memory the process can still use: the available memory of the host
+    (MemAvailable of /proc/meminfo), bounded by the room left under the cgroup limit.
+
+    Returns:
+        available (int): Number of bytes, or a large value if unknown (e.g. not on Linux).
+    """
+    available = 2 ** 62
+
+    for line in (_read('/proc/meminfo') or '').splitlines():
+        if line.startswith('MemAvailable:'):
+            available = int(line.split()[1]) * 1024
+            break
+
+    for limit_path, usage_path in ((os.path.join(cgroup_root, 'memory.max'), os.path.join(cgroup_root, 'memory.current')),
+                                   (os.path.join(cgroup_root, 'memory', 'memory.limit_in_bytes'),
+                                    os.path.join(cgroup_root, 'memory', 'memory.usage_in_bytes'))):
+        limit, usage = _read(limit_path), _read(usage_path)
+        if limit and limit.isdigit() and usage and usage.isdigit():
+            available = min(available, int(limit) - int(usage))
+            break
+
+    return available
+
+
+def default_workers(_browser_memory=browser_memory, _browser_cpus=browser_cpus):
+    """This function computes the number of workers the host (or container) can run, each owning a browser.
+
+    Args:
+        _browser_memory (int): Bytes of memory needed by a worker.
+        _browser_cpus (float): CPUs needed by a worker.
+
+    Returns:
+        workers (int): At least 1.
+    """
+    cpus, memory = cpu_limit(), memory_limit()
+    workers = max(1, int(min(cpus / _browser_cpus, memory / _browser_memory)))
+
+    logging.info(f"{cpus:g} CPU(s) and {memory / 2 ** 30:.1f} GiB available, using {workers} worker(s)")
+    return workers
+
+
+def process_rss(pid='self'):
+    """This function returns the resident memory of a process, read from /proc.
+
+    Args:
+        pid (int or str): The process id, 'self' for the current process.
+
+    Returns:
+        rss (int): Number of bytes, 0 if the process is gone or /proc is not available.
+    """
+    statm = _read(f'/proc/{pid}/statm')
+
+    return int(statm.split()[1]) * os.sysconf('SC_PAGE_SIZE') if statm else 0
+
+
+def process_tree(pid):
+    """This function lists a process and all its descendants (e.g. chromedriver, the browser and its renderers).
+
+    Args:
+        pid (int): The root process id.
+
+    Returns:
+        pids (list): The process ids, the root first. Only the root when /proc is not available.
+    """
+    children = {}
+
+    for entry in os.listdir('/proc') if os.path.isdir('/proc') else []:
+        stat = _read(f'/proc/{entry}/stat') if entry.isdigit() else None
+        if stat:
+            # The command name may contain spaces, the fields after it are fixed
+            parent = int(stat.rsplit(')', 1)[1].split()[1])
+            children.setdefault(parent, []).append(int(entry))
+
+    pids, pending = [], [pid]
+    while pending:
+        current = pending.pop()
+        pids.append(current)
+        pending.extend(children.get(current, []))
+
+    return pids
+
+
+def process_tree_rss(pid):
+    """This function returns the resident memory of a process and all its descendants.
+
+    Args:
+        pid (int): The root process id.
+
+    Returns:
+        rss (int): Number of bytes.
+    """
+    return sum(process_rss(current) for current in process_tree(pid))
+
+
+def kill_process_tree(pid):
+    """This function force kills a process and all its descendants. They are listed before anything is killed:
+    the children of a killed process are adopted by init and could not be found anymore.
+
+    Args:
+        pid (int): The root process id.
+    """
+    for current in reversed(process_tree(pid)):
+        try:
+            os.kill(current, getattr(signal, 'SIGKILL', signal.SIGTERM))
+        except OSError:
+            pass
+
+
+class MemoryGovernor:
+    """
+    Keeps the memory of the browser sessions and the host in check during long runs.
+
+    Browsers grow with every page, so the process tree of each session is sampled (at most every check_interval
+    seconds) and a session over session_limit is recycled between two urls. New work is held back while the
+    available memory of the host (or container) is under reserve, so the job slows down instead of swapping
+    or getting killed.
+
+    Args:
+        session_limit (int): Bytes of resident memory after which a browser session is recycled.
+        reserve (int): Bytes of available memory under which new work is held back.
+        check_interval (float): Seconds between two samples of a session.
+        max_hold (float): Longest time a worker waits for memory, then it proceeds anyway.
+    """
+
+    def __init__(self, session_limit=1536 * 2 ** 20, reserve=browser_memory, check_interval=10, max_hold=300):
+        self.session_limit = session_limit
+        self.reserve = reserve
+        self.check_interval = check_interval
+        self.max_hold = max_hold
+        self.recycled = 0
+        self.held_seconds = 0.0
+        self._sessions = {}
+        self._lock = Lock()
+
+    def should_recycle(self, worker_id, driver):
+        """
+        Samples the session of a worker when its last sample is old enough.
+
+        Args:
+            worker_id: Identifier of the worker owning the driver.
+            driver (WebDriver): The driver of the session.
+
+        Returns:
+            Status (bool): True if the session grew over the limit and must be replaced.
+        """
+        service_process = getattr(getattr(driver, 'service', None), 'process', None)
+        if service_process is None:
+            return False
+
+        now = time()
+        with self._lock:
+            session = self._sessions.setdefault(worker_id, {'rss': 0, 'sampled_at': 0.0})
+            if now - session['sampled_at'] < self.check_interval:
+                return False
+            session['sampled_at'] = now
+
+        rss = process_tree_rss(service_process.pid)
+        session['rss'] = rss
+
+        if rss <= self.session_limit:
+            return False
+
+        logging.info(f"Recycling the browser of worker {worker_id}, {rss / 2 ** 20:.0f} MiB resident")
+        with self._lock:
+            self.recycled += 1
+            session['rss'] = 0
+        return True
+
+    def wait_for_memory(self):
+        """
+        Blocks while the host is short of memory, at most max_hold seconds.
+        """
+        started = time()
+        available = available_memory()
+        if available >= self.reserve:
+            return
+
+        logging.warning(f"Holding new work back, {available / 2 ** 20:.0f} MiB of memory available")
+        while available_memory() < self.reserve and time() - started < self.max_hold:
+            sleep(1)
+
+        with self._lock:
+            self.held_seconds += time() - started
+
+    def usage(self):
+        """
+        Returns:
+            python_rss (int): Resident bytes of this process.
+            sessions_rss (int): Resident bytes of the browser sessions, as last sampled.
+        """
+        with self._lock:
+            sessions_rss = sum(session['rss'] for session in self._sessions.values())
+
+        return process_rss(), sessions_rss
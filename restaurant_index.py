@@ -0,0 +1,243 @@
+import argparse
+import csv
+import logging
+import os
+import re
+import sqlite3
+import sys
+
+import utils
+
+# Variables
+db_filepath = 'outputs/restaurants.db'
+orders = {                      # Sort orders of the results, 'relevance' needs a full-text query
+    'rating': 'r.rating IS NULL, r.rating DESC, r.reviews DESC',
+    'reviews': 'r.reviews IS NULL, r.reviews DESC',
+    'ranking': 'r.ranking IS NULL, r.ranking',
+    'name': 'r.name',
+    'relevance': 'f.rank',
+}
+
+
+def parse_rating(text):
+    """This function reads the scraped rating, a restaurant without reviews is rated -1.0.
+
+    Args:
+        text (str): The scraped value.
+
+    Returns:
+        rating (float): The rating, None when the restaurant has none.
+    """
+    rating = utils.parse_number(text)
+
+    return float(rating) if rating is not None and rating >= 0 else None
+
+
+def split_cuisine(text):
+    """This function splits the scraped cuisine value, whose tags are run together, e.g.
+    "$$ - $$$ItalianSicilianVegetarian Friendly".
+
+    Args:
+        text (str): The scraped value.
+
+    Returns:
+        price_range (str): The price range ($$ - $$$), empty if missing.
+        cuisines (list): The tags (Italian, Sicilian, Vegetarian Friendly).
+    """
+    price_range = re.match(r'[$\s-]*', text or '').group(0)
+    tags = re.split(r'(?<=[a-z])(?=[A-Z])', (text or '')[len(price_range):])
+
+    return price_range.strip(), [tag.strip() for tag in tags if tag.strip()]
+
+
+class RestaurantIndex:
+    """
+    SQLite copy of a scraper output, indexed for the questions analysts ask again and again.
+
+    The rating, review count, ranking and every cuisine tag have an index, and the name, address and cuisine
+    have a full-text index, so a query reads only the matching rows instead of scanning the CSV file.
+
+    Args:
+        file_path (str): Path of the SQLite database, created if missing.
+    """
+
+    def __init__(self, file_path=db_filepath):
+        self._db = sqlite3.connect(file_path, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.executescript('''
+            CREATE TABLE IF NOT EXISTS restaurants (
+                restaurant_id TEXT PRIMARY KEY,
+                name TEXT,
+                address TEXT,
+                contact TEXT,
+                ranking INTEGER,
+                price_range TEXT,
+                cuisine TEXT,
+                reviews INTEGER,
+                opening_hours TEXT,
+                rating REAL,
+                website TEXT,
+                item_url TEXT);
+            CREATE INDEX IF NOT EXISTS restaurants_rating ON restaurants (rating);
+            CREATE INDEX IF NOT EXISTS restaurants_reviews ON restaurants (reviews);
+            CREATE INDEX IF NOT EXISTS restaurants_ranking ON restaurants (ranking);
+            CREATE TABLE IF NOT EXISTS cuisines (
+                cuisine TEXT COLLATE NOCASE,
+                restaurant_id TEXT,
+                PRIMARY KEY (cuisine, restaurant_id)) WITHOUT ROWID;
+            CREATE VIRTUAL TABLE IF NOT EXISTS restaurants_fts USING fts5 (
+                name, address, cuisine, content='restaurants', content_rowid='rowid');
+            CREATE TABLE IF NOT EXISTS sources (
+                file_path TEXT PRIMARY KEY,
+                size INTEGER,
+                modified REAL);
+        ''')
+
+    def load(self, csv_filepath, _force=False):
+        """
+        Loads a scraper output, the rows of a restaurant already loaded are replaced (latest wins).
+        The file is skipped when it did not change since it was last loaded.
+
+        Args:
+            csv_filepath (str): The output CSV file.
+            _force (bool): Load the file even if it did not change.
+
+        Returns:
+            loaded (int): Number of rows loaded.
+        """
+        stat = os.stat(csv_filepath)
+        source = self._db.execute('SELECT size, modified FROM sources WHERE file_path = ?',
+                                  (os.path.abspath(csv_filepath),)).fetchone()
+        if not _force and source and tuple(source) == (stat.st_size, stat.st_mtime):
+            return 0
+
+        loaded = 0
+
+        try:
+            with open(csv_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+                self._db.execute('BEGIN')
+
+                for row in csv.DictReader(f):
+                    url = row.get('Item_url') or ''
+                    restaurant_id = utils.get_restaurant_id(url) if url else row.get('Name') or ''
+                    if not restaurant_id:
+                        continue
+
+                    price_range, cuisines = split_cuisine(row.get('Cuisine'))
+                    self._db.execute('INSERT OR REPLACE INTO restaurants VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', (
+                        restaurant_id, row.get('Name'), row.get('Address'), row.get('Contact'),
+                        utils.parse_number(row.get('Ranking')), price_range, ', '.join(cuisines),
+                        utils.parse_number(row.get('Reviews')), row.get('Opening_hours'),
+                        parse_rating(row.get('Ratings')), row.get('Website'), url))
+                    self._db.execute('DELETE FROM cuisines WHERE restaurant_id = ?', (restaurant_id,))
+                    self._db.executemany('INSERT OR IGNORE INTO cuisines VALUES (?, ?)',
+                                         ((cuisine, restaurant_id) for cuisine in cuisines))
+                    loaded += 1
+
+                self._db.execute("INSERT INTO restaurants_fts (restaurants_fts) VALUES ('rebuild')")
+                self._db.execute('INSERT OR REPLACE INTO sources VALUES (?, ?, ?)',
+                                 (os.path.abspath(csv_filepath), stat.st_size, stat.st_mtime))
+                self._db.execute('COMMIT')
+
+        except Exception as e:
+            if self._db.in_transaction:
+                self._db.execute('ROLLBACK')
+            logging.error(f"An error occurred while loading {csv_filepath}: {e}")
+            raise
+
+        return loaded
+
+    def search(self, text='', cuisine='', min_rating=None, min_reviews=None, max_ranking=None, order_by='',
+               limit=None):
+        """
+        Finds restaurants, e.g. the top rated Italian places with over 500 reviews in New York City:
+        search('New York City', cuisine='Italian', min_reviews=500).
+
+        Args:
+            text (str): Words that must all appear in the name, address or cuisine.
+            cuisine (str): A cuisine tag, e.g. Italian (case insensitive).
+            min_rating (float): Lowest rating.
+            min_reviews (int): Lowest review count.
+            max_ranking (int): Worst ranking, e.g. 100 for the top 100.
+            order_by (str): One of orders, by default relevance with a text and rating otherwise.
+            limit (int): Maximum number of results.
+
+        Returns:
+            restaurants (generator): The matching restaurants as dicts, read from the database as they are consumed.
+        """
+        order_by = order_by or ('relevance' if text else 'rating')
+        if order_by not in orders or (order_by == 'relevance' and not text):
+            raise ValueError(f'Invalid order {order_by}, expected one of {", ".join(orders)} (relevance needs a text)')
+
+        query, conditions, parameters = ['SELECT r.* FROM restaurants r'], [], []
+
+        if text:
+            # Every word is quoted, the punctuation of an address is not FTS syntax
+            query.append('JOIN restaurants_fts f ON f.rowid = r.rowid')
+            conditions.append('restaurants_fts MATCH ?')
+            parameters.append(' '.join(f'"{word}"' for word in text.replace('"', ' ').split()))
+        if cuisine:
+            query.append('JOIN cuisines c ON c.restaurant_id = r.restaurant_id')
+            conditions.append('c.cuisine = ?')
+            parameters.append(cuisine)
+        if min_rating is not None:
+            conditions.append('r.rating >= ?')
+            parameters.append(min_rating)
+        if min_reviews is not None:
+            conditions.append('r.reviews >= ?')
+            parameters.append(min_reviews)
+        if max_ranking is not None:
+            conditions.append('r.ranking <= ?')
+            parameters.append(max_ranking)
+
+        if conditions:
+            query.append('WHERE ' + ' AND '.join(conditions))
+        query.append(f'ORDER BY {orders[order_by]}')
+        if limit:
+            query.append('LIMIT ?')
+            parameters.append(limit)
+
+        return (dict(row) for row in self._db.execute(' '.join(query), parameters))
+
+    def close(self):
+        self._db.close()
+
+
+def main():
+    """
+    Queries the scraped restaurants, e.g.:
+    python restaurant_index.py --load outputs/pages.csv --search "New York City" --cuisine Italian --min-reviews 500
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Indexes scraper outputs and queries the restaurants.')
+    parser.add_argument('--db', default=db_filepath, help='SQLite database of the index.')
+    parser.add_argument('--load', nargs='*', default=[], help='Output CSV files to (re)load, unchanged ones are skipped.')
+    parser.add_argument('--search', default='', help='Words to find in the name, address or cuisine.')
+    parser.add_argument('--cuisine', default='', help='Cuisine tag, e.g. Italian.')
+    parser.add_argument('--min-rating', type=float, help='Lowest rating.')
+    parser.add_argument('--min-reviews', type=int, help='Lowest review count.')
+    parser.add_argument('--max-ranking', type=int, help='Worst ranking.')
+    parser.add_argument('--order', default='', choices=('',) + tuple(orders), help='Sort order of the results.')
+    parser.add_argument('--limit', type=int, help='Maximum number of results.')
+    args = parser.parse_args()
+
+    index = RestaurantIndex(args.db)
+
+    for csv_filepath in args.load:
+        logging.info(f"Loaded {index.load(csv_filepath)} row(s) from {csv_filepath}")
+
+    # Results are written as CSV to the standard output as they are read
+    writer = None
+    for restaurant in index.search(args.search, args.cuisine, args.min_rating, args.min_reviews, args.max_ranking,
+                                   args.order, args.limit):
+        if writer is None:
+            writer = csv.DictWriter(sys.stdout, fieldnames=list(restaurant), lineterminator='\n')
+            writer.writeheader()
+        writer.writerow(restaurant)
+
+    index.close()
+
+
+if __name__ == "__main__":
+    main()
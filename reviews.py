@@ -0,0 +1,236 @@
+import csv
+import json
+import logging
+import os
+import re
+
+from selenium.common import exceptions
+
+import utils
+
+# Variables
+reviews_filepath = 'outputs/reviews.csv'
+state_filepath = 'outputs/reviews_state.json'  # Review count of every restaurant when its pages were last planned
+page_size = 10          # Reviews per review page
+reviews_header = ['Restaurant_id', 'Review_id', 'Page_url', 'Rating', 'Date', 'Author', 'Title', 'Text', 'Truncated']
+
+# Ajax endpoint returning the full text of the reviews whose ids are appended, comma separated
+expand_url = '/OverlayWidgetAjax?Mode=EXPANDED_HOTEL_REVIEWS_RESP&metaReferer=Restaurant_Review&reviews='
+
+# Waits for the reviews of the page, then expands all the truncated ones with a single request
+# instead of a click on every "More"
+reviews_script = '''
+    const [expandUrl, timeout] = arguments;
+    const done = arguments[arguments.length - 1];
+    const text = (root, selector) => {
+        const elem = root.querySelector(selector);
+        return elem ? elem.textContent.trim() : '';
+    };
+    const read = (root) => Array.from(root.querySelectorAll('.reviewSelector[data-reviewid]')).map((review) => {
+        const bubble = review.querySelector('.ui_bubble_rating');
+        const rating = bubble ? (bubble.className.match(/bubble_(\\d+)/) || [])[1] : '';
+        const date = review.querySelector('.ratingDate');
+        return {id: review.getAttribute('data-reviewid'),
+                rating: rating ? String(rating / 10) : '',
+                date: date ? (date.getAttribute('title') || date.textContent.trim()) : '',
+                author: text(review, '.info_text div') || text(review, '.memberOverlayLink'),
+                title: text(review, '.noQuotes'),
+                text: text(review, '.partial_entry'),
+                truncated: !!review.querySelector('.partial_entry .taLnk, .partial_entry .ulBlueLinks')};
+    });
+    const started = Date.now();
+    const poll = () => {
+        const reviews = read(document);
+        if (!reviews.length && Date.now() - started < timeout) {
+            setTimeout(poll, 100);
+            return;
+        }
+        const truncated = reviews.filter((review) => review.truncated).map((review) => review.id);
+        if (!truncated.length) {
+            done(reviews);
+            return;
+        }
+        fetch(expandUrl + truncated.join(','), {credentials: 'include'})
+            .then((response) => response.text())
+            .then((html) => {
+                const expanded = new Map(read(new DOMParser().parseFromString(html, 'text/html'))
+                    .map((review) => [review.id, review]));
+                done(reviews.map((review) => expanded.has(review.id) && expanded.get(review.id).text
+                    ? {...review, text: expanded.get(review.id).text, truncated: false} : review));
+            })
+            .catch(() => done(reviews));
+    };
+    poll();
+'''
+
+
+def review_page_url(item_url, offset):
+    """This function returns the url of a review page of a restaurant.
+
+    Args:
+        item_url (str): The item url, e.g. .../Restaurant_Review-g60763-d7345837-Reviews-Burger_Lobster-...
+        offset (int): Number of reviews before the page, a multiple of page_size.
+
+    Returns:
+        page_url (str): e.g. .../Restaurant_Review-g60763-d7345837-Reviews-or20-Burger_Lobster-...
+    """
+    return item_url.replace('-Reviews-', f'-Reviews-or{offset}-', 1) if offset else item_url
+
+
+def load_state(file_path=state_filepath):
+    """This function reads the review counts of the restaurants at their last planning.
+
+    Returns:
+        state (dict): Review count by restaurant id, empty before the first run.
+    """
+    if not os.path.isfile(file_path):
+        return {}
+
+    with open(file_path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(state, file_path=state_filepath):
+    """This function replaces the state file atomically, an interrupted write never loses the previous state.
+
+    Args:
+        state (dict): Review count by restaurant id.
+        file_path (str): Path of the state file.
+    """
+    with open(f'{file_path}.tmp', 'w', encoding='utf-8') as f:
+        json.dump(state, f)
+
+    os.replace(f'{file_path}.tmp', file_path)
+
+
+def plan_review_pages(output_filepath, state, _page_size=page_size):
+    """This function computes the review pages to scrape from the review counts of a scraper output. Reviews are
+    listed newest first, so when a restaurant gained n reviews since the last run, they are on its first
+    ceil(n / page_size) pages and only those are scraped.
+
+    Args:
+        output_filepath (str): The scraper output, with the Item_url and Reviews columns.
+        state (dict): Review count by restaurant id at the last run.
+        _page_size (int): Reviews per page.
+
+    Returns:
+        page_urls (list): The review pages, all the pages of a restaurant in a row.
+        counts (dict): The current review count of the planned restaurants, to save once they are scraped.
+    """
+    page_urls, counts = [], {}
+
+    with open(output_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+        for row in csv.DictReader(f):
+            url = row.get('Item_url') or ''
+            restaurant_id = utils.get_restaurant_id(url)
+            count = utils.parse_number(row.get('Reviews'))
+
+            if not count or restaurant_id == url or restaurant_id in counts:
+                continue
+
+            new_reviews = count - state.get(restaurant_id, 0)
+            if new_reviews > 0:
+                counts[restaurant_id] = count
+                page_urls.extend(review_page_url(url, offset) for offset in range(0, new_reviews, _page_size))
+
+    return page_urls, counts
+
+
+def completed_counts(page_urls, counts, scraped_pages):
+    """This function keeps the review counts of the restaurants whose planned pages were all scraped. A restaurant
+    with a failed page keeps its previous count, so the next run plans its pages again.
+
+    Args:
+        page_urls (list): The planned review pages.
+        counts (dict): The review counts of the planned restaurants, returned by plan_review_pages().
+        scraped_pages (set): The pages scraped successfully.
+
+    Returns:
+        counts (dict): The review counts to save.
+    """
+    incomplete = {utils.get_restaurant_id(page_url) for page_url in page_urls if page_url not in scraped_pages}
+
+    return {restaurant_id: count for restaurant_id, count in counts.items() if restaurant_id not in incomplete}
+
+
+def extract_reviews(driver, url, _wait_in_secs=10):
+    """This function extracts the reviews of a loaded review page with a single script call.
+    Every planned page is within the review count of its restaurant, a page without reviews did not render.
+
+    Args:
+        driver (WebDriver): The Chrome driver, the page is already loaded.
+        url (str): The review page url.
+        _wait_in_secs (int): Seconds to wait for the reviews to render.
+
+    Returns:
+        rows (list): A row per review, in the order of reviews_header.
+
+    Raises:
+        TimeoutException: No review rendered in time, the page is retried.
+    """
+    restaurant_id = utils.get_restaurant_id(url)
+    rows = []
+
+    for review in driver.execute_async_script(reviews_script, expand_url, _wait_in_secs * 1000) or []:
+        text = re.sub(r'\s*More$', '', review['text']) if review['truncated'] else review['text']
+        row = [restaurant_id, review['id'], url, review['rating'], review['date'], review['author'], review['title'],
+               text, 'yes' if review['truncated'] else '']
+        rows.append([str(value).replace('\n', '<br>').replace('\r', '') for value in row])
+
+    if not rows:
+        raise exceptions.TimeoutException(f'No review rendered on {url}')
+
+    return rows
+
+
+class ReviewSink:
+    """
+    Filters the reviews written to the reviews file, keyed by restaurant and review id. The review pages planned
+    for new reviews may also hold reviews of the previous runs, only the unseen ones are kept.
+    Used by the single writer of the job, it is not thread safe.
+    """
+
+    def __init__(self):
+        self.written = 0
+        self.pages = set()
+        self._known = set()
+
+    def load(self, file_path, restaurant_ids):
+        """
+        Reads the review ids already in the reviews file, for the given restaurants only.
+
+        Args:
+            file_path (str): The reviews CSV file.
+            restaurant_ids (set): The restaurants whose pages are about to be scraped.
+        """
+        if not os.path.isfile(file_path):
+            return
+
+        with open(file_path, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            for row in csv.DictReader(f):
+                if row['Restaurant_id'] in restaurant_ids:
+                    self._known.add((row['Restaurant_id'], row['Review_id']))
+
+        logging.info(f"{len(self._known)} review(s) of {len(restaurant_ids)} restaurant(s) already in {file_path}")
+
+    def new_rows(self, rows):
+        """
+        Records the page of the rows as scraped.
+
+        Args:
+            rows (list): The rows of a review page.
+
+        Returns:
+            rows (list): The rows of the reviews not seen yet.
+        """
+        kept = []
+
+        for row in rows:
+            self.pages.add(row[2])
+            key = (row[0], row[1])
+            if key not in self._known:
+                self._known.add(key)
+                kept.append(row)
+
+        self.written += len(kept)
+        return kept
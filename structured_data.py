@@ -0,0 +1,204 @@
+import json
+import logging
+
+import network_capture
+
+# Markers of the serialized app state in the page source, the JSON object starts at the next "{"
+state_markers = ('window.__WEB_CONTEXT__=', 'pageManifest:', '"pageManifest":', 'window.__INITIAL_STATE__=')
+
+# JSON-LD types describing a restaurant
+restaurant_types = ('Restaurant', 'FoodEstablishment', 'LocalBusiness')
+
+week_days = ('Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday')
+
+
+def iter_json_ld_blocks(html):
+    """This function yields the content of the application/ld+json script blocks of a page.
+    It only scans for the script markers instead of parsing the whole document.
+
+    Args:
+        html (str): The page source.
+
+    Returns:
+        blocks (generator): The raw JSON text of every block.
+    """
+    position = 0
+
+    while True:
+        marker = html.find('application/ld+json', position)
+        if marker == -1:
+            return
+
+        start = html.find('>', marker) + 1
+        end = html.find('</script>', start)
+        if start == 0 or end == -1:
+            return
+
+        yield html[start:end]
+        position = end
+
+
+def extract_json_ld(html):
+    """This function decodes the JSON-LD objects of a page, flattening lists and @graph containers.
+
+    Args:
+        html (str): The page source.
+
+    Returns:
+        objects (list): The decoded objects, invalid blocks are skipped.
+    """
+    objects = []
+
+    for block in iter_json_ld_blocks(html):
+        try:
+            data = json.loads(block.strip())
+        except ValueError:
+            logging.debug("Skipping an invalid JSON-LD block")
+            continue
+
+        pending = data if isinstance(data, list) else [data]
+        while pending:
+            item = pending.pop(0)
+            if isinstance(item, dict):
+                objects.append(item)
+                pending.extend(item.get('@graph', []))
+
+    return objects
+
+
+def extract_embedded_state(html):
+    """This function decodes the serialized app state objects embedded in the page source.
+
+    Args:
+        html (str): The page source.
+
+    Returns:
+        states (list): The decoded state objects.
+    """
+    decoder = json.JSONDecoder()
+    states = []
+
+    for marker in state_markers:
+        position = html.find(marker)
+        if position == -1:
+            continue
+
+        start = html.find('{', position + len(marker))
+        if start == -1:
+            continue
+
+        try:
+            state, _ = decoder.raw_decode(html, start)
+            states.append(state)
+        except ValueError:
+            logging.debug(f"Skipping the undecodable state after {marker}")
+
+    return states
+
+
+def _types(item):
+    types = item.get('@type', [])
+    return types if isinstance(types, list) else [types]
+
+
+def _text(value):
+    # JSON-LD values are not always strings: numbers, lists of values or nested objects are found as well
+    if isinstance(value, list):
+        value = next((element for element in value if _text(element)), '')
+
+    if isinstance(value, bool) or not isinstance(value, (str, int, float)):
+        return ''
+
+    return str(value).strip()
+
+
+def _format_address(address):
+    if isinstance(address, list):
+        address = next((element for element in address if isinstance(element, (str, dict))), '')
+
+    if not isinstance(address, dict):
+        return _text(address)
+
+    parts = [_text(address.get('streetAddress')), _text(address.get('addressLocality')),
+             ' '.join(part for part in (_text(address.get('addressRegion')), _text(address.get('postalCode'))) if part)]
+    return ', '.join(part for part in parts if part)
+
+
+def _format_opening_hours(item):
+    specifications = item.get('openingHoursSpecification')
+
+    if specifications:
+        hours = {}
+        for specification in specifications if isinstance(specifications, list) else [specifications]:
+            if not isinstance(specification, dict):
+                continue
+            days = specification.get('dayOfWeek', [])
+            for day in days if isinstance(days, list) else [days]:
+                day = str(day).rsplit('/', 1)[-1]
+                hours.setdefault(day, []).append(f"{specification.get('opens', '')} - {specification.get('closes', '')}")
+        return '\n'.join(f"{day}: {', '.join(hours[day])}" for day in week_days if day in hours)
+
+    opening_hours = item.get('openingHours')
+    if isinstance(opening_hours, list):
+        return '\n'.join(_text(hours) for hours in opening_hours if _text(hours))
+
+    return _text(opening_hours)
+
+
+def map_json_ld(item):
+    """This function maps a JSON-LD restaurant object to the record fields.
+
+    Args:
+        item (dict): A JSON-LD object of a restaurant type.
+
+    Returns:
+        values (dict): The record values by field name, fields absent from the object are left out.
+    """
+    rating = item.get('aggregateRating')
+    if not isinstance(rating, dict):
+        rating = {}
+    cuisines = item.get('servesCuisine') or []
+    cuisines = [_text(cuisine) for cuisine in (cuisines if isinstance(cuisines, list) else [cuisines])]
+    review_count = _text(rating.get('reviewCount'))
+
+    values = {
+        'Name': _text(item.get('name')),
+        'Address': _format_address(item.get('address') or ''),
+        'Contact': _text(item.get('telephone')),
+        'Cuisine': _text(item.get('priceRange')) + ''.join(cuisines) if any(cuisines) else '',
+        'Reviews': f"{int(review_count):,} reviews" if review_count.isdigit() else '',
+        'Opening_hours': _format_opening_hours(item),
+        'Ratings': _text(rating.get('ratingValue')),
+        'Website': item.get('sameAs', '') if isinstance(item.get('sameAs'), str) else '',
+    }
+
+    return {field: value.strip() for field, value in values.items() if value and value.strip()}
+
+
+def extract_record(html, restaurant_id):
+    """This function fills the record fields from the structured data of a page: the JSON-LD restaurant object
+    first, then the restaurant object of the embedded app state.
+
+    Args:
+        html (str): The page source.
+        restaurant_id (str): The TripAdvisor location id of the restaurant.
+
+    Returns:
+        values (dict): The record values by field name.
+        sources (dict): The source of every value by field name, 'json-ld' or 'state'.
+    """
+    values, sources = {}, {}
+
+    for item in extract_json_ld(html):
+        if any(item_type in restaurant_types for item_type in _types(item)):
+            for field, value in map_json_ld(item).items():
+                if field not in values:
+                    values[field], sources[field] = value, 'json-ld'
+
+    restaurant = network_capture.find_restaurant(extract_embedded_state(html), restaurant_id)
+    if restaurant:
+        for field, value in network_capture.map_record(restaurant).items():
+            if field not in values:
+                values[field], sources[field] = value, 'state'
+
+    return values, sources
@@ -0,0 +1,167 @@
+import json
+import logging
+
+import trio
+from selenium.common import exceptions
+from selenium.webdriver.common.bidi import cdp
+
+# Extracts the fields of the loaded page in a single round trip. It polls for the first field while the page
+# renders, then reads every field with the first matching candidate xpath: 'text' is the visible text, 'href'
+# the link and 'label' the aria-label. The index of the matching candidate is returned for the locator stats.
+extract_fields_script = '''(async () => {
+    const fields = %s;
+    const find = (xpath) => document.evaluate(xpath, document, null, XPathResult.FIRST_ORDERED_NODE_TYPE, null)
+                                    .singleNodeValue;
+    const names = Object.keys(fields);
+    const started = Date.now();
+    while (names.length && !fields[names[0]][0].some(find) && Date.now() - started < %d) {
+        await new Promise(resolve => setTimeout(resolve, 100));
+    }
+    const values = {};
+    const hits = {};
+    for (const [name, [xpaths, mode]] of Object.entries(fields)) {
+        hits[name] = xpaths.findIndex(find);
+        const elem = hits[name] >= 0 ? find(xpaths[hits[name]]) : null;
+        if (!elem) {
+            values[name] = '';
+        } else if (mode === 'href') {
+            values[name] = elem.href || elem.getAttribute('href') || '';
+        } else if (mode === 'label') {
+            const labelled = elem.getAttribute('aria-label') ? elem : elem.querySelector('[aria-label]');
+            values[name] = labelled ? labelled.getAttribute('aria-label') : (elem.textContent || '').trim();
+        } else {
+            values[name] = (elem.innerText || elem.textContent || '').trim();
+        }
+    }
+    return {title: document.title, url: location.href, values: values, hits: hits};
+})()'''
+
+
+class Tab:
+    """
+    A browser tab attached over the DevTools protocol.
+
+    Args:
+        conn (CdpConnection): Connection to the browser.
+        devtools (module): The DevTools bindings matching the browser version.
+        index (int): Position of the tab in its worker, used to label metrics.
+    """
+
+    def __init__(self, conn, devtools, index):
+        self.conn = conn
+        self.devtools = devtools
+        self.index = index
+        self.pages = 0
+        self.target_id = None
+        self.session = None
+
+    async def open(self):
+        self.target_id = await self.conn.execute(self.devtools.target.create_target('about:blank'))
+        self.session = await self.conn.connect_session(self.target_id)
+        await self.session.execute(self.devtools.page.enable())
+        self.pages = 0
+
+    async def close(self):
+        if self.target_id is None:
+            return
+
+        try:
+            await self.conn.execute(self.devtools.target.close_target(self.target_id))
+        except Exception as e:
+            logging.debug(f"Ignoring error while closing a tab: {e}")
+
+        self.conn.sessions.pop(self.session.session_id, None)
+        self.target_id = self.session = None
+
+    async def recycle(self):
+        """
+        Replaces the tab by a fresh one, releasing the memory held by its renderer.
+        """
+        await self.close()
+        await self.open()
+
+    async def scrape(self, url, fields, deadline):
+        """
+        Loads a url in the tab and extracts the fields.
+
+        Args:
+            url (str): The page url.
+            fields (dict): Field name to (candidate xpaths, mode), mode is 'text', 'href' or 'label'.
+            deadline (float): Seconds allowed for the navigation and the extraction.
+
+        Raises:
+            TimeoutException: If the page did not load and render within the deadline.
+            WebDriverException: If the navigation failed.
+
+        Returns:
+            page (dict): The page title, its current url, the extracted values by field name and the index
+                         of the matching candidate by field name (-1 if none matched).
+        """
+        devtools = self.devtools
+        self.pages += 1
+
+        with trio.move_on_after(deadline) as scope:
+            async with self.session.wait_for(devtools.page.LoadEventFired):
+                _, _, error_text = await self.session.execute(devtools.page.navigate(url))
+                if error_text:
+                    raise exceptions.WebDriverException(f'Navigation to {url} failed: {error_text}')
+
+            script = extract_fields_script % (json.dumps(fields), int(deadline * 1000))
+            result, exception_details = await self.session.execute(
+                devtools.runtime.evaluate(expression=script, return_by_value=True, await_promise=True))
+
+        if scope.cancelled_caught:
+            await self.session.execute(devtools.page.stop_loading())
+            raise exceptions.TimeoutException(f'Page deadline of {deadline}s exceeded: {url}')
+
+        if exception_details:
+            raise exceptions.JavascriptException(f'Extraction failed on {url}: {exception_details.text}')
+
+        return result.value
+
+
+async def _tab_loop(conn, devtools, index, next_url, scrape_url, recycle_after):
+    tab = Tab(conn, devtools, index)
+    await tab.open()
+
+    try:
+        while True:
+            url = await trio.to_thread.run_sync(next_url)
+            if url is None:
+                break
+
+            recycle = await scrape_url(tab, url)
+
+            if recycle or tab.pages >= recycle_after:
+                await tab.recycle()
+
+    finally:
+        with trio.CancelScope(shield=True):
+            await tab.close()
+
+
+async def _run_tabs(driver, next_url, scrape_url, tabs, recycle_after):
+    version, ws_url = driver._get_cdp_details()
+    devtools = cdp.import_devtools(version)
+
+    async with cdp.open_cdp(ws_url) as conn:
+        async with trio.open_nursery() as nursery:
+            for index in range(tabs):
+                nursery.start_soon(_tab_loop, conn, devtools, index, next_url, scrape_url, recycle_after)
+
+
+def run_tabs(driver, next_url, scrape_url, tabs=4, recycle_after=50):
+    """This function drives several tabs of one browser from a single trio event loop.
+
+    Every tab pulls urls until next_url() returns None. Navigation and extraction of all the tabs are multiplexed
+    over the DevTools connection of the driver, so one browser process serves several pages at once.
+
+    Args:
+        driver (WebDriver): The Chrome driver owning the browser.
+        next_url (callable): Blocking function returning the next url, or None when the work is finished.
+                             It runs in a worker thread of trio.
+        scrape_url (async callable): Called as scrape_url(tab, url), returns True if the tab must be recycled.
+        tabs (int): Number of tabs.
+        recycle_after (int): Number of pages after which a tab is replaced by a fresh one.
+    """
+    trio.run(_run_tabs, driver, next_url, scrape_url, tabs, recycle_after)
@@ -0,0 +1,126 @@
+import logging
+from threading import Lock
+
+# Markers of the page layouts, checked in order
+layout_markers = (
+    ('legacy', "//div[@id='taplc_top_info_0']"),
+    ('modern', "//*[@data-test-target='restaurant-detail-info' or @data-test-target='top-info-header']"),
+)
+
+# Markers of the listing variants, each adds a suffix to the template name
+flag_markers = (
+    ('closed', "//*[text()[contains(., 'Permanently closed') or contains(., 'Temporarily closed')]]"),
+    ('unclaimed', "//*[text()[normalize-space()='Unclaimed']]"),
+)
+
+# Xpaths containing this marker only match the legacy layout
+legacy_xpath_marker = 'taplc_'
+
+# Xpaths containing this marker only match the modern layout, the others (h1, tel: links...) match both
+modern_xpath_marker = 'data-test-target'
+
+# Fields a variant does not show, they are left empty without any lookup
+absent_fields = {'closed': ('Opening_hours',)}
+
+# Fields a variant may not show, they are read only if already rendered
+optional_fields = {'unclaimed': ('Website', 'Contact')}
+
+known_layout_wait = 1   # Seconds to wait for a field once the layout was recognized, the header already rendered
+unknown_layout_wait = 5
+
+# Polls until a layout marker renders, then checks every marker in the same call
+fingerprint_script = '''
+    const [layouts, flags, timeout] = arguments;
+    const done = arguments[arguments.length - 1];
+    const exists = (xpath) => document.evaluate('boolean(' + xpath + ')', document, null,
+                                                XPathResult.BOOLEAN_TYPE, null).booleanValue;
+    const started = Date.now();
+    const poll = () => {
+        const layout = layouts.find(([name, xpath]) => exists(xpath));
+        if (!layout && Date.now() - started < timeout) {
+            setTimeout(poll, 100);
+            return;
+        }
+        done({layout: layout ? layout[0] : 'unknown',
+              flags: flags.filter(([name, xpath]) => exists(xpath)).map(([name, xpath]) => name)});
+    };
+    poll();
+'''
+
+
+def fingerprint(driver, _wait_in_secs=10):
+    """This function classifies the layout template of the loaded page with a single script call.
+
+    Args:
+        driver (WebDriver): The Chrome driver, the page is already loaded.
+        _wait_in_secs (int): Seconds to wait for a layout marker to render.
+
+    Returns:
+        template (str): The layout followed by the variant flags, e.g. 'legacy', 'modern-closed' or 'unknown'.
+    """
+    try:
+        result = driver.execute_async_script(fingerprint_script, layout_markers, flag_markers, _wait_in_secs * 1000)
+    except Exception as e:
+        logging.debug(f"Page fingerprinting failed: {e}")
+        return 'unknown'
+
+    return '-'.join([result['layout']] + result['flags'])
+
+
+def compile_extractor(template, field_locators):
+    """This function specializes the field locators for a template: candidates specific to another layout are
+    dropped, fields the variant does not show are skipped and the waits are shortened once the layout is known.
+
+    Args:
+        template (str): A template name returned by fingerprint().
+        field_locators (dict): Field name to (candidate xpaths, mode).
+
+    Returns:
+        extractor (dict): Field name to (candidate xpaths, mode, seconds to wait), for the fields worth looking up.
+    """
+    layout, *flags = template.split('-')
+    absent = {field for flag in flags for field in absent_fields.get(flag, ())}
+    optional = {field for flag in flags for field in optional_fields.get(flag, ())}
+    wait = unknown_layout_wait if layout == 'unknown' else known_layout_wait
+
+    extractor = {}
+    for field, (xpaths, mode) in field_locators.items():
+        if field in absent:
+            continue
+
+        if layout == 'legacy':
+            xpaths = [xpath for xpath in xpaths if modern_xpath_marker not in xpath]
+        elif layout != 'unknown':
+            xpaths = [xpath for xpath in xpaths if legacy_xpath_marker not in xpath]
+
+        if xpaths:
+            extractor[field] = (list(xpaths), mode, 0 if field in optional else wait)
+
+    return extractor
+
+
+class PageExtractors:
+    """
+    Extractors compiled once per template and shared by the workers.
+
+    Args:
+        field_locators (dict): Field name to (candidate xpaths, mode).
+    """
+
+    def __init__(self, field_locators):
+        self.field_locators = field_locators
+        self._extractors = {}
+        self._lock = Lock()
+
+    def get(self, template):
+        """
+        Args:
+            template (str): A template name returned by fingerprint().
+
+        Returns:
+            extractor (dict): See compile_extractor().
+        """
+        with self._lock:
+            if template not in self._extractors:
+                self._extractors[template] = compile_extractor(template, self.field_locators)
+            return self._extractors[template]
@@ -0,0 +1,71 @@
+import os
+import tempfile
+import unittest
+from threading import Event, Thread
+from time import time
+
+import coordinator
+
+
+class LeaseConsumerTest(unittest.TestCase):
+
+    def setUp(self):
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+
+        self.store = coordinator.LeaseStore(os.path.join(temp_dir.name, 'job.db'))
+        self.store.add(f'url{index}' for index in range(10))
+
+        self.server = coordinator.start_coordinator_server(self.store, '127.0.0.1', 0)
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.consumer = coordinator.LeaseConsumer(f'http://127.0.0.1:{self.server.server_address[1]}', batch_size=4,
+                                                  _poll_in_secs=0.1)
+
+    def test_workers_share_the_leased_batches(self):
+        urls = []
+
+        def worker(worker_id):
+            while True:
+                url = self.consumer.get(worker_id)
+                if url is None:
+                    return
+                urls.append(url)
+                self.consumer.complete(url, worker_id)
+
+        threads = [Thread(target=worker, args=(worker_id,)) for worker_id in range(3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join(timeout=20)
+
+        self.assertEqual(sorted(urls), sorted(f'url{index}' for index in range(10)))
+
+    def test_release_is_not_blocked_by_a_lease_in_progress(self):
+        url = self.consumer.get(0)
+        self.consumer._pending.clear()
+
+        leasing, resume = Event(), Event()
+        call = self.consumer._call
+
+        def slow_call(path, payload=None, _retries=3):
+            if path == '/lease':
+                leasing.set()
+                resume.wait(10)
+            return call(path, payload, _retries)
+
+        self.consumer._call = slow_call
+        Thread(target=self.consumer.get, args=(1,), daemon=True).start()
+        self.assertTrue(leasing.wait(10))
+
+        started_at = time()
+        self.consumer.release(url, 0)
+        released_in = time() - started_at
+        resume.set()
+
+        self.assertLess(released_in, 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
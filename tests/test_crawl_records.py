@@ -0,0 +1,103 @@
+import csv
+import importlib.util
+import os
+import tempfile
+import unittest
+from threading import Lock, Thread
+
+from selenium.common import exceptions
+
+import utils
+
+scraper_path = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '2_trip_advisor_scraper.py')
+
+
+def load_scraper():
+    spec = importlib.util.spec_from_file_location('trip_advisor_scraper', scraper_path)
+    scraper = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(scraper)
+    return scraper
+
+
+class FakeDriver:
+    proxy = ''
+    profile_dir = ''
+
+    def quit(self):
+        pass
+
+
+class CrawlRecordsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.scraper = load_scraper()
+        self.temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.temp_dir.cleanup)
+
+        self.scraper.output_filepath = os.path.join(self.temp_dir.name, 'pages.csv')
+        self.scraper.dead_letters.file_path = os.path.join(self.temp_dir.name, 'dead_letters.csv')
+        self.scraper.csv_writer = utils.get_csv_writer(self.scraper.output_filepath, 'w')
+        self.scraper.rate_controller.start_rate = self.scraper.rate_controller.max_rate = 1000
+        self.scraper.workers = 2
+
+        self.load_driver = utils.load_driver
+        self.addCleanup(setattr, utils, 'load_driver', self.load_driver)
+
+    def scraped_urls(self):
+        with open(self.scraper.output_filepath, 'r', encoding='utf-8', newline='') as f:
+            return [row[-1] for row in csv.reader(f)]
+
+    def test_url_of_a_dead_worker_is_scraped_by_another(self):
+        # The session of bad1 crashes, then the replacement driver fails to load: the worker dies mid-url
+        loads, lock = [], Lock()
+
+        def load_driver(**kwargs):
+            with lock:
+                loads.append(kwargs)
+                if len(loads) == 3:
+                    raise RuntimeError('Chrome failed to start')
+            return FakeDriver()
+
+        crashed = set()
+
+        def scrape_record(driver, url, stats):
+            if url == 'bad1' and not crashed:
+                crashed.add(url)
+                raise exceptions.InvalidSessionIdException('invalid session id')
+            return [url] * (len(self.scraper.records_template) - 1) + [url]
+
+        utils.load_driver = load_driver
+        self.scraper.scrape_record = scrape_record
+
+        urls = ['bad1', 'ok1', 'ok2', 'ok3']
+        thread = Thread(target=self.scraper.start_workers, args=(urls,), daemon=True)
+        thread.start()
+        thread.join(timeout=20)
+
+        self.assertFalse(thread.is_alive(), 'start_workers() waits for the url of the dead worker')
+        self.assertEqual(sorted(self.scraped_urls()), sorted(urls))
+
+    def test_losing_attempt_of_a_hedged_url_is_not_a_finished_page(self):
+        class LostHedge:
+            urls = ['won', 'lost']
+
+            def get(self, worker_id, timeout=None):
+                return self.urls.pop(0) if self.urls else None
+
+            def complete(self, url, worker_id):
+                return url == 'won'
+
+        utils.load_driver = lambda **kwargs: FakeDriver()
+        self.scraper.scrape_record = lambda driver, url, stats: [url] * len(self.scraper.records_template)
+        self.scraper.running_threads = 1
+
+        self.scraper.crawl_records(LostHedge(), worker_id=7)
+
+        stats = self.scraper.job_metrics.workers[7]
+        self.assertEqual((stats.pages, stats.discarded), (1, 1))
+        self.assertEqual(self.scraper.finished, 1)
+        self.assertEqual(self.scraper.job_metrics.snapshot()['discarded'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
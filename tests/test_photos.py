@@ -0,0 +1,79 @@
+import csv
+import hashlib
+import os
+import tempfile
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+
+import photos
+
+photo = b'\xff\xd8 not quite a jpeg \xff\xd9'
+
+
+class PhotoHandler(BaseHTTPRequestHandler):
+
+    def do_GET(self):
+        if not self.path.startswith('/photo'):
+            self.send_error(404)
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'image/jpeg')
+        self.send_header('Content-Length', str(len(photo)))
+        self.end_headers()
+        self.wfile.write(photo)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class PhotoDownloaderTest(unittest.TestCase):
+
+    def setUp(self):
+        server = ThreadingHTTPServer(('127.0.0.1', 0), PhotoHandler)
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        self.base_url = f'http://127.0.0.1:{server.server_address[1]}'
+
+        temp_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(temp_dir.cleanup)
+        self.target_dir = os.path.join(temp_dir.name, 'photos')
+        self.links_filepath = os.path.join(temp_dir.name, 'photo_links.csv')
+
+        # The same photo on two restaurants, and a photo the server does not have
+        links = photos.PhotoLinks(self.links_filepath)
+        links.write('https://x/Restaurant_Review-g1-d1-Reviews-a.html', [f'{self.base_url}/photo-a.jpg'])
+        links.write('https://x/Restaurant_Review-g1-d2-Reviews-b.html',
+                    [f'{self.base_url}/photo-a.jpg', f'{self.base_url}/missing.jpg'])
+
+    def test_photos_are_stored_once_and_resumed(self):
+        downloader = photos.PhotoDownloader(self.target_dir, workers=2, retries=1)
+
+        counts = downloader.download(self.links_filepath)
+        self.assertEqual(counts, {'downloaded': 1, 'duplicates': 1, 'skipped': 0, 'failed': 1})
+
+        sha256 = hashlib.sha256(photo).hexdigest()
+        with open(downloader.manifest_filepath, 'r', encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        self.assertEqual(sorted(row['Restaurant_id'] for row in rows), ['1', '2'])
+        self.assertEqual({row['Sha256'] for row in rows}, {sha256})
+        self.assertTrue(os.path.isfile(os.path.join(self.target_dir, 'files', sha256[:2], f'{sha256}.jpg')))
+
+        counts = photos.PhotoDownloader(self.target_dir, workers=2, retries=1).download(self.links_filepath)
+        self.assertEqual(counts, {'downloaded': 0, 'duplicates': 0, 'skipped': 2, 'failed': 1})
+
+    def test_photos_which_cannot_be_recorded_are_failed(self):
+        downloader = photos.PhotoDownloader(self.target_dir, workers=2, retries=1)
+        os.makedirs(downloader.manifest_filepath)
+
+        with self.assertLogs(level='ERROR') as logs:
+            counts = downloader.download(self.links_filepath)
+
+        self.assertEqual(counts['failed'], 3)
+        self.assertTrue(any('Failed to record the photo' in line for line in logs.output))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,21 @@
+import unittest
+
+import repair
+
+
+class RatingsRuleTest(unittest.TestCase):
+
+    def setUp(self):
+        self.rules = repair.load_rules()
+
+    def test_ratings_of_the_scale_and_unrated_restaurants_are_kept(self):
+        for value in ('0', '3.5', '5', '5.0', '-1.0'):
+            self.assertFalse(repair.is_suspect('Ratings', value, self.rules), value)
+
+    def test_other_ratings_are_suspect(self):
+        for value in ('', '6', '-2.0', '-1.5', '4.5 of 5 bubbles'):
+            self.assertTrue(repair.is_suspect('Ratings', value, self.rules), value)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import csv
+import hashlib
 import io
 import json
 import os
 import random
+import re
 import string
 import sys
 import unicodedata
@@ -11,7 +13,7 @@ from glob import glob
 from pathlib import Path
 from time import sleep, time
 
-# import requests
+import requests
 # import requests.auth
 # from lxml import html, etree
 from selenium import webdriver
@@ -23,6 +25,10 @@ from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.support.ui import Select
 from selenium.webdriver.support.wait import WebDriverWait
 
+from failures import BlockedError
+from politeness import block_status_codes
+import resources
+
 # Global Variables
 start_time = time()
 
@@ -224,6 +230,26 @@ def cleanup_text(text):
             return new_text
 
 
+def parse_number(text):
+    """This function extracts the first number of a scraped value, e.g. 1104 from "1,104 reviews",
+    115 from "#115", 4.5 from "4.5" or -1.0 from "-1.0" (the rating of a restaurant without reviews).
+
+    Args:
+        text (str): The scraped value.
+
+    Returns:
+        number (int or float): The number, or None if the value has none.
+    """
+    # A minus sign counts only right before the number, "10-20" starts with 10
+    match = re.search(r'(?<![\d.])-?\d[\d,]*(\.\d+)?', text or '')
+    if not match:
+        return None
+
+    number = match.group(0).replace(',', '')
+
+    return float(number) if match.group(1) else int(number)
+
+
 def save_file_locally(file_path, content, _mode='wb'):
     """This function stores the provided content in a local file.
 
@@ -286,12 +312,16 @@ def remove_dir_if_empty(dir_name):
 # Below are the Functions related to the Backend that use Requests module.
 
 
-def get_request(page_url, _content='html', _retries=5, _verify=True, _timeout=15):
+def get_request(page_url, _content='html', _retries=5, _verify=True, _timeout=15, _proxy='', _headers=None,
+                _cookies=None):
+
+    proxies = {'http': _proxy, 'https': _proxy} if _proxy else None
 
     while True:
 
         try:
-            response = requests.get(page_url, verify=_verify, timeout=_timeout)
+            response = requests.get(page_url, verify=_verify, timeout=_timeout, proxies=proxies, headers=_headers,
+                                    cookies=_cookies)
 
             if response.status_code == 200:
 
@@ -304,9 +334,15 @@ def get_request(page_url, _content='html', _retries=5, _verify=True, _timeout=15
 
             elif response.status_code == 404:
                 return False
+            elif response.status_code in block_status_codes:
+                # Retrying a throttled request only makes the block worse, the caller has to back off
+                raise BlockedError(f'HTTP {response.status_code} on {page_url}')
             else:
                 raise Exception
 
+        except BlockedError:
+            raise
+
         except Exception as e:
 
             if '[Errno 11001] getaddrinfo failed' in str(e):
@@ -395,6 +431,36 @@ def get_filepaths(directory, _extension='html', _depth=1):
     return filepaths
 
 
+def get_restaurant_id(url):
+    """This function extracts the TripAdvisor location id from an item url.
+
+    Args:
+        url (str): The item url, e.g. .../Restaurant_Review-g60763-d7345837-Reviews-...
+
+    Returns:
+        restaurant_id (str): The location id (7345837), or the url itself if it has none.
+    """
+    match = re.search(r'-d(\d+)-', url)
+
+    return match.group(1) if match else url
+
+
+def get_shard(url, shard_count):
+    """This function assigns an item url to a shard with a stable hash of its restaurant id, so every host of a
+    sharded job computes the same partition (the builtin hash() changes between processes).
+
+    Args:
+        url (str): The item url.
+        shard_count (int): Number of shards.
+
+    Returns:
+        shard (int): The shard index, from 0 to shard_count - 1.
+    """
+    digest = hashlib.md5(get_restaurant_id(url).encode('utf-8')).digest()
+
+    return int.from_bytes(digest[:8], 'big') % shard_count
+
+
 def generate_card_ids(starting_id, ending_id):
     return {str(card_id): '' for card_id in range(starting_id, ending_id + 1)}
 
@@ -414,12 +480,16 @@ def remove_existing_files(card_ids, dir_pattern):
 # Below are the Selenium Browser utils.
 
 
-def load_driver(headless=False, proxy=""):
+def load_driver(headless=False, proxy="", page_load_timeout=None, user_data_dir="", capture_network=False):
     """This function opens a Chrome browser after some configurations and returns chrome driver object.
 
     Args:
         headless (bool): True to run the Chrome browser in the foreground otherwise it will run in background.
         proxy (str): Proxy string to hide your real ip address from the world.
+        page_load_timeout (float): Seconds after which driver.get() aborts the navigation, None keeps the default.
+        user_data_dir (str): Chrome profile directory, it must not be used by another browser at the same time.
+                             Empty string starts with a throwaway profile.
+        capture_network (bool): Record the DevTools network events in the performance log (see network_capture.py).
 
     Returns:
         driver (WebDriver): The Chrome driver object to handle the Chrome browser.
@@ -433,7 +503,6 @@ def load_driver(headless=False, proxy=""):
 
     options.add_argument("--start-maximized")
     options.add_argument("--disable-notifications")
-    options.add_argument(r'--user-data-dir=C:\Users\Admin\AppData\Local\Google\Chrome\User Data\Default')
     options.add_argument(
         "user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36")
     options.add_experimental_option("excludeSwitches", ["enable-logging"])
@@ -443,13 +512,35 @@ def load_driver(headless=False, proxy=""):
 
     if proxy:
         options.add_argument(f"--proxy-server={proxy}")
+
+    if user_data_dir:
+        options.add_argument(f"--user-data-dir={user_data_dir}")
+
+    if capture_network:
+        options.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
     chrome_driver_path = r'C:\chromedriver\chromedriver.exe'  # Replace with your actual path
 
     driver = webdriver.Chrome(options=options)
 
+    if page_load_timeout:
+        driver.set_page_load_timeout(page_load_timeout)
+
     return driver
 
 
+def kill_driver(driver):
+    """This function force kills the chromedriver process of a hung session, with the browser it started.
+    Any WebDriver call blocked on that session then fails with a connection error.
+
+    Args:
+        driver (WebDriver): The Chrome driver object to kill.
+    """
+    try:
+        resources.kill_process_tree(driver.service.process.pid)
+    except Exception:
+        pass
+
+
 # Following are the Functions to interact with multiple elements.
 
 
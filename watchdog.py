@@ -0,0 +1,70 @@
+import logging
+from contextlib import contextmanager
+from threading import Lock, Thread
+from time import sleep, time
+
+import utils
+
+
+class PageWatchdog:
+    """
+    Enforces a deadline on every page a worker scrapes.
+
+    The navigation itself is bounded by the driver's page load timeout. When a page still runs past its deadline
+    (hung renderer, extraction stuck on a dead tab, ...) the watchdog kills the session: the blocked WebDriver call
+    of the worker then fails like a crashed session, and the worker retries the url with a fresh driver.
+
+    Args:
+        deadline (float): Seconds a worker may spend on a single page.
+        check_interval (float): Seconds between two checks of the running pages.
+    """
+
+    def __init__(self, deadline=90, check_interval=1):
+        self.deadline = deadline
+        self.check_interval = check_interval
+        self.expired = 0
+        self._pages = {}
+        self._lock = Lock()
+        self._thread = None
+
+    def start(self):
+        """
+        Starts the watchdog daemon thread (no-op if already running).
+        """
+        if self._thread is None:
+            self._thread = Thread(target=self._run, name='page-watchdog', daemon=True)
+            self._thread.start()
+
+    @contextmanager
+    def watch(self, worker_id, driver, url):
+        """
+        Watches the wrapped block that scrapes a single page.
+
+        Args:
+            worker_id: Identifier of the worker.
+            driver (WebDriver): The driver used for the page, killed when the deadline passes.
+            url (str): The page url, for logging.
+        """
+        with self._lock:
+            self._pages[worker_id] = {'driver': driver, 'url': url, 'deadline': time() + self.deadline,
+                                      'killed': False}
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pages.pop(worker_id, None)
+
+    def _run(self):
+        while True:
+            sleep(self.check_interval)
+            now = time()
+
+            with self._lock:
+                expired = [page for page in self._pages.values() if not page['killed'] and now > page['deadline']]
+                for page in expired:
+                    page['killed'] = True
+
+            for page in expired:
+                self.expired += 1
+                logging.warning(f"Page deadline of {self.deadline}s exceeded, killing the session: {page['url']}")
+                utils.kill_driver(page['driver'])
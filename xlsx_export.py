@@ -0,0 +1,127 @@
+import argparse
+import csv
+import logging
+
+from openpyxl import Workbook
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font
+from openpyxl.utils import get_column_letter
+
+import utils
+
+# Variables
+max_sheet_rows = 1_048_576      # Rows of an Excel sheet, the header included
+column_types = {                # Columns written as numbers, the others are written as text
+    'Ranking': int,
+    'Reviews': int,
+    'Ratings': float,
+}
+link_columns = ('Website', 'Item_url')
+column_widths = {'Name': 35, 'Address': 45, 'Cuisine': 30, 'Opening_hours': 25, 'Website': 40, 'Item_url': 60}
+
+
+def _typed_value(column, value):
+    if column not in column_types or not value:
+        return value
+
+    number = utils.parse_number(value)
+
+    return column_types[column](number) if number is not None else value
+
+
+def _new_sheet(workbook, header, number):
+    sheet = workbook.create_sheet(title=f'Restaurants {number}' if number > 1 else 'Restaurants')
+    sheet.freeze_panes = 'A2'
+
+    for index, column in enumerate(header, start=1):
+        sheet.column_dimensions[get_column_letter(index)].width = column_widths.get(column, 15)
+
+    header_cells = []
+    for column in header:
+        cell = WriteOnlyCell(sheet, value=column)
+        cell.font = Font(bold=True)
+        header_cells.append(cell)
+    sheet.append(header_cells)
+
+    return sheet
+
+
+def _row_cells(sheet, header, row):
+    cells = []
+
+    for column, value in zip(header, row):
+        value = _typed_value(column, value)
+
+        if column in link_columns and isinstance(value, str) and value.startswith('http'):
+            cell = WriteOnlyCell(sheet, value=value)
+            cell.hyperlink = value
+            cell.style = 'Hyperlink'
+            cells.append(cell)
+        else:
+            cells.append(value)
+
+    return cells
+
+
+def export_xlsx(csv_filepath, xlsx_filepath, _max_sheet_rows=max_sheet_rows):
+    """This function converts a scraper output into an Excel workbook. The workbook is written in write-only
+    mode, rows are streamed from the CSV file to the sheet, so memory use does not depend on the size of the output.
+
+    Numeric columns (ranking, review count, rating) are written as numbers, the urls as hyperlinks, and a new
+    sheet is started when one reaches the row limit of Excel.
+
+    Args:
+        csv_filepath (str): The output CSV file.
+        xlsx_filepath (str): The workbook file.
+        _max_sheet_rows (int): Rows per sheet, the header included.
+
+    Returns:
+        written (int): Number of restaurants written.
+    """
+    workbook = Workbook(write_only=True)
+    written = 0
+
+    try:
+        with open(csv_filepath, 'r', encoding='utf-8', errors='ignore', newline='') as f:
+            reader = csv.reader(f)
+            header = next(reader, [])
+            sheets, sheet, sheet_rows = 0, None, 0
+
+            for row in reader:
+                if sheet is None or sheet_rows >= _max_sheet_rows:
+                    sheets += 1
+                    sheet, sheet_rows = _new_sheet(workbook, header, sheets), 1
+
+                sheet.append(_row_cells(sheet, header, row))
+                sheet_rows += 1
+                written += 1
+
+            if sheet is None:
+                _new_sheet(workbook, header, 1)
+
+        workbook.save(xlsx_filepath)
+
+    except Exception as e:
+        logging.error(f"An error occurred while exporting {csv_filepath} to {xlsx_filepath}: {e}")
+        raise
+
+    return written
+
+
+def main():
+    """
+    Exports an output: python xlsx_export.py outputs/pages.csv -o outputs/pages.xlsx
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description='Exports a scraper output to an Excel workbook.')
+    parser.add_argument('input', help='Output CSV file.')
+    parser.add_argument('-o', '--output', default='outputs/pages.xlsx', help='Excel workbook.')
+    args = parser.parse_args()
+
+    written = export_xlsx(args.input, args.output)
+    logging.info(f"Exported {written} restaurant(s) to {args.output}")
+
+
+if __name__ == "__main__":
+    main()